@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic XLSForm generator.
+
+Writes xlsx XLSForms of a given size using every supported question type::
+
+    $ python -m benchmarks.generate --groups 20 --questions 250 large.xlsx
+"""
+
+import argparse
+import itertools
+from typing import Dict, List, NamedTuple, Sequence
+
+from xlson import QuestionTypes
+
+from benchmarks.workbook import write_workbook
+
+# Question types in the order they are used, select questions take a list.
+QUESTION_TYPES = (
+    QuestionTypes.TEXT.value,
+    QuestionTypes.INTEGER.value,
+    "select_one",
+    "select_multiple",
+    QuestionTypes.GEOPOINT.value,
+    QuestionTypes.BARCODE.value,
+    QuestionTypes.PHOTO.value,
+)
+SURVEY_HEADER = [
+    "type",
+    "name",
+    "label",
+    "hint",
+    "required",
+    "constraint",
+    "constraint_message",
+    "instance::openmrs_entity_id",
+]
+
+
+class FormSize(NamedTuple):
+    """The shape of a generated XLSForm, ``choices`` is the size of each of the
+    ``lists`` choice lists."""
+
+    groups: int
+    questions: int
+    choices: int
+    lists: int = 4
+    types: Sequence[str] = QUESTION_TYPES
+
+    @property
+    def total_questions(self) -> int:
+        """The number of questions in the XLSForm."""
+        return self.groups * self.questions
+
+
+PRESETS = {
+    "small": FormSize(groups=2, questions=10, choices=5),
+    "medium": FormSize(groups=10, questions=50, choices=20),
+    "large": FormSize(groups=20, questions=250, choices=100),
+    "choices": FormSize(groups=5, questions=20, choices=3000, lists=2),
+}
+
+
+def survey_rows(size: FormSize) -> List[List[str]]:
+    """Returns the survey sheet rows of an XLSForm of ``size``."""
+    rows = [SURVEY_HEADER]
+    question_types = itertools.cycle(size.types)
+    lists = itertools.cycle(range(size.lists))
+    for group in range(size.groups):
+        rows.append(["begin group", "step%d" % (group + 1), "Step %d" % (group + 1)])
+        for number in range(size.questions):
+            name = "q%d_%d" % (group + 1, number + 1)
+            question_type = next(question_types)
+            if question_type.startswith("select"):
+                question_type = "%s list%d" % (question_type, next(lists))
+            row = [question_type, name, "Question %s?" % name, "", "", "", "", ""]
+            if number % 3 == 0:
+                row[3] = "Hint for %s" % name
+            if number % 5 == 0:
+                row[4] = "yes"
+            if question_type == QuestionTypes.TEXT.value and number % 7 == 0:
+                row[5:7] = ["regex(., '[A-Za-z ]+')", "Letters only."]
+            row[7] = "%dAAAAA" % number
+            rows.append(row)
+        rows.append(["end group"])
+
+    return rows
+
+
+def choices_rows(size: FormSize) -> List[List[str]]:
+    """Returns the choices sheet rows of an XLSForm of ``size``."""
+    rows = [["list_name", "name", "label", "instance::openmrs_entity_id"]]
+    for list_number in range(size.lists):
+        for number in range(size.choices):
+            rows.append(
+                [
+                    "list%d" % list_number,
+                    "choice%d" % number,
+                    "Choice %d" % number,
+                    "%dAAAAA" % number,
+                ]
+            )
+
+    return rows
+
+
+def generate_xlsform(path: str, size: FormSize) -> None:
+    """Writes an XLSForm of ``size`` to ``path``."""
+    sheets: Dict[str, List[List[str]]] = {
+        "survey": survey_rows(size),
+        "choices": choices_rows(size),
+    }
+    write_workbook(path, sheets)
+
+
+def main() -> None:
+    """Writes an XLSForm of the size given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="medium")
+    parser.add_argument("--groups", type=int)
+    parser.add_argument("--questions", type=int, help="Questions per group.")
+    parser.add_argument("--choices", type=int, help="Choices per list.")
+    parser.add_argument("--lists", type=int, help="Number of choice lists.")
+    args = parser.parse_args()
+
+    size = PRESETS[args.preset]
+    changes = {
+        field: getattr(args, field)
+        for field in ("groups", "questions", "choices", "lists")
+        if getattr(args, field) is not None
+    }
+    generate_xlsform(args.path, size._replace(**changes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Stage benchmarks.
+
+Generates XLSForms with ``benchmarks.generate`` and times each conversion
+stage on its own: parsing the workbook, building the survey, creating the
+native form and writing the JSON. The best time of ``--repeat`` runs, the
+questions converted per second and the peak memory use of each stage are
+reported and compared to ``benchmarks/baseline.json``, exits with status 1 if
+a stage is slower or uses more memory than the baseline allows. The size and
+encoding time of each installed output format, see ``xlson.encoders``, are
+reported alongside::
+
+    $ python -m benchmarks.stages --preset small --preset medium
+    $ python -m benchmarks.stages --save-baseline
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import xlson
+from xlson.encoders import available_formats, write_form
+from xlson.reader import read_xlsform
+from xlson.writer import write_native_form
+
+from benchmarks.generate import PRESETS, FormSize, generate_xlsform
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Slowdowns under a millisecond are noise.
+MIN_SLOWDOWN = 0.001
+
+
+class Stage(NamedTuple):
+    """A conversion stage, ``function`` is called with the result of the
+    ``source`` stage, or the XLSForm path when ``source`` is None."""
+
+    name: str
+    source: Optional[str]
+    function: Callable[[Any], Any]
+
+
+def _serialise(form: Dict, compact: bool = False) -> str:
+    output = io.StringIO()
+    write_native_form(form, output, compact)
+    return output.getvalue()
+
+
+def _build_survey_object(survey_dict: Dict) -> Dict:
+    return xlson.build_survey(survey_dict, survey_builder=True)
+
+
+STAGES = (
+    Stage("parse", None, xlson.parse_file_to_json),
+    Stage("parse_streaming", None, read_xlsform),
+    Stage("build", "parse", xlson.normalize_survey),
+    Stage("build_survey_builder", "parse", _build_survey_object),
+    Stage("create_native_form", "build", xlson.create_native_form),
+    Stage("serialise", "create_native_form", _serialise),
+    Stage(
+        "serialise_compact", "create_native_form", lambda form: _serialise(form, True)
+    ),
+)
+
+
+class Measure(NamedTuple):
+    """The best time in seconds and the peak memory use in bytes of a
+    stage."""
+
+    seconds: float
+    peak_bytes: int
+
+
+def measure(
+    function: Callable[[Any], Any], argument: Any, repeat: int
+) -> Tuple[Measure, Any]:
+    """Returns the ``Measure`` and the result of ``function(argument)``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+
+    # Memory is measured separately as tracing slows everything down.
+    tracemalloc.start()
+    try:
+        result = function(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return Measure(best, peak), result
+
+
+def run_stages(path: str, repeat: int) -> Dict[str, Measure]:
+    """Measures each of ``STAGES`` on the XLSForm at ``path``."""
+    results: Dict[str, Any] = {}
+    measures = {}
+    for stage in STAGES:
+        argument = path if stage.source is None else results[stage.source]
+        measures[stage.name], results[stage.name] = measure(
+            stage.function, argument, repeat
+        )
+
+    return measures
+
+
+class Encoding(NamedTuple):
+    """The best encoding time in seconds and the size in bytes of a form in
+    an output format."""
+
+    seconds: float
+    size: int
+
+
+def run_formats(path: str, repeat: int) -> Dict[str, Encoding]:
+    """Measures writing the native form of the XLSForm at ``path`` in each
+    installed output format, the JSON formats without indentation."""
+    form = xlson.convert_xlsform(path)
+    encodings = {}
+    for output_format in available_formats():
+        best = float("inf")
+        for _ in range(repeat):
+            output = io.BytesIO()
+            start = time.perf_counter()
+            write_form(form, output, output_format, compact=True)
+            best = min(best, time.perf_counter() - start)
+        encodings[output_format] = Encoding(best, len(output.getvalue()))
+
+    return encodings
+
+
+def run_preset(
+    size: FormSize, repeat: int
+) -> Tuple[Dict[str, Measure], Dict[str, Encoding]]:
+    """Generates an XLSForm of ``size``, measures each stage and output
+    format on it."""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "benchmark.xlsx")
+        generate_xlsform(path, size)
+        return run_stages(path, repeat), run_formats(path, repeat)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def compare(
+    measures: Dict[str, Measure],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    memory_tolerance: float,
+) -> List[str]:
+    """Returns the regressions of ``measures`` against ``baseline``, a stage
+    regresses when it is slower or uses more memory than the baseline by more
+    than the tolerance ratio, and by over ``MIN_SLOWDOWN`` for time."""
+    regressions: List[str] = []
+    for name, current in measures.items():
+        if name not in baseline:
+            continue
+        expected = Measure(**baseline[name])
+        if current.seconds > max(
+            expected.seconds * (1 + tolerance), expected.seconds + MIN_SLOWDOWN
+        ):
+            regressions.append(
+                "%s: %.1f ms, baseline %.1f ms"
+                % (name, current.seconds * 1000, expected.seconds * 1000)
+            )
+        if current.peak_bytes > expected.peak_bytes * (1 + memory_tolerance):
+            regressions.append(
+                "%s: peak %.2f MB, baseline %.2f MB"
+                % (name, current.peak_bytes / 1e6, expected.peak_bytes / 1e6)
+            )
+
+    return regressions
+
+
+def report(
+    preset: str,
+    size: FormSize,
+    measures: Dict[str, Measure],
+    encodings: Dict[str, Encoding],
+) -> None:
+    """Prints the measures and encodings of a preset."""
+    print(
+        "%s: %d groups x %d questions, %d lists of %d choices"
+        % (preset, size.groups, size.questions, size.lists, size.choices)
+    )
+    for name, current in measures.items():
+        print(
+            "  %-22s %10.2f ms %12.0f questions/s %9.2f MB peak"
+            % (
+                name,
+                current.seconds * 1000,
+                size.total_questions / current.seconds,
+                current.peak_bytes / 1e6,
+            )
+        )
+    json_size = encodings["json"].size
+    for output_format, encoding in encodings.items():
+        print(
+            "  %-22s %10.2f ms %12d bytes %9.0f%% of json"
+            % (
+                "format " + output_format,
+                encoding.seconds * 1000,
+                encoding.size,
+                100.0 * encoding.size / json_size,
+            )
+        )
+
+
+def main() -> int:
+    """Runs the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--preset", action="append", choices=sorted(PRESETS), help="Repeatable."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="Allowed slowdown ratio."
+    )
+    parser.add_argument(
+        "--memory-tolerance", type=float, default=0.1, help="Allowed memory ratio."
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results.")
+    args = parser.parse_args()
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {}
+
+    results = {}
+    formats = {}
+    regressions: List[str] = []
+    for preset in args.preset or ["small", "medium"]:
+        size = PRESETS[preset]
+        measures, encodings = run_preset(size, args.repeat)
+        results[preset] = {
+            name: current._asdict() for name, current in measures.items()
+        }
+        formats[preset] = {
+            name: encoding._asdict() for name, encoding in encodings.items()
+        }
+        if not args.json:
+            report(preset, size, measures, encodings)
+        regressions.extend(
+            "%s %s" % (preset, regression)
+            for regression in compare(
+                measures,
+                baseline.get(preset, {}),
+                args.tolerance,
+                args.memory_tolerance,
+            )
+        )
+
+    if args.json:
+        print(json.dumps({"stages": results, "formats": formats}, indent=4))
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+            baseline_file.write("\n")
+        return 0
+    for regression in regressions:
+        print("REGRESSION %s" % regression, file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
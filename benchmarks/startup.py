@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Startup time benchmark.
+
+Runs ``python -X importtime`` on importing xlson and on ``xlson --help`` and
+reports the best cumulative import time of each, exits with status 1 when a
+statement is slower than ``--max-ms`` or imports a module it should not::
+
+    $ python benchmarks/startup.py --max-ms 100
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules only some commands need, imported when they run.
+SLOW_MODULES = (
+    "sqlite3",
+    "concurrent.futures.process",
+    "multiprocessing",
+    "logging",
+    "orjson",
+    "msgpack",
+    "cbor2",
+    "zstandard",
+)
+# statement -> modules it must not import, with the modules in them
+STATEMENTS = {
+    "import xlson": ("click", "pyxform") + SLOW_MODULES,
+    "import xlson.reader, xlson.writer": ("click", "pyxform") + SLOW_MODULES,
+    "from xlson.commands import cli; cli.main(['--help'], standalone_mode=False)": (
+        "pyxform",
+    )
+    + SLOW_MODULES,
+}
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def import_times(statement: str) -> List[Tuple[str, int, bool]]:
+    """Returns the modules imported by running ``statement`` in a new
+    interpreter with their cumulative import time in microseconds and whether
+    they were imported directly rather than by another module."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            times.append((match.group(4), int(match.group(2)), not match.group(3)))
+
+    return times
+
+
+def measure(statement: str, repeat: int) -> Tuple[float, Set[str]]:
+    """Returns the best import time in milliseconds of ``statement`` and the
+    modules it imports, modules imported at interpreter startup are left out."""
+    startup = {module for module, _time, _top in import_times("pass")}
+    best = None
+    modules: Set[str] = set()
+    for _ in range(repeat):
+        times = import_times(statement)
+        total = sum(
+            cumulative
+            for module, cumulative, top in times
+            if top and module not in startup
+        )
+        best = total if best is None else min(best, total)
+        modules = {module for module, _time, _top in times} - startup
+
+    return (best or 0) / 1000.0, modules
+
+
+def main() -> int:
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="Fail above this time.")
+    args = parser.parse_args()
+
+    failed = False
+    for statement, forbidden in STATEMENTS.items():
+        milliseconds, modules = measure(statement, args.repeat)
+        imported = sorted(
+            {
+                name
+                for name in forbidden
+                for module in modules
+                if module == name or module.startswith(name + ".")
+            }
+        )
+        status = "ok"
+        if imported or (args.max_ms is not None and milliseconds > args.max_ms):
+            status = "FAILED"
+            failed = True
+        print("%8.1f ms  %-6s %s" % (milliseconds, status, statement))
+        if imported:
+            print("             imports %s" % ", ".join(imported))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal xlsx workbook writer.
+
+Writes the generated benchmark XLSForms and the XLSForms of the tests, read
+back by pyxform and ``xlson.xlsx``.
+"""
+
+import zipfile
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+from xlson.xlsx import column_name
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    "%s</Types>"
+)
+SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet%d.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.'
+    'openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    "</Relationships>"
+)
+
+
+def write_workbook(path: str, sheets: Dict[str, List[List[str]]]) -> None:
+    """Writes a minimal xlsx workbook with a worksheet of inline string cells
+    per ``sheets`` item."""
+    workbook_sheets = []
+    workbook_rels = []
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for number, (name, rows) in enumerate(sheets.items(), 1):
+            workbook_sheets.append(
+                '<sheet name="%s" sheetId="%d" r:id="rId%d"/>'
+                % (escape(name, {'"': "&quot;"}), number, number)
+            )
+            workbook_rels.append(
+                '<Relationship Id="rId%d" Target="worksheets/sheet%d.xml" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                'relationships/worksheet"/>' % (number, number)
+            )
+            with archive.open("xl/worksheets/sheet%d.xml" % number, "w") as sheet:
+                sheet.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                    b'spreadsheetml/2006/main"><sheetData>'
+                )
+                for row_number, row in enumerate(rows, 1):
+                    cells = "".join(
+                        '<c r="%s%d" t="inlineStr"><is><t>%s</t></is></c>'
+                        % (column_name(index), row_number, escape(value))
+                        for index, value in enumerate(row)
+                        if value
+                    )
+                    sheet.write(
+                        ('<row r="%d">%s</row>' % (row_number, cells)).encode("utf-8")
+                    )
+                sheet.write(b"</sheetData></worksheet>")
+
+        archive.writestr(
+            "[Content_Types].xml",
+            CONTENT_TYPES
+            % "".join(
+                SHEET_CONTENT_TYPE % number for number in range(1, len(sheets) + 1)
+            ),
+        )
+        archive.writestr("_rels/.rels", PACKAGE_RELS)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            "<sheets>%s</sheets></workbook>" % "".join(workbook_sheets),
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+            'relationships">%s</Relationships>' % "".join(workbook_rels),
+        )
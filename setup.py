@@ -11,7 +11,7 @@ setup(
     version="0.0.1",
     author="github.com/opensrp",
     author_email="info@smartregister.org",
-    packages=find_packages(),
+    packages=find_packages(exclude=("benchmarks",)),
     url="https://github.com/opensrp/xlson",
     description="A Python package to convert XLSForms to native form JSON.",
     long_description=open("README.rst", "rt").read(),
@@ -28,5 +28,5 @@ setup(
         "Programming Language :: Python :: 3 :: Only",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
-    entry_points={"console_scripts": ["xlson=xlson:cli"]},
+    entry_points={"console_scripts": ["xlson=xlson.commands:cli"]},
 )
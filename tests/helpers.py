@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the tests.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyxform.tests_v1.pyxform_test_case import md_table_to_ss_structure
+
+import xlson
+
+from benchmarks.workbook import write_workbook
+
+FORM_MD = """
+    | survey  |
+    |         | type          | name  | label  |
+    |         | begin group   | step1 | %s     |
+    |         | text          | name  | Name?  |
+    |         | select_one yn | ok    | Is ok? |
+    |         | end group     |       |        |
+    | choices |
+    |         | list_name | name | label | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes   | 1065AAA                     |
+    |         | yn        | no   | No    | 1066AAA                     |
+    """
+
+
+def write_xlsform(path: str, form_md: str) -> None:
+    """Writes the XLSForm of the markdown tables ``form_md`` to ``path``."""
+    write_workbook(path, dict(md_table_to_ss_structure(form_md)))
+
+
+def write_form(path: str, title: str = "Step 1", form_md: str = FORM_MD) -> None:
+    """Writes the ``form_md`` XLSForm, FORM_MD by default, with ``title`` as
+    the first step's title."""
+    write_xlsform(path, form_md % title)
+
+
+def normalized(survey_dict: dict) -> dict:
+    """Returns the normalised ``survey_dict``, which must not need pyxform."""
+    survey = xlson.normalize_survey(survey_dict)
+    if survey is None:
+        raise AssertionError("The survey needs the pyxform Survey.")
+
+    return survey
+
+
+class TmpDirTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory, ``tmp_dir``, removed after each test.
+    The default cache directory is inside it, the user's cache is left alone.
+    """
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        cache_home = mock.patch.dict(os.environ, XDG_CACHE_HOME=self.tmp_dir)
+        cache_home.start()
+        self.addCleanup(cache_home.stop)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
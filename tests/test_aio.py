@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.aio module.
+"""
+
+import asyncio
+import io
+import json
+import os
+import time
+import unittest
+from typing import Any, Awaitable, Iterator, List
+
+import xlson
+from xlson.aio import AsyncConverter, Converted
+
+from tests.helpers import TmpDirTestCase, write_form
+
+
+def run(awaitable: Awaitable) -> Any:
+    """Runs ``awaitable`` in a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(awaitable)
+    finally:
+        loop.close()
+
+
+class SlowFile(io.BytesIO):
+    """A file taking ``delay`` seconds to read."""
+
+    def __init__(self, data: bytes, delay: float) -> None:
+        super().__init__(data)
+        self.delay = delay
+
+    def read(self, *args: Any) -> bytes:
+        time.sleep(self.delay)
+        return super().read(*args)
+
+
+class TestAsyncConverter(TmpDirTestCase):
+    """
+    Test converting XLSForms from asyncio code.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "form.xlsx")
+        write_form(self.path)
+        with open(self.path, "rb") as xlsform_file:
+            self.data = xlsform_file.read()
+        self.expected = xlson.convert_xlsform(self.path)
+
+    def test_convert(self) -> None:
+        """Test XLSForms are converted in worker processes and threads."""
+
+        async def convert(converter: AsyncConverter) -> List:
+            async with converter:
+                with open(self.path, "rb") as xlsform_file:
+                    converted = await asyncio.gather(
+                        converter.convert(self.path),
+                        converter.convert(self.data, "form.xlsx"),
+                        converter.convert(xlsform_file),
+                        converter.dumps(self.path),
+                    )
+                    return list(converted)
+
+        for processes in (True, False):
+            converter = AsyncConverter(jobs=2, processes=processes, compact=True)
+            *forms, text = run(convert(converter))
+            self.assertEqual(forms, [self.expected] * 3)
+            self.assertEqual(json.loads(text), self.expected)
+            self.assertNotIn("\n ", text)
+            self.assertEqual(converter.pending, 0)
+
+    def test_convert_many(self) -> None:
+        """Test sources are taken as slots free up and errors are returned."""
+        bad_path = os.path.join(self.tmp_dir, "bad.xlsx")
+        with open(bad_path, "wb") as bad_file:
+            bad_file.write(b"not a workbook")
+        taken: List[str] = []
+
+        def sources() -> Iterator[str]:
+            for path in [self.path] * 5 + [bad_path]:
+                taken.append(path)
+                yield path
+
+        async def convert_many(converter: AsyncConverter) -> List[Converted]:
+            results: List[Converted] = []
+            async for converted in converter.convert_many(sources()):
+                self.assertLessEqual(len(taken) - len(results), 2)
+                results.append(converted)
+            return results
+
+        with AsyncConverter(jobs=1, processes=False, max_pending=2) as converter:
+            results = run(convert_many(converter))
+        self.assertEqual(len(results), 6)
+        failed = [converted for converted in results if converted.error]
+        self.assertEqual([converted.source for converted in failed], [bad_path])
+        self.assertIsNone(failed[0].form)
+        self.assertEqual(
+            [converted.form for converted in results if not converted.error],
+            [self.expected] * 5,
+        )
+
+    def test_timeout_and_cancel(self) -> None:
+        """Test slots are held until the worker is done with a conversion."""
+
+        async def convert(converter: AsyncConverter) -> None:
+            with self.assertRaises(asyncio.TimeoutError):
+                await converter.convert(SlowFile(self.data, 0.3), "form.xlsx")
+            self.assertEqual(converter.pending, 1)
+
+            # Waiting for the slot of the conversion still running.
+            waiting = asyncio.ensure_future(converter.convert(self.path))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+            converter.timeout = None
+            self.assertEqual(await converter.convert(self.path), self.expected)
+            self.assertEqual(converter.pending, 0)
+
+        with AsyncConverter(
+            jobs=1, processes=False, max_pending=1, timeout=0.05
+        ) as converter:
+            run(convert(converter))
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_aio")
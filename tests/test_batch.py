@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.batch module.
+"""
+
+import json
+import os
+import shutil
+import unittest
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.batch import collect_xlsforms, convert_many
+
+from tests.helpers import TmpDirTestCase
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample.xlsx")
+
+
+class TestBatch(TmpDirTestCase):
+    """
+    Test converting many XLSForms at once.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.forms_dir = os.path.join(self.tmp_dir, "forms")
+        os.makedirs(os.path.join(self.forms_dir, "nested"))
+        shutil.copy(SAMPLE, os.path.join(self.forms_dir, "a.xlsx"))
+        shutil.copy(SAMPLE, os.path.join(self.forms_dir, "nested", "b.xlsx"))
+        with open(os.path.join(self.forms_dir, "notes.txt"), "w") as notes:
+            notes.write("not a form")
+
+    def test_collect_xlsforms(self) -> None:
+        """Test collect_xlsforms() expands directories and globs."""
+        sources = collect_xlsforms([self.forms_dir])
+        self.assertEqual([source.name for source in sources], ["a.json"])
+
+        sources = collect_xlsforms([self.forms_dir], recursive=True)
+        self.assertEqual(
+            [source.name for source in sources],
+            ["a.json", os.path.join("nested", "b.json")],
+        )
+
+        pattern = os.path.join(self.forms_dir, "**", "*.xlsx")
+        sources = collect_xlsforms([pattern, SAMPLE, SAMPLE], recursive=True)
+        self.assertEqual(
+            [source.name for source in sources], ["a.json", "b.json", "sample.json"]
+        )
+
+        with self.assertRaises(FileNotFoundError):
+            collect_xlsforms([os.path.join(self.forms_dir, "missing.xlsx")])
+
+        other = os.path.join(self.tmp_dir, "other", "a.xlsx")
+        os.makedirs(os.path.dirname(other))
+        shutil.copy(SAMPLE, other)
+        with self.assertRaises(ValueError):
+            collect_xlsforms([os.path.join(self.forms_dir, "a.xlsx"), other])
+
+    def test_convert_many(self) -> None:
+        """Test convert_many() writes a JSON file per XLSForm and reports
+        failures."""
+        broken = os.path.join(self.forms_dir, "broken.xlsx")
+        with open(broken, "w") as broken_file:
+            broken_file.write("not a workbook")
+
+        output_dir = os.path.join(self.tmp_dir, "out")
+        sources = collect_xlsforms([self.forms_dir], recursive=True)
+        results = list(convert_many(sources, output_dir, jobs=2))
+
+        self.assertEqual(
+            [result.path for result in results], [source.path for source in sources]
+        )
+        failed = [result for result in results if result.error]
+        self.assertEqual([result.path for result in failed], [broken])
+
+        with open(os.path.join(output_dir, "nested", "b.json")) as output_file:
+            form = json.load(output_file)
+        self.assertEqual(form["encounter_type"], "b")
+
+    def test_cli_output_dir(self) -> None:
+        """Test xlson.cli converts many XLSForms into an output directory."""
+        output_dir = os.path.join(self.tmp_dir, "out")
+        runner = CliRunner()
+        result = runner.invoke(xlson.cli, args=(self.forms_dir, "-r", "-j", "1"))
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("--output-dir is required", result.output)
+
+        result = runner.invoke(
+            xlson.cli, args=(self.forms_dir, "-r", "-j", "1", "-o", output_dir)
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("2 converted, 0 failed.", result.output)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "a.json")))
+
+        with open(os.path.join(self.forms_dir, "broken.xlsx"), "w") as broken_file:
+            broken_file.write("not a workbook")
+        result = runner.invoke(xlson.cli, args=(self.forms_dir, "-o", output_dir))
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("1 converted, 1 failed.", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_batch")
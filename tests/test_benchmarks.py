@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Test benchmarks package.
+"""
+
+import os
+import unittest
+
+import xlson
+from xlson.encoders import available_formats
+from benchmarks.generate import FormSize, generate_xlsform
+from benchmarks.stages import STAGES, Measure, compare, run_formats, run_stages
+
+from tests.helpers import TmpDirTestCase
+
+
+class TestBenchmarks(TmpDirTestCase):
+    """
+    Test the XLSForm generator and the stage benchmarks.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "generated.xlsx")
+        self.size = FormSize(groups=2, questions=8, choices=3, lists=2)
+        generate_xlsform(self.path, self.size)
+
+    def test_generate_xlsform(self) -> None:
+        """Test generated XLSForms convert with every question type."""
+        form = xlson.convert_xlsform(self.path)
+        self.assertEqual(list(form), ["encounter_type", "step1", "step2"])
+        fields = form["step1"]["fields"] + form["step2"]["fields"]
+        self.assertEqual(len(fields), self.size.total_questions)
+        self.assertEqual(
+            {field["type"] for field in fields},
+            {
+                "edit_text",
+                "native_radio",
+                "check_box",
+                "gps",
+                "barcode",
+                "choose_image",
+            },
+        )
+        self.assertEqual(len(fields[2]["options"]), 3)
+        self.assertEqual(xlson.convert_xlsform(self.path, streaming=True), form)
+
+    def test_stages(self) -> None:
+        """Test each stage is measured and compared to the baseline."""
+        measures = run_stages(self.path, repeat=1)
+        self.assertEqual(list(measures), [stage.name for stage in STAGES])
+        for current in measures.values():
+            self.assertGreater(current.seconds, 0)
+            self.assertGreater(current.peak_bytes, 0)
+
+        baseline = {
+            "parse": {"seconds": 10.0, "peak_bytes": 10**9},
+            "build": {"seconds": 0.0, "peak_bytes": 10**9},
+        }
+        self.assertEqual(compare(measures, baseline, 0.5, 0.1), [])
+        slower = dict(measures, build=Measure(0.002, 2 * 10**9))
+        self.assertEqual(
+            compare(slower, baseline, 0.5, 0.1),
+            [
+                "build: 2.0 ms, baseline 0.0 ms",
+                "build: peak 2000.00 MB, baseline 1000.00 MB",
+            ],
+        )
+
+    def test_formats(self) -> None:
+        """Test the size and encoding time of each output format."""
+        encodings = run_formats(self.path, repeat=1)
+        self.assertEqual(list(encodings), available_formats())
+        self.assertLess(encodings["json.gz"].size, encodings["json"].size / 2)
+        for encoding in encodings.values():
+            self.assertGreater(encoding.seconds, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_benchmarks")
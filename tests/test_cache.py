@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.cache module.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from typing import Any, Dict
+from unittest import mock
+
+import xlson
+from xlson.cache import FORM, INDEX_DIR, SURVEY, Cache
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample.xlsx")
+
+
+class TestCache(unittest.TestCase):
+    """
+    Test the XLSForm cache.
+    """
+
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir)
+
+    def test_key(self) -> None:
+        """Test Cache.key() depends on the file name, content and options."""
+        key = Cache.key("forms/sample.xlsx", b"data")
+        self.assertEqual(key, Cache.key("other/sample.xlsx", b"data"))
+        self.assertNotEqual(key, Cache.key("forms/sample.xlsx", b"changed"))
+        self.assertNotEqual(key, Cache.key("forms/renamed.xlsx", b"data"))
+        self.assertNotEqual(key, Cache.key("forms/sample.xlsx", b"data", ("x",)))
+
+    def test_get_set_prune(self) -> None:
+        """Test Cache.prune() evicts the least recently used entries and keeps
+        the indexes."""
+        cache = Cache(self.cache_dir, max_size=20)
+        self.assertIsNone(cache.get("aabb", SURVEY))
+
+        cache.set("aabb", SURVEY, {"name": "first"})
+        cache.set("ccdd", SURVEY, {"name": "second"})
+        self.assertEqual(cache.get("aabb", SURVEY), {"name": "first"})
+
+        past = time.time() - 60
+        os.utime(cache._path("ccdd", SURVEY), (past, past))
+        index = os.path.join(self.cache_dir, INDEX_DIR, "concepts.sqlite")
+        os.makedirs(os.path.dirname(index))
+        with open(index, "w") as index_file:
+            index_file.write("kept however old and large")
+        os.utime(index, (0, 0))
+        self.assertEqual(cache.prune(), 1)
+        self.assertTrue(os.path.exists(index))
+        self.assertEqual(cache.get("aabb", SURVEY), {"name": "first"})
+        self.assertIsNone(cache.get("ccdd", SURVEY))
+
+    def test_convert_xlsform(self) -> None:
+        """Test xlson.convert_xlsform() only parses an XLSForm once and
+        caches the forms built with other options apart."""
+        cache = Cache(self.cache_dir)
+        expected = xlson.convert_xlsform(SAMPLE)
+        xlson.convert_xlsform(SAMPLE, cache=cache, streaming=True)
+        with mock.patch(
+            "xlson.parse_file_to_json", wraps=xlson.parse_file_to_json
+        ) as parse:
+            self.assertEqual(xlson.convert_xlsform(SAMPLE, cache=cache), expected)
+            self.assertEqual(xlson.convert_xlsform(SAMPLE, cache=cache), expected)
+            self.assertEqual(parse.call_count, 1)
+
+            with open(SAMPLE, "rb") as sample:
+                options = ("survey_builder=False", "streaming=False")
+                key = Cache.key(SAMPLE, sample.read(), options)
+            self.assertEqual(cache.get(key, FORM), expected)
+            os.remove(cache._path(key, FORM))
+            self.assertEqual(xlson.convert_xlsform(SAMPLE, cache=cache), expected)
+            self.assertEqual(parse.call_count, 1)
+
+    def test_custom_builders(self) -> None:
+        """Test forms built with other field builders than xlson's are not
+        served from or written to the cache."""
+        cache = Cache(self.cache_dir)
+        expected = xlson.convert_xlsform(SAMPLE, cache=cache)
+
+        def build_text(**kwargs: Any) -> Dict:
+            return {"key": kwargs["name"], "type": "custom"}
+
+        with mock.patch.dict(xlson.FIELD_BUILDERS, text=build_text):
+            self.assertTrue(xlson.custom_builders())
+            form = xlson.convert_xlsform(SAMPLE, cache=cache)
+        self.assertEqual(form["step1"]["fields"][0]["type"], "custom")
+        self.assertFalse(xlson.custom_builders())
+        self.assertEqual(xlson.convert_xlsform(SAMPLE, cache=cache), expected)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_cache")
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.calculations module.
+"""
+
+import os
+import time
+import unittest
+import warnings
+
+from xlson.batch import Source, convert_to_file
+from xlson.calculations import (
+    CalculationCycleError,
+    UntranslatedCalculationWarning,
+    build_rules,
+)
+from xlson.watch import Watcher
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+RULES = "anc_calculation_rules.yml"
+
+FORM_MD = """
+    | survey  |
+    |         | type        | name     | label  | calculation                                                     |
+    |         | begin group | visit    | Visit  |                                                                 |
+    |         | integer     | weight   | Weight |                                                                 |
+    |         | integer     | height   | Height |                                                                 |
+    |         | calculate   | bmi      |        | ${weight} div (${height_m} * ${height_m})                       |
+    |         | calculate   | height_m |        | ${height} div 100                                               |
+    |         | calculate   | obese    |        | if(${weight} div (${height_m} * ${height_m}) > 30, 'yes', 'no') |
+    |         | end group   |          |        |                                                                 |
+    """
+
+
+def step(name: str) -> str:
+    """Returns the step of every field."""
+    return "step1"
+
+
+class TestCalculations(TmpDirTestCase):
+    """
+    Test building calculation rules.
+    """
+
+    def test_build_rules(self) -> None:
+        """Test rules are ordered on their dependencies and share the
+        expressions of other calculations."""
+        rules = build_rules(
+            [
+                ("total", "${a} + ${b} * -2"),
+                ("a", "${x} mod 7"),
+                ("b", "${x} mod 7 + 1"),
+                ("label", "concat('total: ', ${total})"),
+            ],
+            step,
+        )
+        self.assertEqual(
+            [(rule["description"], rule["actions"]) for rule in rules],
+            [
+                ("a", ["calculation = step1_x % 7"]),
+                ("b", ["calculation = step1_a + 1"]),
+                ("total", ["calculation = step1_a + (step1_b * -2)"]),
+                ("label", ["calculation = '' + 'total: ' + step1_total"]),
+            ],
+        )
+        self.assertEqual([rule["priority"] for rule in rules], [1, 2, 3, 4])
+        self.assertEqual(rules[0]["name"], "step1_a")
+
+        rules = build_rules(
+            [
+                ("zero", "0"),
+                ("copy", "${x}"),
+                ("flag", "if(${x} > 0, 1, 0)"),
+                ("double", "${copy} * 2"),
+            ],
+            step,
+        )
+        self.assertEqual(
+            [rule["actions"] for rule in rules],
+            [
+                ["calculation = 0"],
+                ["calculation = step1_x"],
+                ["calculation = (step1_x > 0) ? 1 : 0"],
+                ["calculation = step1_copy * 2"],
+            ],
+        )
+
+        with self.assertRaises(CalculationCycleError) as raised:
+            build_rules([("a", "${c} + 1"), ("b", "${a}"), ("c", "${b} * 2")], step)
+        self.assertIn("a -> c -> b -> a", str(raised.exception))
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            rules = build_rules([("a", "${x} +"), ("b", "count(${x})")], step)
+        self.assertEqual(rules, [])
+        self.assertEqual(
+            [warning.category for warning in caught],
+            [UntranslatedCalculationWarning] * 2,
+        )
+
+    def test_long_chain(self) -> None:
+        """Test a long chain of calculations is ordered in linear time."""
+        size = 5000
+        calculations = [("c0", "${x} + 1")] + [
+            ("c%d" % index, "${c%d} + 1" % (index - 1)) for index in range(1, size)
+        ]
+        start = time.perf_counter()
+        rules = build_rules(list(reversed(calculations)), step)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(
+            [rule["description"] for rule in rules], [key for key, _ in calculations]
+        )
+        self.assertLess(elapsed, 1.0)
+
+    def test_convert(self) -> None:
+        """Test converted forms have hidden fields and their rules file, from
+        batch conversions and the watcher."""
+        path = os.path.join(self.tmp_dir, "anc.xlsx")
+        write_xlsform(path, FORM_MD)
+        for streaming in (False, True):
+            output_dir = os.path.join(self.tmp_dir, "build%d" % streaming)
+            result = convert_to_file(
+                Source(path, "anc.xlsx"), output_dir, {"streaming": streaming}
+            )
+            self.assertIsNone(result.error)
+            with open(os.path.join(output_dir, RULES)) as rules:
+                self.assertEqual(
+                    rules.read(),
+                    "---\nname: visit_height_m\n"
+                    'description: "height_m"\npriority: 1\n'
+                    'condition: "true"\nactions:\n'
+                    '  - "calculation = visit_height / 100"\n'
+                    "---\nname: visit_bmi\n"
+                    'description: "bmi"\npriority: 2\n'
+                    'condition: "true"\nactions:\n'
+                    '  - "calculation = visit_weight / (visit_height_m * '
+                    'visit_height_m)"\n'
+                    "---\nname: visit_obese\n"
+                    'description: "obese"\npriority: 3\n'
+                    'condition: "true"\nactions:\n'
+                    "  - \"calculation = (visit_bmi > 30) ? 'yes' : 'no'\"\n",
+                )
+
+        # Forms converted on save get their rules file too.
+        watcher = Watcher([path], os.path.join(self.tmp_dir, "watched"))
+        self.assertIsNone(watcher.poll()[0].error)
+        with open(os.path.join(self.tmp_dir, "build0", RULES)) as expected:
+            with open(os.path.join(self.tmp_dir, "watched", RULES)) as rules:
+                self.assertEqual(rules.read(), expected.read())
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_calculations")
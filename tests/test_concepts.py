@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.concepts module.
+"""
+
+import os
+import pickle
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.commands import cli
+from xlson.concepts import (
+    Concept,
+    ConceptIndex,
+    _resolve_options,
+    iter_resolved_concepts,
+)
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type          | name | label | openmrs_entity_id |
+    |         | begin group   | hiv  | HIV   |                   |
+    |         | select_one yn | test | Test  |                   |
+    |         | text          | art  | ART   | 5000AAA           |
+    |         | end group     |      |       |                   |
+    | choices |
+    |         | list_name | name | label | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes   |                             |
+    |         | yn        | no   | No    | 1066AAA                     |
+    """
+
+CONCEPTS_CSV = """name,openmrs_entity,openmrs_entity_id,openmrs_entity_parent
+test,concept,1000AAA,
+art,concept,1001AAA,
+yes,concept,1065AAA,
+no,concept,9999AAA,
+%s
+"""
+
+
+class TestConcepts(TmpDirTestCase):
+    """
+    Test resolving fields and options against a concept dictionary.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.csv_path = os.path.join(self.tmp_dir, "concepts.csv")
+        extra = "\n".join("c%d,concept,%dAAA," % (i, i) for i in range(2000))
+        with open(self.csv_path, "w", encoding="utf-8") as csv_file:
+            csv_file.write(CONCEPTS_CSV % extra)
+
+    def test_index(self) -> None:
+        """Test the index is built once and looked up in batches."""
+        index_dir = os.path.join(self.tmp_dir, "index")
+        index = ConceptIndex.open(self.csv_path, index_dir)
+        with mock.patch.object(ConceptIndex, "build") as build:
+            self.assertEqual(
+                ConceptIndex.open(self.csv_path, index_dir).path, index.path
+            )
+        build.assert_not_called()
+
+        names = ["c%d" % i for i in range(1500)] + ["yes", "missing"]
+        found = pickle.loads(pickle.dumps(index)).lookup(names)
+        self.assertEqual(len(found), 1501)
+        self.assertEqual(found["yes"], Concept("concept", "1065AAA", ""))
+
+        with open(self.csv_path, "a", encoding="utf-8") as csv_file:
+            csv_file.write("extra,concept,1AAA,\n")
+        self.assertNotEqual(
+            ConceptIndex.open(self.csv_path, index_dir).path, index.path
+        )
+
+    def test_shared_options(self) -> None:
+        """Test the options shared by fields are resolved once."""
+        options = [{"key": "yes", "openmrs_entity_id": ""}]
+        fields = [
+            {"key": key, "openmrs_entity_id": "1000AAA", "options": options}
+            for key in ("a", "b")
+        ]
+        index = ConceptIndex.open(self.csv_path, self.tmp_dir)
+        with mock.patch(
+            "xlson.concepts._resolve_options", wraps=_resolve_options
+        ) as resolve:
+            ((_, step),) = iter_resolved_concepts(
+                [("step1", {"fields": fields})], index
+            )
+        self.assertEqual(resolve.call_count, 1)
+        first, second = step["fields"]
+        self.assertIs(first["options"], second["options"])
+        self.assertEqual(first["options"][0]["openmrs_entity_id"], "1065AAA")
+        self.assertEqual(options[0]["openmrs_entity_id"], "")
+
+    def test_convert(self) -> None:
+        """Test empty openmrs values are filled and set ones kept."""
+        path = os.path.join(self.tmp_dir, "anc.xlsx")
+        write_xlsform(path, FORM_MD)
+        index = ConceptIndex.open(self.csv_path, self.tmp_dir)
+        with mock.patch.object(index, "lookup", wraps=index.lookup) as lookup:
+            form = xlson.convert_xlsform(path, concepts=index)
+        self.assertEqual(lookup.call_count, 1)
+
+        test, art = form["hiv"]["fields"]
+        self.assertEqual(
+            (test["openmrs_entity"], test["openmrs_entity_id"]), ("concept", "1000AAA")
+        )
+        self.assertEqual(
+            (art["openmrs_entity"], art["openmrs_entity_id"]), ("concept", "5000AAA")
+        )
+        self.assertEqual(
+            [
+                (
+                    option["openmrs_entity"],
+                    option["openmrs_entity_id"],
+                    option["openmrs_entity_parent"],
+                )
+                for option in test["options"]
+            ],
+            [("concept", "1065AAA", "1000AAA"), ("concept", "1066AAA", "1000AAA")],
+        )
+        self.assertEqual(xlson.Converter(concepts=index).convert(path), form)
+
+        result = CliRunner().invoke(
+            cli,
+            ["--no-cache", "--cache-dir", self.tmp_dir, "--concepts", self.csv_path]
+            + [path],
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('"1065AAA"', result.output)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_concepts")
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.constraints module.
+"""
+
+import os
+import unittest
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.commands import cli
+from xlson.constraints import constraint_regex
+from xlson.xpath import XPathSyntaxError
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type        | name  | label | constraint | required |
+    |         | begin group | visit | Visit |            |          |
+    |         | text        | name  | Name  | %s         | yes      |
+    |         | text        | phone | Phone | %s         | %s       |
+    |         | end group   |       |       |            |          |
+    """
+
+
+class TestConstraints(TmpDirTestCase):
+    """
+    Test parsing and checking constraints.
+    """
+
+    def test_constraint_regex(self) -> None:
+        """Test the regex pattern of constraints."""
+        self.assertEqual(constraint_regex("regex(., '[0-9]{10}')"), "[0-9]{10}")
+        self.assertEqual(
+            constraint_regex("regex(., \"^[A-Za-z' ]+$\") and . != 'none'"),
+            "^[A-Za-z' ]+$",
+        )
+        self.assertIsNone(constraint_regex(". > 5"))
+        self.assertIsNone(constraint_regex("regex(${other}, 'x')"))
+        with self.assertRaises(XPathSyntaxError):
+            constraint_regex("regex(., 'x'")
+
+    def test_convert_and_check(self) -> None:
+        """Test converted fields get their pattern and check reports broken
+        constraints and required flags, and warns of the constraints it can
+        not parse."""
+        good = os.path.join(self.tmp_dir, "good.xlsx")
+        name = 'regex(., "^[A-Za-z\' ]+$")'
+        form_md = FORM_MD % (name, "regex(., '^[0-9]{10}$')", "no")
+        write_xlsform(good, form_md)
+        form = xlson.convert_xlsform(good)
+        self.assertEqual(
+            [field["v_regex"]["value"] for field in form["visit"]["fields"]],
+            ["^[A-Za-z' ]+$", "^[0-9]{10}$"],
+        )
+
+        bad = os.path.join(self.tmp_dir, "bad.xlsx")
+        form_md = FORM_MD % (name, "regex(., '[0-9')", "${name} != ''")
+        write_xlsform(bad, form_md)
+
+        paths = os.path.join(self.tmp_dir, "paths.xlsx")
+        form_md = FORM_MD % ("/data/phone != ''", ". != ${nickname}", "no")
+        write_xlsform(paths, form_md)
+
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(cli, ["check", good])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.stdout, "")
+
+        result = runner.invoke(cli, ["check", "--jobs", "2", self.tmp_dir])
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(
+            result.stdout.splitlines(),
+            [
+                "%s: phone: regex '[0-9' does not compile: unterminated "
+                "character set at position 0." % bad,
+                "%s: phone: required '${name} != ''' is not yes or no." % bad,
+                "%s: phone: constraint refers to unknown ${nickname}." % paths,
+            ],
+        )
+        self.assertIn(
+            "warning: %s: name: constraint not checked" % paths, result.stderr
+        )
+        self.assertIn("3 XLSForms checked, 3 problems, 1 warnings.", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_constraints")
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.converter module.
+"""
+
+import io
+import json
+import os
+import pathlib
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import xlson
+from xlson.cache import Cache
+from xlson.converter import Converter
+
+from tests.helpers import TmpDirTestCase, write_form
+
+
+class TestConverter(TmpDirTestCase):
+    """
+    Test converting XLSForms with a reusable converter.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.paths = []
+        for number in range(4):
+            path = os.path.join(self.tmp_dir, "form%d.xlsx" % number)
+            title = "Step %d" % number
+            write_form(path, title)
+            self.paths.append(path)
+        self.path = self.paths[0]
+
+    def test_sources(self) -> None:
+        """Test XLSForms are converted from paths, bytes and file objects."""
+        expected = xlson.convert_xlsform(self.path)
+        converter = Converter()
+        with open(self.path, "rb") as xlsform_file:
+            data = xlsform_file.read()
+            xlsform_file.seek(0)
+            self.assertEqual(converter.convert(xlsform_file), expected)
+        self.assertEqual(converter.convert(self.path), expected)
+        self.assertEqual(converter.convert(pathlib.Path(self.path)), expected)
+        self.assertEqual(converter.convert(data, name="form0.xlsx"), expected)
+        self.assertEqual(converter.convert(io.BytesIO(data), "form0.xlsx"), expected)
+
+        form = converter.convert(data)
+        self.assertEqual(form["encounter_type"], "form")
+        form = converter.convert(self.path, name="visit.xlsx")
+        self.assertEqual(form["encounter_type"], "visit")
+        self.assertEqual(form["step1"], expected["step1"])
+
+    def test_options(self) -> None:
+        """Test the converter options apply to every conversion."""
+        converter = Converter(
+            cache=Cache(os.path.join(self.tmp_dir, "cache")),
+            streaming=True,
+            shared_choices=True,
+            compact=True,
+        )
+        expected = xlson.convert_xlsform(self.path, shared_choices=True)
+        for _ in range(2):
+            text = converter.dumps(self.path)
+            self.assertEqual(json.loads(text), expected)
+            self.assertNotIn("\n ", text)
+        self.assertEqual(
+            list(xlson.Converter().iter_items(self.path))[0][0], "encounter_type"
+        )
+
+    def test_threads(self) -> None:
+        """Test a converter can be shared between threads."""
+        converter = Converter()
+        expected = [xlson.convert_xlsform(path) for path in self.paths]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            forms = list(executor.map(converter.convert, self.paths * 5))
+        self.assertEqual(forms, expected * 5)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_converter")
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.diff module.
+"""
+
+import copy
+import json
+import os
+import random
+import time
+import unittest
+from typing import Any, Dict
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.diff import apply_patch, diff_forms
+
+from tests.helpers import TmpDirTestCase, write_form
+
+
+def field(key: str, **values: object) -> Dict:
+    """Returns a native form field."""
+    return dict({"key": key, "type": "edit_text"}, **values)
+
+
+class TestDiff(TmpDirTestCase):
+    """
+    Test JSON patches between native forms.
+    """
+
+    def test_diff_forms(self) -> None:
+        """Test fields are matched on their key."""
+        old: Dict[str, Any] = {
+            "encounter_type": "anc",
+            "step1": {
+                "title": "Step 1",
+                "fields": [field("a"), field("b"), field("c", hint="C"), field("d")],
+            },
+        }
+        new = copy.deepcopy(old)
+        fields = new["step1"]["fields"]
+        fields.insert(0, fields.pop(3))
+        del fields[2]
+        fields[2]["hint"] = "C?"
+        fields.append(field("e"))
+        new["step2"] = {"title": "a/b~", "fields": []}
+        patch = diff_forms(old, new)
+        self.assertEqual(
+            patch,
+            [
+                {"op": "remove", "path": "/step1/fields/1"},
+                {"op": "move", "from": "/step1/fields/2", "path": "/step1/fields/0"},
+                {"op": "add", "path": "/step1/fields/3", "value": field("e")},
+                {"op": "replace", "path": "/step1/fields/2/hint", "value": "C?"},
+                {"op": "add", "path": "/step2", "value": new["step2"]},
+            ],
+        )
+        self.assertEqual(apply_patch(old, patch), new)
+        self.assertEqual(diff_forms(new, copy.deepcopy(new)), [])
+
+        new = {"a/b~": [1, 2], "fields": [field("a"), field("a")]}
+        old = {"a/b~": [2, 1], "fields": [field("a")]}
+        self.assertEqual(
+            diff_forms(old, new),
+            [
+                {"op": "replace", "path": "/a~1b~0", "value": [1, 2]},
+                {"op": "replace", "path": "/fields", "value": new["fields"]},
+            ],
+        )
+        self.assertEqual(diff_forms({"a": [1]}, {"a": True})[0]["op"], "replace")
+
+    def test_json_types(self) -> None:
+        """Test values Python compares equal but JSON does not are patched."""
+        old = {"step1": {"fields": [field("a", v=1, w=0, x=1)]}}
+        new = {"step1": {"fields": [field("a", v=True, w=False, x=1.0)]}}
+        patch = diff_forms(old, new)
+        self.assertEqual(
+            patch,
+            [
+                {"op": "replace", "path": "/step1/fields/0/v", "value": True},
+                {"op": "replace", "path": "/step1/fields/0/w", "value": False},
+                {"op": "replace", "path": "/step1/fields/0/x", "value": 1.0},
+            ],
+        )
+        self.assertEqual(json.dumps(apply_patch(old, patch)), json.dumps(new))
+        self.assertEqual(
+            diff_forms({"a": {"x": 1}}, {"a": {"x": True}})[0]["op"], "replace"
+        )
+
+    def test_random_changes(self) -> None:
+        """Test patches of random changes give the new form."""
+        rnd = random.Random(7)
+
+        def random_field(key: str) -> Dict:
+            options = [
+                {"key": "o%d" % i, "text": "O"} for i in range(rnd.randint(0, 3))
+            ]
+            return field(key, hint=rnd.randint(0, 2), options=options)
+
+        for _ in range(300):
+            old = {"step1": {"fields": [random_field("f%d" % i) for i in range(8)]}}
+            new = copy.deepcopy(old)
+            fields = new["step1"]["fields"]
+            for _ in range(rnd.randint(0, 5)):
+                choice = rnd.randrange(4)
+                if choice == 0 and fields:
+                    fields.pop(rnd.randrange(len(fields)))
+                elif choice == 1:
+                    index = rnd.randint(0, len(fields))
+                    fields.insert(index, random_field("n%d" % rnd.randint(0, 9)))
+                elif choice == 2 and fields:
+                    moved = fields.pop(rnd.randrange(len(fields)))
+                    fields.insert(rnd.randint(0, len(fields)), moved)
+                elif fields:
+                    rnd.choice(fields)["options"].reverse()
+            self.assertEqual(apply_patch(old, diff_forms(old, new)), new)
+
+    def test_shuffled_fields(self) -> None:
+        """Test moves in a long list are found in O(n log n)."""
+        size = 10000
+        old = {"step1": {"fields": [field("f%d" % i) for i in range(size)]}}
+        new = copy.deepcopy(old)
+        random.Random(7).shuffle(new["step1"]["fields"])
+        start = time.perf_counter()
+        patch = diff_forms(old, new)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(apply_patch(old, patch), new)
+        self.assertLess(elapsed, 1.0)
+
+    def test_cli(self) -> None:
+        """Test xlson diff and xlson convert --patches."""
+        path = os.path.join(self.tmp_dir, "anc.xlsx")
+        old_path = os.path.join(self.tmp_dir, "old.json")
+        write_form(path, "Step 1")
+        with open(old_path, "w") as old_file:
+            json.dump(xlson.convert_xlsform(path), old_file)
+        output_dir = os.path.join(self.tmp_dir, "build")
+        args = ("--no-cache", "--manifest", "--patches", "-o", output_dir, path)
+        runner = CliRunner()
+        self.assertEqual(runner.invoke(xlson.cli, args=args).exit_code, 0)
+
+        write_form(path, "Visit")
+        patch = [{"op": "replace", "path": "/step1/title", "value": "Visit"}]
+        result = runner.invoke(xlson.cli, args=("diff", "--compact", old_path, path))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(json.loads(result.output), patch)
+
+        self.assertFalse(os.path.exists(os.path.join(output_dir, "anc.patch.json")))
+        self.assertEqual(runner.invoke(xlson.cli, args=args).exit_code, 0)
+        with open(os.path.join(output_dir, "anc.patch.json")) as patch_file:
+            self.assertEqual(json.load(patch_file), patch)
+
+        # The patch is removed once it no longer describes the latest change.
+        self.assertEqual(runner.invoke(xlson.cli, args=args).exit_code, 0)
+        self.assertFalse(os.path.exists(os.path.join(output_dir, "anc.patch.json")))
+
+        result = runner.invoke(xlson.cli, args=("diff", path, path))
+        self.assertEqual(json.loads(result.output), [])
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_diff")
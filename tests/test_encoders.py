@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.encoders module.
+"""
+
+import gzip
+import io
+import json
+import os
+import unittest
+from typing import Any, Callable, Dict
+
+from click.testing import CliRunner
+
+import xlson
+from xlson import encoders
+from xlson.encoders import available_formats, check_format, write_form
+
+from tests.helpers import TmpDirTestCase
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample.xlsx")
+
+
+def _zstd_loads(data: bytes) -> Any:
+    return json.loads(
+        encoders.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    )
+
+
+DECODERS: Dict[str, Callable[[bytes], Any]] = {
+    "json": json.loads,
+    "json.gz": lambda data: json.loads(gzip.decompress(data)),
+    "json.zst": _zstd_loads,
+    "msgpack": lambda data: encoders.msgpack.unpackb(data),
+    "cbor": lambda data: encoders.cbor2.loads(data),
+}
+
+
+class TestEncoders(TmpDirTestCase):
+    """
+    Test writing native forms in each output format.
+    """
+
+    def test_write_form(self) -> None:
+        """Test each installed format decodes to the native form."""
+        form = xlson.convert_xlsform(SAMPLE)
+        self.assertEqual(available_formats()[:2], ["json", "json.gz"])
+        for output_format in available_formats():
+            for compact in (False, True):
+                output = io.BytesIO()
+                write_form(xlson.iter_xlsform(SAMPLE), output, output_format, compact)
+                self.assertFalse(output.closed)
+                self.assertEqual(DECODERS[output_format](output.getvalue()), form)
+
+        first, second = io.BytesIO(), io.BytesIO()
+        write_form(form, first, "json.gz")
+        write_form(form, second, "json.gz")
+        self.assertEqual(first.getvalue(), second.getvalue())
+
+    def test_check_format(self) -> None:
+        """Test unknown formats and missing packages raise ValueError."""
+        with self.assertRaisesRegex(ValueError, "Unknown output format 'xml'"):
+            check_format("xml")
+        with self.assertRaisesRegex(ValueError, "Unknown output format"):
+            write_form({}, io.BytesIO(), "json.bz2")
+        packages = encoders._PACKAGES  # pylint: disable=protected-access
+        try:
+            encoders._PACKAGES = dict(packages, cbor=("cbor2", False))
+            with self.assertRaisesRegex(ValueError, "needs the cbor2 package"):
+                check_format("cbor")
+            self.assertNotIn("cbor", available_formats())
+        finally:
+            encoders._PACKAGES = packages
+
+    def test_cli(self) -> None:
+        """Test xlson --format writes the forms in the format."""
+        runner = CliRunner()
+        args = ("--format", "json.gz", "-o", self.tmp_dir, "--no-cache", SAMPLE)
+        result = runner.invoke(xlson.cli, args=args)
+        self.assertEqual(result.exit_code, 0, result.output)
+        with gzip.open(os.path.join(self.tmp_dir, "sample.json.gz")) as output_file:
+            self.assertEqual(json.load(output_file), xlson.convert_xlsform(SAMPLE))
+
+        result = runner.invoke(
+            xlson.cli, args=("--format", "json.gz", "--no-cache", SAMPLE)
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            json.loads(gzip.decompress(result.stdout_bytes)),
+            xlson.convert_xlsform(SAMPLE),
+        )
+
+        args = ("--format", "json.gz", "--manifest", "--patches", "-o", self.tmp_dir)
+        result = runner.invoke(xlson.cli, args=args + (SAMPLE,))
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("--patches and --multi-form need the json", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_encoders")
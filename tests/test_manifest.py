@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.manifest module.
+"""
+
+import json
+import os
+import unittest
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.manifest import MANIFEST_NAME, FormDigest, Manifest, form_digest
+
+from tests.helpers import TmpDirTestCase, write_form
+
+
+class TestManifest(TmpDirTestCase):
+    """
+    Test keeping a manifest of the forms in an output directory.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.output_dir = os.path.join(self.tmp_dir, "build")
+        self.forms_dir = os.path.join(self.tmp_dir, "forms")
+        os.makedirs(self.forms_dir)
+        for name in ("anc", "pnc"):
+            write_form(os.path.join(self.forms_dir, "%s.xlsx" % name), "Step 1")
+
+    def test_form_digest(self) -> None:
+        """Test forms are hashed on their key-sorted content."""
+        form = xlson.convert_xlsform(os.path.join(self.forms_dir, "anc.xlsx"))
+        digest = FormDigest()
+        self.assertEqual(list(digest.wrap(form.items())), list(form.items()))
+        self.assertEqual(digest.hexdigest(), form_digest(form))
+
+        reordered = json.loads(json.dumps(form))
+        reordered["step1"] = dict(reversed(list(reordered["step1"].items())))
+        self.assertEqual(
+            form_digest(dict(reversed(list(reordered.items())))), form_digest(form)
+        )
+        reordered["step1"]["title"] = "Other"
+        self.assertNotEqual(form_digest(reordered), form_digest(form))
+
+    def test_manifest(self) -> None:
+        """Test recording, saving and loading digests."""
+        output = os.path.join(self.output_dir, "sub", "anc.json")
+        manifest = Manifest.load(self.output_dir)
+        self.assertIsNone(manifest.digest(output))
+        self.assertTrue(manifest.record(output, "abc"))
+        self.assertFalse(manifest.record(output, "abc"))
+        self.assertTrue(manifest.record(os.path.join(self.output_dir, "x.json"), "d"))
+        self.assertEqual(manifest.changed, ["sub/anc.json", "x.json"])
+
+        os.makedirs(os.path.dirname(output))
+        open(output, "w").close()
+        manifest.save()
+        with open(os.path.join(self.output_dir, MANIFEST_NAME)) as manifest_file:
+            self.assertEqual(
+                json.load(manifest_file),
+                {"compact": False, "forms": {"sub/anc.json": "abc"}},
+            )
+        self.assertEqual(Manifest.load(self.output_dir).digest(output), "abc")
+        self.assertIsNone(Manifest.load(self.output_dir, compact=True).digest(output))
+
+    def test_cli(self) -> None:
+        """Test unchanged forms are not written again."""
+        runner = CliRunner(mix_stderr=False)
+        changed = os.path.join(self.tmp_dir, "changed.txt")
+        args = (
+            "--no-cache",
+            "-j",
+            "1",
+            "-o",
+            self.output_dir,
+            "--manifest",
+            "--changed",
+            changed,
+            self.forms_dir,
+        )
+
+        def build() -> str:
+            result = runner.invoke(xlson.cli, args=args)
+            self.assertEqual(result.exit_code, 0, result.stderr)
+            with open(changed) as changed_file:
+                self.assertEqual(result.stdout, "")
+                return changed_file.read()
+
+        self.assertEqual(build(), "anc.json\npnc.json\n")
+        anc_json = os.path.join(self.output_dir, "anc.json")
+        os.utime(anc_json, (0, 0))
+        self.assertEqual(build(), "")
+        self.assertEqual(os.stat(anc_json).st_mtime, 0)
+
+        write_form(os.path.join(self.forms_dir, "pnc.xlsx"), "Visit")
+        self.assertEqual(build(), "pnc.json\n")
+        self.assertEqual(os.stat(anc_json).st_mtime, 0)
+        with open(os.path.join(self.output_dir, MANIFEST_NAME)) as manifest_file:
+            forms = json.load(manifest_file)["forms"]
+        with open(os.path.join(self.output_dir, "pnc.json")) as pnc_file:
+            self.assertEqual(forms["pnc.json"], form_digest(json.load(pnc_file)))
+
+        result = runner.invoke(xlson.cli, args=("--changed", changed, self.forms_dir))
+        self.assertIn(
+            "--manifest, --changed and --patches need --output-dir", result.stderr
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_manifest")
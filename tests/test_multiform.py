@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.multiform module.
+"""
+
+import json
+import os
+import unittest
+
+from click.testing import CliRunner
+from pyxform.tests_v1.pyxform_test_case import md_table_to_ss_structure
+
+import xlson
+from xlson.multiform import convert_workbook, form_sheets, iter_forms, read_sheets
+
+from tests.helpers import TmpDirTestCase, write_workbook
+
+WORKBOOK_MD = """
+    | registration |
+    |              | type          | name  | label        |
+    |              | begin group   | step1 | Registration |
+    |              | text          | name  | Name?        |
+    |              | select_one yn | ok    | Is ok?       |
+    |              | end group     |       |              |
+    | visit        |
+    |              | type          | name  | label        |
+    |              | begin group   | step1 | Visit        |
+    |              | integer       | age   | Age          |
+    |              | select_one yn | sick  | Is sick?     |
+    |              | end group     |       |              |
+    | choices      |
+    |              | list_name | name | label | instance::openmrs_entity_id |
+    |              | yn        | yes  | Yes   | 1065AAA                     |
+    |              | yn        | no   | No    | 1066AAA                     |
+    | notes        |
+    |              | note                                                     |
+    |              | Not a form.                                              |
+    """
+
+
+class TestMultiForm(TmpDirTestCase):
+    """
+    Test converting workbooks holding a form per sheet.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.sheets = dict(md_table_to_ss_structure(WORKBOOK_MD))
+        self.path = os.path.join(self.tmp_dir, "anc.xlsx")
+        write_workbook(self.path, self.sheets)
+
+    def single_form(self, sheet: str) -> dict:
+        """Returns the native form of a form sheet converted on its own."""
+        path = os.path.join(self.tmp_dir, "%s.xlsx" % sheet)
+        write_workbook(
+            path, {"survey": self.sheets[sheet], "choices": self.sheets["choices"]}
+        )
+        return xlson.convert_xlsform(path)
+
+    def test_form_sheets(self) -> None:
+        """Test sheets with a type column are forms."""
+        self.assertEqual(form_sheets(read_sheets(self.path)), ["registration", "visit"])
+        self.assertEqual(
+            form_sheets(
+                read_sheets(os.path.join(os.path.dirname(__file__), "sample.xlsx"))
+            ),
+            ["survey"],
+        )
+
+    def test_iter_forms(self) -> None:
+        """Test each form is converted as if it was on its own."""
+        for jobs in (1, 2):
+            forms = list(iter_forms(self.path, jobs=jobs))
+            self.assertEqual([form.name for form in forms], ["registration", "visit"])
+            for form in forms:
+                self.assertIsNone(form.error)
+                self.assertEqual(
+                    json.loads(form.content or ""), self.single_form(form.name)
+                )
+
+    def test_form_errors(self) -> None:
+        """Test a form failing does not stop the others."""
+        self.sheets["visit"][3][1] = "select_one missing"
+        write_workbook(self.path, self.sheets)
+        registration, visit = iter_forms(self.path, jobs=1)
+        self.assertIsNone(registration.error)
+        self.assertIsNone(visit.content)
+        self.assertIn("missing", visit.error or "")
+
+        with open(self.path, "wb") as workbook:
+            workbook.write(b"not a workbook")
+        with self.assertRaises(ValueError):
+            list(iter_forms(self.path))
+
+    def test_write_errors(self) -> None:
+        """Test a form that can not be written does not stop the others."""
+        output_dir = os.path.join(self.tmp_dir, "build")
+        os.makedirs(os.path.join(output_dir, "registration.json"))
+        registration, visit = convert_workbook(self.path, output_dir, jobs=1)
+        self.assertIsNone(registration.output)
+        self.assertIn("registration.json", registration.error or "")
+        self.assertIsNone(visit.error)
+        self.assertEqual(
+            sorted(os.listdir(output_dir)), ["registration.json", "visit.json"]
+        )
+
+    def test_cli(self) -> None:
+        """Test xlson --multi-form writes a JSON file per form."""
+        runner = CliRunner()
+        output_dir = os.path.join(self.tmp_dir, "build")
+        result = runner.invoke(xlson.cli, args=("--multi-form", self.path))
+        self.assertIn("--output-dir is required", result.output)
+
+        result = runner.invoke(
+            xlson.cli, args=("--multi-form", "-j", "1", "-o", output_dir, self.path)
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(output_dir, "anc"))),
+            ["registration.json", "visit.json"],
+        )
+        with open(os.path.join(output_dir, "anc", "visit.json")) as visit:
+            self.assertEqual(json.load(visit), self.single_form("visit"))
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_multiform")
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.profiling module.
+"""
+
+import io
+import json
+import os
+import unittest
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.profiling import current_profile, iter_stage, profiling, stage
+from xlson.writer import write_native_form
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type               | name   | label   |
+    |         | begin group        | step1  | Step 1  |
+    |         | text               | name   | Name?   |
+    |         | select_one yn      | ok     | Is ok?  |
+    |         | select_multiple yn | checks | Checks? |
+    |         | end group          |        |         |
+    |         | begin group        | step2  | Step 2  |
+    |         | integer            | age    | Age     |
+    |         | end group          |        |         |
+    | choices |
+    |         | list_name | name | label | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes   | 1065AAA                     |
+    |         | yn        | no   | No    | 1066AAA                     |
+    """
+
+
+class TestProfiling(TmpDirTestCase):
+    """
+    Test profiling conversions.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "form.xlsx")
+        write_xlsform(self.path, FORM_MD)
+
+    def test_profiling(self) -> None:
+        """Test the stages and question types of a conversion are profiled."""
+        for streaming in (False, True):
+            with profiling() as profile:
+                items = xlson.iter_xlsform(
+                    self.path, streaming=streaming, shared_choices=True
+                )
+                write_native_form(items, io.StringIO())
+            self.assertIsNone(current_profile())
+
+            result = profile.as_dict()
+            self.assertEqual(
+                set(result["stages"]),
+                {"parse", "create_native_form", "shared_choices", "serialise"}
+                | (set() if streaming else {"build_survey"}),
+            )
+            self.assertEqual(result["stages"]["create_native_form"]["calls"], 2)
+            self.assertEqual(
+                set(result["fields"]),
+                {"text", "select one", "select all that apply", "integer"},
+            )
+            self.assertEqual(result["counts"], {"fields": 4, "options": 4})
+            self.assertGreaterEqual(
+                result["seconds"],
+                sum(timing["seconds"] for timing in result["stages"].values()),
+            )
+            json.dumps(result)
+
+    def test_nested_stages(self) -> None:
+        """Test stage times exclude nested stages and nothing is recorded when
+        not profiling."""
+        with stage("outer"):
+            self.assertEqual(list(iter_stage("inner", [1, 2])), [1, 2])
+        self.assertIsNone(current_profile())
+
+        with profiling() as profile:
+            with profiling() as nested_profile:
+                self.assertIs(nested_profile, profile)
+                with stage("outer"):
+                    self.assertEqual(list(iter_stage("inner", [1, 2])), [1, 2])
+        self.assertEqual(profile.stages["outer"].calls, 1)
+        self.assertEqual(profile.stages["inner"].calls, 3)
+        self.assertLessEqual(
+            profile.stages["outer"].seconds + profile.stages["inner"].seconds,
+            profile.seconds,
+        )
+
+    def test_cli(self) -> None:
+        """Test xlson --profile reports the profile as JSON."""
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(xlson.cli, args=("--profile", "--no-cache", self.path))
+        self.assertEqual(result.exit_code, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), xlson.convert_xlsform(self.path))
+        self.assertEqual(json.loads(result.stderr)["counts"]["fields"], 4)
+
+        output_dir = os.path.join(self.tmp_dir, "build")
+        result = runner.invoke(
+            xlson.cli,
+            args=("--profile", "--no-cache", "-j", "1", "-o", output_dir, self.path),
+        )
+        self.assertEqual(result.exit_code, 0, result.stderr)
+        self.assertEqual(
+            sorted(os.listdir(output_dir)), ["form.json", "form.profile.json"]
+        )
+        with open(os.path.join(output_dir, "form.profile.json")) as profile_file:
+            self.assertEqual(json.load(profile_file)["counts"]["options"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_profiling")
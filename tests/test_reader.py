@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.reader and xlson.xlsx modules.
+"""
+
+import os
+import tracemalloc
+import unittest
+
+from pyxform.xls2json import parse_file_to_json
+
+import xlson
+from xlson.reader import XLSFormReader, read_xlsform
+from xlson.xlsx import Workbook, column_index, column_name
+
+from tests.helpers import TmpDirTestCase, normalized, write_workbook
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample.xlsx")
+
+SURVEY = [
+    [
+        "type",
+        "name",
+        "label",
+        "label::French",
+        "hint",
+        "required",
+        "required_message",
+        "constraint",
+        "constraint_message",
+        "instance::openmrs_entity_id",
+        "media::image",
+    ],
+    ["begin group", "step1", "Patient  Information", "Patient"],
+    [
+        "text",
+        "first_name",
+        "What’s your name?",
+        "Nom?",
+        "",
+        "yes",
+        "Enter the name.",
+        "regex(., '[A-Za-z\\s]*')",
+        "Invalid name.",
+        "1AAA",
+        "name.png",
+    ],
+    ["integer", "age", "Age", "Âge", "", "no"],
+    ["select_one mood", "mood", "What is the mood?"],
+    ["select_one mood", "mood2", "What is the mood?", "", "Choose mood"],
+    ["end group"],
+    ["begin_group", "step2", "Other details"],
+    ["select_multiple yn", "colours", "Colours?"],
+    ["geopoint", "location", "Location"],
+    ["barcode", "user_id", "User ID", "", "Scan QR code"],
+    ["image", "user_image", "Take a photo."],
+    ["begin repeat", "visits", "Visits"],
+    ["text", "visit", "Visit"],
+    ["end repeat"],
+    ["end_group"],
+]
+CHOICES = [
+    ["list_name", "name", "label", "instance::openmrs_entity_id"],
+    ["mood", "happy", "Happy", "1107AAA"],
+    ["mood", "sad", "Sad", "1713AAA"],
+    [],
+    ["yn", "yes", "Yes", "AABB"],
+    ["yn", "no", "No", "BBCC"],
+]
+SETTINGS = [["form_title", "form_id"], ["Patient Registration", "patient"]]
+
+
+class TestReader(TmpDirTestCase):
+    """
+    Test streaming XLSForms without pyxform.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "patient.xlsx")
+        write_workbook(
+            self.path, {"survey": SURVEY, "choices": CHOICES, "settings": SETTINGS}
+        )
+
+    def test_columns(self) -> None:
+        """Test converting between column names and indexes."""
+        for index, name in [(0, "A"), (25, "Z"), (26, "AA"), (701, "ZZ")]:
+            self.assertEqual(column_name(index), name)
+            self.assertEqual(column_index(name + "12"), index)
+
+    def test_workbook(self) -> None:
+        """Test Workbook reads shared and inline string cells."""
+        with Workbook(SAMPLE) as workbook:
+            self.assertEqual(list(workbook.sheets), ["survey", "choices"])
+            self.assertEqual(
+                list(workbook.iter_dicts("survey"))[0],
+                {
+                    "type": "begin group",
+                    "name": "step1",
+                    "label": "Patient Information",
+                },
+            )
+        with Workbook(self.path) as workbook:
+            rows = list(workbook.iter_rows("choices"))
+            self.assertEqual(rows[3], [])
+            self.assertEqual(len(list(workbook.iter_dicts("choices"))), 4)
+
+        with self.assertRaises(ValueError):
+            Workbook(os.path.join(HERE, "test_reader.py"))
+
+    def test_same_as_pyxform(self) -> None:
+        """Test the streamed native form is the same as pyxform's."""
+        for path in (SAMPLE, self.path):
+            self.assertEqual(
+                xlson.convert_xlsform(path, streaming=True), xlson.convert_xlsform(path)
+            )
+
+        form = xlson.convert_xlsform(self.path, streaming=True)
+        self.assertEqual(form["encounter_type"], "Patient Registration")
+        self.assertEqual(
+            form["step1"]["title"],
+            {"French": "Patient", "default": "Patient Information"},
+        )
+
+    def test_or_other(self) -> None:
+        """Test select or_other questions get an other choice and question."""
+        survey = [
+            ["type", "name", "label"],
+            ["begin group", "step", "Step"],
+            ["select_one yn or_other", "ok", "Is ok?"],
+            ["end group"],
+        ]
+        write_workbook(self.path, {"survey": survey, "choices": CHOICES})
+        expected = normalized(parse_file_to_json(self.path))
+        for choice in expected["children"][0]["children"][0]["children"]:
+            choice.pop("instance", None)
+        survey_dict = read_xlsform(self.path)
+        for choice in survey_dict["children"][0]["children"][0]["children"]:
+            choice.pop("instance", None)
+        self.assertEqual(survey_dict["children"][0], expected["children"][0])
+
+    def test_errors(self) -> None:
+        """Test unbalanced groups and unknown choice lists are reported."""
+        for survey in (
+            [["type", "name"], ["begin group", "step"]],
+            [["type", "name"], ["end group"]],
+            [["type", "name"], ["select_one missing", "pick"]],
+        ):
+            write_workbook(self.path, {"survey": survey})
+            with self.assertRaises(ValueError):
+                read_xlsform(self.path)
+
+    def test_streams_groups(self) -> None:
+        """Test memory use grows with the largest group, not the workbook."""
+        survey = [["type", "name", "label"]]
+        for group in range(200):
+            survey.append(["begin group", "step%d" % group, "Step"])
+            survey.extend(
+                ["text", "question%d_%d" % (group, number), "Question?"]
+                for number in range(20)
+            )
+            survey.append(["end group"])
+        write_workbook(self.path, {"survey": survey})
+
+        def peak(groups: int) -> int:
+            tracemalloc.start()
+            with XLSFormReader(self.path) as reader:
+                for _child in zip(range(groups), reader.iter_children()):
+                    pass
+            peak_size = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak_size
+
+        self.assertLess(peak(200), peak(10) * 2)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_reader")
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.relevance module.
+"""
+
+import os
+import unittest
+import warnings
+
+import xlson
+from xlson.relevance import UntranslatedRelevantWarning, compile_relevant
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type               | name     | label    | relevant                       |
+    |         | begin group        | visit    | Visit    |                                |
+    |         | select_one yn      | hiv      | HIV      |                                |
+    |         | integer            | age      | Age      |                                |
+    |         | select_multiple sy | symptoms | Symptoms |                                |
+    |         | text               | plan     | Plan     | ${fever} = 'yes'               |
+    |         | end group          |          |          |                                |
+    |         | begin group        | details  | Details  |                                |
+    |         | text               | art      | ART      | ${hiv} = 'yes' and 18 <= ${age} |
+    |         | text               | fever    | Fever    | selected(${symptoms}, 'fever') |
+    |         | text               | both     | Both     | %s                             |
+    |         | text               | other    | Other    | not(${hiv} = 'yes')            |
+    |         | end group          |          |          |                                |
+    | choices |
+    |         | list_name | name  | label | instance::openmrs_entity_id |
+    |         | yn        | yes   | Yes   | 1065AAA                     |
+    |         | yn        | no    | No    | 1066AAA                     |
+    |         | sy        | fever | Fever | 140238AAA                   |
+    |         | sy        | cough | Cough | 143264AAA                   |
+    """
+OTHER_MD = """
+    | survey  |
+    |         | type                        | name     | label    |
+    |         | begin group                 | visit    | Visit    |
+    |         | select_multiple sy or_other | symptoms | Symptoms |
+    |         | end group                   |          |          |
+    | choices |
+    |         | list_name | name  | label |
+    |         | sy        | fever | Fever |
+    |         | sy        | cough | Cough |
+    """
+
+
+class TestRelevance(TmpDirTestCase):
+    """
+    Test translating relevant expressions to native form relevance.
+    """
+
+    def test_compile_relevant(self) -> None:
+        """Test the expressions with a native form equivalent."""
+        self.assertEqual(
+            compile_relevant("${a} != 'x' and 5 < ${b}"),
+            (
+                ("a", "string", 'notEqualTo(., "x")'),
+                ("b", "numeric", 'greaterThan(., "5")'),
+            ),
+        )
+        self.assertEqual(
+            compile_relevant("selected(${c}, 'x') or selected(${c}, 'y')"),
+            (("c", "or", ("x", "y")),),
+        )
+        self.assertEqual(
+            compile_relevant("selected(${c}, 'x') and selected(${c}, 'y')"),
+            (("c", "and", ("x", "y")),),
+        )
+        for expression in (
+            "${a} = 'x' or ${b} = 'y'",
+            "${a} = 'x' and ${a} = 'y'",
+            "selected(${c}, 'x') or selected(${d}, 'y')",
+            "${a} = ${b}",
+            "${a} = 'say \"x\"'",
+            "count-selected(${c}) > 1",
+            "${a} + 1 > 2",
+            "../../a = 'x'",
+        ):
+            self.assertIsNone(compile_relevant(expression), expression)
+        self.assertEqual(
+            compile_relevant("selected(../c, 'other')"), (("c", "or", ("other",)),)
+        )
+
+    def test_convert(self) -> None:
+        """Test converted fields have relevance referring to their steps,
+        including steps built after them."""
+        path = os.path.join(self.tmp_dir, "anc.xlsx")
+        both = "selected(${symptoms}, 'fever') and selected(${symptoms}, 'cough')"
+        write_xlsform(path, FORM_MD % both)
+        for streaming in (False, True):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                form = xlson.convert_xlsform(path, streaming=streaming)
+            fields = {field["key"]: field for field in form["visit"]["fields"]}
+            self.assertEqual(
+                fields["plan"]["relevance"],
+                {"details:fever": {"type": "string", "ex": 'equalTo(., "yes")'}},
+            )
+            fields = {field["key"]: field for field in form["details"]["fields"]}
+            self.assertEqual(
+                fields["art"]["relevance"],
+                {
+                    "visit:hiv": {"type": "string", "ex": 'equalTo(., "yes")'},
+                    "visit:age": {
+                        "type": "numeric",
+                        "ex": 'greaterThanEqualTo(., "18")',
+                    },
+                },
+            )
+            self.assertEqual(
+                fields["fever"]["relevance"],
+                {"visit:symptoms": {"ex-checkbox": [{"or": ["fever"]}]}},
+            )
+            self.assertEqual(
+                fields["both"]["relevance"],
+                {"visit:symptoms": {"ex-checkbox": [{"and": ["fever", "cough"]}]}},
+            )
+            self.assertNotIn("relevance", fields["other"])
+            self.assertEqual(
+                [warning.category for warning in caught],
+                [UntranslatedRelevantWarning],
+            )
+            self.assertIn("Field 'other'", str(caught[0].message))
+
+    def test_or_other(self) -> None:
+        """Test the specify other field of an or_other select is relevant
+        when other is selected."""
+        path = os.path.join(self.tmp_dir, "other.xlsx")
+        write_xlsform(path, OTHER_MD)
+        for streaming in (False, True):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                form = xlson.convert_xlsform(path, streaming=streaming)
+            other = form["visit"]["fields"][1]
+            self.assertEqual(other["key"], "symptoms_other")
+            self.assertEqual(
+                other["relevance"],
+                {"visit:symptoms": {"ex-checkbox": [{"or": ["other"]}]}},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_relevance")
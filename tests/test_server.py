@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.server module.
+"""
+
+import http.client
+import json
+import os
+import socket
+import threading
+import unittest
+from concurrent.futures import (  # pylint: disable=redefined-builtin
+    Future,
+    TimeoutError,
+)
+from typing import Optional
+from unittest import mock
+
+import xlson
+from xlson.server import ConversionServer, ConversionService, make_server
+
+from tests.helpers import TmpDirTestCase
+
+HERE = os.path.dirname(__file__)
+SAMPLE = os.path.join(HERE, "sample.xlsx")
+
+
+class TestServer(TmpDirTestCase):
+    """
+    Test the XLSForm conversion service.
+    """
+
+    service: ConversionService
+    server: ConversionServer
+    thread: threading.Thread
+    data: bytes
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.service = ConversionService(jobs=1, max_requests=2)
+        server = make_server(cls.service, port=0)
+        assert isinstance(server, ConversionServer)
+        cls.server = server
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+        with open(SAMPLE, "rb") as sample:
+            cls.data = sample.read()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        cls.service.close()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None) -> tuple:
+        """Returns the status and JSON body of a request to the server."""
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        try:
+            connection.request(method, url, body)
+            response = connection.getresponse()
+            return response.status, response.read().decode("utf-8")
+        finally:
+            connection.close()
+
+    def test_health(self) -> None:
+        """Test GET /health."""
+        status, body = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["jobs"], 1)
+        self.assertEqual(self.request("GET", "/")[0], 404)
+
+    def test_convert(self) -> None:
+        """Test POST /convert returns the native form JSON."""
+        status, body = self.request("POST", "/convert?name=sample.xlsx", self.data)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(json.loads(body), xlson.convert_xlsform(SAMPLE))
+        self.assertIn("\n    ", body)
+
+        status, body = self.request(
+            "POST", "/convert?name=sample.xlsx&compact=1&streaming=1", self.data
+        )
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body.count("\n"), 1)
+        self.assertEqual(json.loads(body), xlson.convert_xlsform(SAMPLE))
+
+    def test_errors(self) -> None:
+        """Test invalid XLSForms and requests."""
+        status, body = self.request("POST", "/convert", b"not a workbook")
+        self.assertEqual(status, 400)
+        self.assertIn("error", json.loads(body))
+        self.assertEqual(self.request("POST", "/other", self.data)[0], 404)
+
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        try:
+            connection.putrequest("POST", "/convert")
+            connection.putheader("Content-Length", "-1")
+            connection.endheaders()
+            self.assertEqual(connection.getresponse().status, 400)
+        finally:
+            connection.close()
+
+    def test_busy(self) -> None:
+        """Test requests over max_requests are answered with 503."""
+        for _ in range(self.service.max_requests):
+            self.service.slots.acquire()
+        try:
+            status, body = self.request("POST", "/convert", self.data)
+        finally:
+            for _ in range(self.service.max_requests):
+                self.service.slots.release()
+        self.assertEqual(status, 503)
+        self.assertEqual(json.loads(body), {"error": "Converting 2 XLSForms already."})
+
+    def test_timeout(self) -> None:
+        """Test a conversion that timed out holds its slot until the worker is
+        done."""
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        with mock.patch.object(
+            self.service.executor, "submit", return_value=future
+        ), mock.patch.object(self.service, "timeout", 0.01):
+            with self.assertRaises(TimeoutError):
+                self.service.convert("sample.xlsx", self.data)
+        self.assertTrue(self.service.slots.acquire(blocking=False))
+        self.assertFalse(self.service.slots.acquire(blocking=False))
+        future.set_result("{}")
+        self.assertTrue(self.service.slots.acquire(blocking=False))
+        for _ in range(self.service.max_requests):
+            self.service.slots.release()
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Needs Unix sockets.")
+    def test_unix_socket(self) -> None:
+        """Test serving on a Unix socket."""
+        path = os.path.join(self.tmp_dir, "xlson.sock")
+        server = make_server(self.service, socket_path=path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            client.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+            response = b""
+            for chunk in iter(lambda: client.recv(4096), b""):
+                response += chunk
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertTrue(response.startswith(b"HTTP/1.0 200"), response)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_server")
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.template module.
+"""
+
+import json
+import os
+import unittest
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.template import Template
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type          | name | label  | hint     | openmrs_entity_id           |
+    |         | begin group   | visit| Visit  |          |                             |
+    |         | text          | name | Name   | Name?    | 1586AAA                     |
+    |         | select_one yn | hiv  | HIV    | HIV?     | 1356AAA                     |
+    |         | end group     |      |        |          |                             |
+    | choices |
+    |         | list_name | name | label | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes   | 1065AAA                     |
+    |         | yn        | no   | No    | 1066AAA                     |
+    """
+
+
+class TestTemplate(TmpDirTestCase):
+    """
+    Test rendering form variants from a template.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "anc.xlsx")
+        write_xlsform(self.path, FORM_MD)
+        self.form = xlson.convert_xlsform(self.path)
+
+    def test_render(self) -> None:
+        """Test overrides are set without changing the template."""
+        template = Template.from_form(self.form)
+        for name in (
+            "encounter_type",
+            "visit.title",
+            "name.hint",
+            "hiv.openmrs_entity_id",
+            "hiv.options.yes.text",
+            "hiv.options.no.openmrs_entity_id",
+        ):
+            self.assertIn(name, template.points)
+        self.assertNotIn("name.key", template.points)
+
+        form = template.render(
+            {
+                "encounter_type": "anc_hiv",
+                "hiv.hint": "HIV status?",
+                "hiv.options.yes.text": "Y",
+            }
+        )
+        expected = json.loads(json.dumps(self.form))
+        expected["encounter_type"] = "anc_hiv"
+        hiv = expected["visit"]["fields"][1]
+        hiv["hint"] = "HIV status?"
+        hiv["options"][0]["text"] = "Y"
+        self.assertEqual(form, expected)
+        self.assertEqual(template.form, xlson.convert_xlsform(self.path))
+        fields = form["visit"]["fields"]
+        self.assertIs(fields[0], self.form["visit"]["fields"][0])
+        self.assertIs(
+            fields[1]["options"][1], self.form["visit"]["fields"][1]["options"][1]
+        )
+        self.assertEqual(template.render({}), self.form)
+
+        with self.assertRaisesRegex(ValueError, "Unknown substitution points: a, b."):
+            template.render({"b": "", "a": "", "hiv.hint": ""})
+
+        path = os.path.join(self.tmp_dir, "anc.template.json")
+        template.save(path)
+        loaded = Template.load(path)
+        self.assertEqual(loaded.points, template.points)
+        self.assertEqual(
+            loaded.render(
+                {
+                    "encounter_type": "anc_hiv",
+                    "hiv.hint": "HIV status?",
+                    "hiv.options.yes.text": "Y",
+                }
+            ),
+            form,
+        )
+        with open(path, "w") as template_file:
+            json.dump(self.form, template_file)
+        with self.assertRaisesRegex(ValueError, "is not an xlson template"):
+            Template.load(path)
+
+    def test_cli(self) -> None:
+        """Test xlson compile and xlson render."""
+        template = os.path.join(self.tmp_dir, "anc.template.json")
+        overrides = os.path.join(self.tmp_dir, "programs.csv")
+        output_dir = os.path.join(self.tmp_dir, "build")
+        with open(overrides, "w", newline="") as overrides_file:
+            overrides_file.write(
+                "name,encounter_type,hiv.openmrs_entity_id\n"
+                "anc_a,anc_a,\n"
+                "anc_b,anc_b,163722AAA\n"
+                ",anc_c,\n"
+            )
+        runner = CliRunner()
+        result = runner.invoke(xlson.cli, args=("compile", self.path, "-o", template))
+        self.assertEqual(result.exit_code, 0, result.output)
+
+        result = runner.invoke(
+            xlson.cli, args=("render", template, overrides, "-o", output_dir)
+        )
+        self.assertEqual(result.exit_code, 1, result.output)
+        self.assertIn(
+            "FAILED  variant 3: Missing or invalid name column.", result.output
+        )
+        for name, entity_id in (("anc_a", "1356AAA"), ("anc_b", "163722AAA")):
+            with open(os.path.join(output_dir, name + ".json")) as form_file:
+                form = json.load(form_file)
+            self.assertEqual(form["encounter_type"], name)
+            self.assertEqual(form["visit"]["fields"][1]["openmrs_entity_id"], entity_id)
+        self.assertEqual(sorted(os.listdir(output_dir)), ["anc_a.json", "anc_b.json"])
+
+        os.remove(os.path.join(output_dir, "anc_a.json"))
+        os.makedirs(os.path.join(output_dir, "anc_a.json"))
+        result = runner.invoke(
+            xlson.cli, args=("render", template, overrides, "-o", output_dir)
+        )
+        self.assertIn("FAILED  anc_a: IsADirectoryError", result.output)
+        self.assertEqual(sorted(os.listdir(output_dir)), ["anc_a.json", "anc_b.json"])
+
+        result = runner.invoke(
+            xlson.cli, args=("render", template, template, "-o", output_dir)
+        )
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("is not a JSON list of objects", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_template")
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.translations module.
+"""
+
+import json
+import os
+import unittest
+from typing import Any, Dict
+
+from xlson.batch import Source, convert_to_file
+from xlson.translations import Translations, language_code, language_codes
+
+from tests.helpers import TmpDirTestCase, write_xlsform
+
+FORM_MD = """
+    | survey  |
+    |         | type          | name  | label::English (en) | label::French (fr) | required | required_message::English (en) | required_message::French (fr) |
+    |         | begin group   | visit | Visit               | Visite             |          |                                |                               |
+    |         | select_one yn | hiv   | HIV                 | VIH                | yes      | Needed                         | Requis                        |
+    |         | select_one yn | art   | ART                 |                    |          |                                |                               |
+    |         | end group     |       |                     |                    |          |                                |                               |
+    | choices |
+    |         | list_name | name | label::English (en) | label::French (fr) | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes                 | Oui                | 1065AAA                     |
+    |         | yn        | no   | No                  | Non                | 1066AAA                     |
+    """
+
+
+class TestTranslations(TmpDirTestCase):
+    """
+    Test rendering a native form per language.
+    """
+
+    def test_localize(self) -> None:
+        """Test localized forms share the values holding no text and the
+        default texts are only a fallback."""
+        options = [{"key": "yes", "text": {"en": "Yes", "fr": "Oui"}}]
+        relevance = {"visit:hiv": {"type": "string", "ex": 'equalTo(., "yes")'}}
+        form: Dict[str, Any] = {
+            "encounter_type": "anc",
+            "visit": {
+                "title": {"en": "Visit", "fr": "Visite", "default": "Visit"},
+                "fields": [
+                    {"key": "a", "label": {"en": "A"}, "options": options},
+                    {"key": "b", "relevance": relevance, "options": options},
+                ],
+            },
+        }
+        translations = Translations(form)
+        self.assertEqual(translations.languages, ["en", "fr"])
+
+        french = translations.localize("fr")
+        self.assertEqual(french["visit"]["title"], "Visite")
+        first, second = french["visit"]["fields"]
+        self.assertEqual(first["label"], "A")
+        self.assertEqual(first["options"], [{"key": "yes", "text": "Oui"}])
+        self.assertIs(first["options"], second["options"])
+        self.assertIs(second["relevance"], relevance)
+        self.assertEqual(form["visit"]["title"]["fr"], "Visite")
+        self.assertIs(
+            translations.localize("en")["visit"]["fields"][1]["relevance"], relevance
+        )
+
+        self.assertEqual(language_code("French (fr)"), "fr")
+        self.assertEqual(language_code("Kiswahili Sanifu"), "kiswahili_sanifu")
+        self.assertEqual(
+            language_codes(["English (en)", "French (fr)"]),
+            {"English (en)": "en", "French (fr)": "fr"},
+        )
+        with self.assertRaises(ValueError):
+            language_codes(["English (en)", "en"])
+
+    def test_convert(self) -> None:
+        """Test a form is written per language from both readers."""
+        path = os.path.join(self.tmp_dir, "anc.xlsx")
+        write_xlsform(path, FORM_MD)
+        for streaming in (False, True):
+            output_dir = os.path.join(self.tmp_dir, "build%d" % streaming)
+            result = convert_to_file(
+                Source(path, "anc.xlsx"),
+                output_dir,
+                {"streaming": streaming},
+                translations=True,
+            )
+            self.assertIsNone(result.error)
+            self.assertEqual(
+                sorted(os.listdir(output_dir)), ["anc.en.json", "anc.fr.json"]
+            )
+            with open(os.path.join(output_dir, "anc.fr.json")) as form_file:
+                step = json.load(form_file)["visit"]
+            hiv, art = step["fields"]
+            self.assertEqual(step["title"], "Visite")
+            self.assertEqual(hiv["label"], "VIH")
+            self.assertEqual(hiv["v_required"]["err"], "Requis")
+            self.assertEqual(
+                [option["text"] for option in hiv["options"]], ["Oui", "Non"]
+            )
+            self.assertEqual(art["label"], "ART")
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_translations")
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.watch module.
+"""
+
+import json
+import os
+import unittest
+import warnings
+from unittest import mock
+
+import xlson
+from xlson.watch import IncrementalConverter, Watcher, write_if_changed
+
+from tests.helpers import TmpDirTestCase, write_form
+
+FORM_MD = """
+    | survey  |
+    |         | type            | name  | label   |
+    |         | begin group     | step1 | %s      |
+    |         | text            | name  | Name?   |
+    |         | select_one yn   | ok    | Is ok?  |
+    |         | end group       |       |         |
+    |         | begin group     | step2 | Step 2  |
+    |         | integer         | age   | Age     |
+    |         | end group       |       |         |
+    | choices |
+    |         | list_name | name | label | instance::openmrs_entity_id |
+    |         | yn        | yes  | Yes   | 1065AAA                     |
+    |         | yn        | no   | No    | 1066AAA                     |
+    """
+RELEVANT_MD = """
+    | survey  |
+    |         | type        | name  | label | relevant        |
+    |         | begin group | step1 | %s    |                 |
+    |         | text        | early | Early | ${later} = 'x'  |
+    |         | end group   |       |       |                 |
+    |         | begin group | step2 | Later |                 |
+    |         | text        | later | Later |                 |
+    |         | end group   |       |       |                 |
+    """
+
+
+class TestWatch(TmpDirTestCase):
+    """
+    Test converting XLSForms as they change.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = os.path.join(self.tmp_dir, "form.xlsx")
+        write_form(self.path, form_md=FORM_MD)
+
+    def test_incremental_converter(self) -> None:
+        """Test only the steps of changed groups are built again."""
+        for streaming in (False, True):
+            converter = IncrementalConverter(streaming=streaming)
+            form = json.loads(converter.convert(self.path))
+            self.assertEqual(form, xlson.convert_xlsform(self.path))
+            self.assertEqual((converter.rebuilt, converter.reused), (2, 0))
+
+            converter.convert(self.path)
+            self.assertEqual((converter.rebuilt, converter.reused), (0, 2))
+
+            write_form(self.path, "Details", FORM_MD)
+            form = json.loads(converter.convert(self.path))
+            self.assertEqual((converter.rebuilt, converter.reused), (1, 1))
+            self.assertEqual(form, xlson.convert_xlsform(self.path))
+            self.assertEqual(form["step1"]["title"], "Details")
+            write_form(self.path, form_md=FORM_MD)
+
+    def test_forward_relevance(self) -> None:
+        """Test relevance referring to a later step is kept when streaming."""
+        write_form(self.path, form_md=RELEVANT_MD)
+        for streaming in (False, True):
+            converter = IncrementalConverter(streaming=streaming)
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                form = json.loads(converter.convert(self.path))
+            self.assertEqual(
+                form["step1"]["fields"][0]["relevance"],
+                {"step2:later": {"type": "string", "ex": 'equalTo(., "x")'}},
+            )
+            self.assertEqual(form, xlson.convert_xlsform(self.path))
+
+    def test_write_if_changed(self) -> None:
+        """Test the output is replaced through a temporary file."""
+        output = os.path.join(self.tmp_dir, "form.json")
+        self.assertTrue(write_if_changed(output, "{}"))
+        self.assertFalse(write_if_changed(output, "{}"))
+        with mock.patch("os.replace", side_effect=OSError("full")):
+            with self.assertRaises(OSError):
+                write_if_changed(output, "[]")
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["form.json", "form.xlsx"])
+        with open(output, encoding="utf-8") as output_file:
+            self.assertEqual(output_file.read(), "{}")
+
+    def test_poll(self) -> None:
+        """Test XLSForms are converted once they stop changing and output files
+        are only written when they change."""
+        output = os.path.join(self.tmp_dir, "form.json")
+        watcher = Watcher([self.tmp_dir], debounce=1)
+        changes = watcher.poll(now=100)
+        self.assertEqual([change.written for change in changes], [True])
+        self.assertEqual(changes[0].output, output)
+        with open(output) as output_file:
+            self.assertEqual(json.load(output_file), xlson.convert_xlsform(self.path))
+        self.assertEqual(watcher.poll(now=101), [])
+
+        # Saved without changes.
+        os.utime(self.path, (0, 0))
+        self.assertEqual(watcher.poll(now=102), [])
+        changes = watcher.poll(now=103)
+        self.assertEqual([change.written for change in changes], [False])
+
+        write_form(self.path, "Details", FORM_MD)
+        os.utime(self.path, (1, 1))
+        self.assertEqual(watcher.poll(now=104), [])
+        changes = watcher.poll(now=105)
+        self.assertEqual([change.written for change in changes], [True])
+        self.assertEqual((changes[0].rebuilt, changes[0].reused), (1, 1))
+
+        with open(self.path, "wb") as xlsform:
+            xlsform.write(b"not a workbook")
+        changes = watcher.poll(now=110) + watcher.poll(now=111)
+        self.assertIsNotNone(changes[0].error)
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_watch")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.writer module.
+"""
+
+import io
+import json
+import os
+import unittest
+from collections import abc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+from click.testing import CliRunner
+
+import xlson
+from xlson.writer import get_dumps, load_orjson, write_native_form
+
+HERE = os.path.dirname(__file__)
+
+FORM = {
+    "encounter_type": "Sample",
+    "step1": {
+        "title": "Patient Information",
+        "fields": [
+            {"key": "first_name", "type": "edit_text", "hint": "Prénom"},
+            {"key": "mood", "options": [{"key": "happy", "value": False}], "v": {}},
+        ],
+    },
+    "step2": {"title": "Empty", "fields": []},
+    "empty": {},
+}
+
+
+class TestWriter(unittest.TestCase):
+    """
+    Test writing native form JSON incrementally.
+    """
+
+    def test_indented(self) -> None:
+        """Test indented output is the same as json.dumps(indent=4)."""
+        stream = io.StringIO()
+        write_native_form(FORM, stream)
+        self.assertEqual(stream.getvalue(), json.dumps(FORM, indent=4) + "\n")
+
+    def test_compact(self) -> None:
+        """Test compact output is the same with all backends."""
+        expected = json.dumps(FORM, separators=(",", ":"), ensure_ascii=False) + "\n"
+        backends = ["auto", "json"] + (["orjson"] if load_orjson() else [])
+        for backend in backends:
+            stream = io.StringIO()
+            write_native_form(FORM, stream, compact=True, backend=backend)
+            self.assertEqual(stream.getvalue(), expected)
+
+        with self.assertRaises(ValueError):
+            get_dumps(compact=False, backend="orjson")
+        with self.assertRaises(ValueError):
+            get_dumps(backend="yaml")
+
+    def test_incremental(self) -> None:
+        """Test items are written as they are produced."""
+        stream = io.StringIO()
+
+        def items() -> Iterator[Tuple[str, Any]]:
+            yield "encounter_type", "Sample"
+            self.assertIn('"encounter_type": "Sample"', stream.getvalue())
+            yield "step1", {"title": "Step", "fields": iter([{"key": "a"}])}
+            self.assertIn('"key": "a"', stream.getvalue())
+
+        write_native_form(items(), stream)
+        self.assertEqual(
+            json.loads(stream.getvalue()),
+            {
+                "encounter_type": "Sample",
+                "step1": {"title": "Step", "fields": [{"key": "a"}]},
+            },
+        )
+
+    def test_lazy_fields(self) -> None:
+        """Test the fields of a step are built as they are written inside
+        xlson.lazy_fields()."""
+        path = os.path.join(HERE, "sample.xlsx")
+        stream = io.StringIO()
+        written: List[int] = []
+        get_field_builder = xlson.get_field_builder
+
+        def get_builder(name: str) -> Optional[Callable[..., Dict]]:
+            found = get_field_builder(name)
+            if found is None:
+                return None
+            builder: Callable[..., Dict] = found
+
+            def build(**kwargs: Any) -> Dict:
+                written.append(len(stream.getvalue()))
+                return builder(**kwargs)
+
+            return build
+
+        def items() -> Iterator[Tuple[str, Any]]:
+            for key, value in xlson.iter_xlsform(path):
+                if key.startswith("step"):
+                    self.assertIsInstance(value["fields"], abc.Iterator)
+                yield key, value
+
+        with mock.patch("xlson.get_field_builder", get_builder):
+            with xlson.lazy_fields():
+                write_native_form(items(), stream)
+        self.assertGreater(len(written), 1)
+        self.assertEqual(written, sorted(set(written)))
+        self.assertEqual(json.loads(stream.getvalue()), xlson.convert_xlsform(path))
+
+    def test_cli_compact(self) -> None:
+        """Test xlson.cli --compact writes JSON without indentation."""
+        path = os.path.join(HERE, "sample.xlsx")
+        result = CliRunner().invoke(xlson.cli, args=(path, "--compact", "--no-cache"))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(len(result.output.splitlines()), 1)
+        self.assertEqual(json.loads(result.output), xlson.convert_xlsform(path))
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_writer")
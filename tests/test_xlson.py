@@ -5,14 +5,76 @@ Test xlson python package.
 
 import json
 import os
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from typing import Any, Dict, List
+from unittest import mock
 
 from click.testing import CliRunner
-from pyxform.tests_v1.pyxform_test_case import PyxformMarkdown
+from pyxform.builder import create_survey_element_from_dict
+from pyxform.tests_v1.pyxform_test_case import PyxformMarkdown, md_table_to_ss_structure
+from pyxform.xls2json import parse_file_to_json, workbook_to_json
 
 import xlson
 
+from tests.helpers import normalized, write_xlsform
+
 HERE = os.path.dirname(__file__)
+# Modules only some commands need, see benchmarks/startup.py.
+SLOW_MODULES = (
+    "sqlite3",
+    "concurrent.futures.process",
+    "multiprocessing",
+    "logging",
+    "orjson",
+    "msgpack",
+    "cbor2",
+    "zstandard",
+)
+
+SURVEY_MD = """
+    | survey  |
+    |         | type               | name       | label               | hint         | required | required_message | constraint               | constraint_message | instance::openmrs_entity_id |
+    |         | begin group        | step1      | Patient Information |              |          |                  |                          |                    |                             |
+    |         | text               | first_name | What's your name?   |              | yes      | Enter the name.  | regex(., '[A-Za-z\\s]*') | Invalid name.      | 1AAA                        |
+    |         | integer            | age        | Age                 |              | no       |                  |                          |                    |                             |
+    |         | select_one mood    | mood       | What is the mood?   |              |          |                  |                          |                    |                             |
+    |         | select_one mood    | mood2      | What is the mood?   | Choose mood  |          |                  |                          |                    |                             |
+    |         | end group          |            |                     |              |          |                  |                          |                    |                             |
+    |         | begin group        | step2      | Other details       |              |          |                  |                          |                    |                             |
+    |         | select_multiple yn | colours    | Colours?            |              |          |                  |                          |                    |                             |
+    |         | geopoint           | location   | Location            |              |          |                  |                          |                    |                             |
+    |         | barcode            | user_id    | User ID             | Scan QR code |          |                  |                          |                    |                             |
+    |         | photo              | user_image | Take a photo.       |              |          |                  |                          |                    |                             |
+    |         | begin repeat       | visits     | Visits              |              |          |                  |                          |                    |                             |
+    |         | text               | visit      | Visit               |              |          |                  |                          |                    |                             |
+    |         | end repeat         |            |                     |              |          |                  |                          |                    |                             |
+    |         | end group          |            |                     |              |          |                  |                          |                    |                             |
+    | choices |
+    |         | list_name | name  | label | instance::openmrs_entity_id |
+    |         | mood      | happy | Happy | 1107AAA                     |
+    |         | mood      | sad   | Sad   | 1713AAA                     |
+    |         | yn        | yes   | Yes   | AABB                        |
+    |         | yn        | no    | No    | BBCC                        |
+    """
+
+
+def md_to_survey_dict(md_raw: str) -> dict:
+    """Returns the parsed XLSForm of a markdown XLSForm."""
+    sheets = {}
+    for sheet, rows in md_table_to_ss_structure(md_raw):
+        headers = rows[0]
+        sheets[sheet] = [
+            {header: cell for header, cell in zip(headers, row) if cell}
+            for row in rows[1:]
+        ]
+
+    survey_dict: dict = workbook_to_json(sheets, "sample")
+
+    return survey_dict
 
 
 class TestXLSon(PyxformMarkdown, unittest.TestCase):
@@ -388,12 +450,33 @@ class TestXLSon(PyxformMarkdown, unittest.TestCase):
             },
         )
 
+    def test_field_slots(self) -> None:
+        """Test native form fields have no instance __dict__ or FIELDS copy."""
+        field = xlson.build_field(
+            {
+                "name": "mood",
+                "label": "Mood?",
+                "hint": "Mood?",
+                "type": "select one",
+                "children": [],
+            }
+        )
+        self.assertEqual(field["type"], "spinner")
+        self.assertNotIn("label", field)
+        self.assertFalse(hasattr(field, "__dict__"))
+        self.assertIn("label", xlson.SelectOneField.FIELDS)
+
+        with self.assertRaises(AssertionError):
+            xlson.build_field({"name": "first_name", "type": "text"})
+
     def test_cli(self) -> None:
         """Test xlson.cli command"""
         runner = CliRunner()
         result = runner.invoke(xlson.cli)
-        self.assertIn('Error: Missing argument "XLSFORM".', result.output)
-        result = runner.invoke(xlson.cli, args=(os.path.join(HERE, "sample.xlsx"),))
+        self.assertIn('Error: Missing argument "XLSFORM...".', result.output)
+        result = runner.invoke(
+            xlson.cli, args=("--no-cache", os.path.join(HERE, "sample.xlsx"))
+        )
 
         sample_native_form = {
             "encounter_type": "sample",
@@ -414,6 +497,309 @@ class TestXLSon(PyxformMarkdown, unittest.TestCase):
         }
         self.assertEqual(sample_native_form, json.loads(result.output))
 
+    def test_cli_commands(self) -> None:
+        """Test xlson runs the convert command unless given another command."""
+        runner = CliRunner()
+        path = os.path.join(HERE, "sample.xlsx")
+        result = runner.invoke(xlson.cli, args=("convert", "--no-cache", path))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            result.output, runner.invoke(xlson.cli, args=("--no-cache", path)).output
+        )
+        result = runner.invoke(xlson.cli, args=("--help",))
+        self.assertIn("convert", result.output)
+        self.assertIn("serve", result.output)
+        self.assertIn("watch", result.output)
+        result = runner.invoke(xlson.cli, args=("serve", "--help"))
+        self.assertIn("--socket", result.output)
+
+
+class TestNormalizeSurvey(unittest.TestCase):
+    """
+    Test converting a parsed XLSForm without building the pyxform Survey object.
+    """
+
+    def assertSamePaths(self, survey_dict: dict) -> None:  # pylint: disable=C0103
+        """Asserts both conversion paths create the same native form."""
+        survey = create_survey_element_from_dict(survey_dict)
+        expected = xlson.create_native_form(survey.to_json_dict())
+        form = xlson.create_native_form(normalized(survey_dict))
+        self.assertEqual(json.dumps(form), json.dumps(expected))
+
+    def test_sample_xlsx(self) -> None:
+        """Test the sample.xlsx XLSForm."""
+        self.assertSamePaths(parse_file_to_json(os.path.join(HERE, "sample.xlsx")))
+
+    def test_fixtures(self) -> None:
+        """Test markdown XLSForms with all supported question types."""
+        sample_md = """
+            | survey |
+            |        | type        | name       | label               |
+            |        | begin group | step1      | Patient Information |
+            |        | text        | first_name | What's your name?   |
+            |        | end group   |            |                     |
+            """
+        self.assertSamePaths(md_to_survey_dict(sample_md))
+        self.assertSamePaths(md_to_survey_dict(SURVEY_MD))
+
+    def test_or_other(self) -> None:
+        """Test select or_other questions get an other choice and question."""
+        survey_dict = md_to_survey_dict("""
+            | survey  |
+            |         | type                   | name | label  |
+            |         | begin group            | step | Step   |
+            |         | select_one yn or_other | ok   | Is ok? |
+            |         | end group              |      |        |
+            | choices |
+            |         | list_name | name | label |
+            |         | yn        | yes  | Yes   |
+            |         | yn        | no   | No    |
+            """)
+        expected = create_survey_element_from_dict(survey_dict).to_json_dict()
+        survey = normalized(survey_dict)
+        self.assertEqual(
+            survey["children"][0]["children"], expected["children"][0]["children"]
+        )
+
+    def test_survey_builder_types(self) -> None:
+        """Test loops need the pyxform Survey object."""
+        survey_dict = md_to_survey_dict(SURVEY_MD)
+        survey_dict["children"][0]["children"].append(
+            {"type": "loop", "name": "loop", "columns": [], "children": []}
+        )
+        self.assertIsNone(xlson.normalize_survey(survey_dict))
+
+    def test_convert_xlsform(self) -> None:
+        """Test xlson.convert_xlsform() with and without the Survey object."""
+        path = os.path.join(HERE, "sample.xlsx")
+        self.assertEqual(
+            xlson.convert_xlsform(path),
+            xlson.convert_xlsform(path, survey_builder=True),
+        )
+
+
+class TestFieldRegistry(unittest.TestCase):
+    """
+    Test registering native form field builders.
+    """
+
+    def setUp(self) -> None:
+        self.builders = xlson.FIELD_BUILDERS.copy()
+
+    def tearDown(self) -> None:
+        xlson.FIELD_BUILDERS.clear()
+        xlson.FIELD_BUILDERS.update(self.builders)
+
+    def test_register_field(self) -> None:
+        """Test xlson.register_field() adds a builder for a question type."""
+        self.assertNotIn("date", xlson.SUPPORTED_QUESTIONS_TYPES)
+
+        @xlson.register_field("date")
+        class DatePickerField(xlson.NativeFormField):  # pylint: disable=W0612
+            """Native form date picker field."""
+
+            field_type = "date_picker"
+
+        self.assertIn("date", xlson.SUPPORTED_QUESTIONS_TYPES)
+        step = {
+            "name": "step1",
+            "label": "Patient Information",
+            "type": "group",
+            "children": [
+                {"name": "dob", "label": "Date of birth", "type": "date"},
+                {"name": "note", "label": "Unsupported", "type": "note"},
+            ],
+        }
+        self.assertEqual(
+            xlson.build_field(step),
+            {
+                "step1": {
+                    "title": "Patient Information",
+                    "fields": [
+                        {
+                            "key": "dob",
+                            "type": "date_picker",
+                            "openmrs_entity": "",
+                            "openmrs_entity_id": "",
+                            "openmrs_entity_parent": "",
+                        }
+                    ],
+                }
+            },
+        )
+
+    def test_entry_points(self) -> None:
+        """Test builders are loaded from xlson.fields entry points."""
+        entry_point = mock.Mock()
+        entry_point.name = "toaster"
+        entry_point.load.return_value = lambda **kwargs: {"key": kwargs["name"]}
+        with mock.patch(
+            "xlson._iter_entry_points", return_value=[entry_point]
+        ), mock.patch("xlson._ENTRY_POINTS_LOADED", False):
+            xlson.load_field_entry_points()
+            self.assertEqual(
+                xlson.build_field({"name": "notice", "type": "toaster"}),
+                {"key": "notice"},
+            )
+
+            # Loading again, e.g. for another converter, keeps later builders.
+            xlson.register_field("toaster")(lambda **kwargs: {"key": "later"})
+            xlson.Converter()
+            self.assertEqual(
+                xlson.build_field({"name": "notice", "type": "toaster"}),
+                {"key": "later"},
+            )
+            self.assertEqual(entry_point.load.call_count, 1)
+
+    def test_entry_points_threads(self) -> None:
+        """Test entry points are loaded once by threads racing to load them."""
+        entry_point = mock.Mock()
+        entry_point.name = "toaster"
+
+        def load() -> type:
+            time.sleep(0.05)
+            return dict
+
+        entry_point.load.side_effect = load
+        with mock.patch(
+            "xlson._iter_entry_points", return_value=[entry_point]
+        ), mock.patch("xlson._ENTRY_POINTS_LOADED", False):
+            threads = [
+                threading.Thread(target=xlson.get_field_builder, args=("text",))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(entry_point.load.call_count, 1)
+
+
+class TestSharedChoices(unittest.TestCase):
+    """
+    Test sharing choice lists between select fields.
+    """
+
+    def test_intern_options(self) -> None:
+        """Test fields using the same choices share their options list."""
+        survey = normalized(md_to_survey_dict(SURVEY_MD))
+        form = xlson.create_native_form(survey)
+        mood, mood2 = form["step1"]["fields"][2:4]
+        self.assertIs(mood["options"], mood2["options"])
+
+        step = xlson.build_field(survey["children"][0])["step1"]
+        self.assertIsNot(step["fields"][2]["options"], step["fields"][3]["options"])
+        self.assertEqual(step["fields"][2]["options"], mood["options"])
+
+    def test_choice_lists(self) -> None:
+        """Test equal choice lists are built once."""
+        children: List[Dict[str, Any]] = [
+            {"name": "yes", "label": "Yes", "instance": {}}
+        ]
+        children[0]["instance"]["openmrs_entity_id"] = "AABB"
+        choice_lists = xlson.ChoiceLists()
+        options = choice_lists.options(xlson.CheckboxField, children)
+        self.assertIs(options, choice_lists.options(xlson.CheckboxField, children))
+        self.assertIs(
+            options,
+            choice_lists.options(xlson.CheckboxField, json.loads(json.dumps(children))),
+        )
+        self.assertIsNot(options, choice_lists.options(xlson.SelectOneField, children))
+
+    def test_iter_shared_choices(self) -> None:
+        """Test each options list is written once in a choices table."""
+        survey = normalized(md_to_survey_dict(SURVEY_MD))
+        form = xlson.create_native_form(survey)
+        shared = dict(xlson.iter_shared_choices(json.loads(json.dumps(form)).items()))
+
+        self.assertEqual(list(shared), ["encounter_type", "step1", "step2", "choices"])
+        self.assertEqual(list(shared["choices"]), ["mood", "colours"])
+        self.assertEqual(
+            shared["choices"]["mood"], form["step1"]["fields"][2]["options"]
+        )
+        self.assertEqual(shared["step1"]["fields"][3]["options"], "mood")
+        self.assertEqual(shared["step2"]["fields"][0]["options"], "colours")
+        self.assertEqual(form["step1"]["fields"][3]["type"], "spinner")
+
+        for step in ("step1", "step2"):
+            for field in shared[step]["fields"]:
+                if "options" in field:
+                    field["options"] = shared["choices"][field["options"]]
+        del shared["choices"]
+        self.assertEqual(shared, form)
+
+    def test_shared_choices_cli(self) -> None:
+        """Test the --shared-choices option."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            write_xlsform("mood.xlsx", SURVEY_MD)
+            result = runner.invoke(
+                xlson.cli, ["--no-cache", "--shared-choices", "mood.xlsx"]
+            )
+            self.assertEqual(result.exit_code, 0, result.output)
+            form = json.loads(result.output)
+            self.assertEqual(
+                form, xlson.convert_xlsform("mood.xlsx", shared_choices=True)
+            )
+        self.assertEqual(list(form["choices"]), ["mood", "colours"])
+        self.assertEqual(form["step1"]["fields"][2]["options"], "mood")
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test importing xlson does not import the XLSForm parsers, see
+    benchmarks/startup.py.
+    """
+
+    def imported_modules(self, statement: str) -> set:
+        """Returns the modules and top level packages imported by
+        ``statement``."""
+        code = "import sys\n%s\nprint(' '.join(sys.modules))" % statement
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            env=dict(os.environ, PYTHONPATH=os.path.dirname(HERE)),
+            universal_newlines=True,
+        )
+        modules = set(output.splitlines()[-1].split())
+        return modules | {module.split(".")[0] for module in modules}
+
+    def test_import(self) -> None:
+        """Test importing xlson does not import click, pyxform or the modules
+        only some commands need."""
+        packages = self.imported_modules(
+            "import xlson, xlson.batch, xlson.reader, xlson.writer\n"
+            "xlson.build_field({'type': 'text', 'name': 'a', 'label': 'A'})"
+        )
+        self.assertNotIn("click", packages)
+        self.assertNotIn("pyxform", packages)
+
+        modules = self.imported_modules(
+            "import xlson, xlson.reader, xlson.writer\n"
+            "xlson.build_field({'type': 'text', 'name': 'a', 'label': 'A'})"
+        )
+        for module in SLOW_MODULES:
+            self.assertNotIn(module, modules)
+
+    def test_cli_help(self) -> None:
+        """Test xlson --help and streaming conversions do not import pyxform,
+        and xlson --help does not import the modules only some commands
+        need."""
+        packages = self.imported_modules(
+            "from xlson.commands import cli\n"
+            "cli.main(['--help'], standalone_mode=False)\n"
+            "cli.main(['--no-cache', '--streaming', %r], standalone_mode=False)"
+            % os.path.join(HERE, "sample.xlsx")
+        )
+        self.assertIn("click", packages)
+        self.assertNotIn("pyxform", packages)
+
+        modules = self.imported_modules(
+            "from xlson.commands import cli\n"
+            "cli.main(['--help'], standalone_mode=False)"
+        )
+        for module in SLOW_MODULES:
+            self.assertNotIn(module, modules)
+
 
 if __name__ == "__main__":
     unittest.main(module="test_xlson")
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Test xlson.xpath module.
+"""
+
+import unittest
+
+from xlson.xpath import (
+    And,
+    Arithmetic,
+    Call,
+    Compare,
+    Current,
+    Literal,
+    Negative,
+    Or,
+    Ref,
+    XPathSyntaxError,
+    parse_xpath,
+)
+
+
+class TestXPath(unittest.TestCase):
+    """
+    Test parsing XLSForm XPath expressions.
+    """
+
+    def test_parse_xpath(self) -> None:
+        """Test expressions are parsed to their nodes."""
+        self.assertEqual(
+            parse_xpath("${hiv} = 'yes' and selected( ${ symptoms }, \"fever\")"),
+            And(
+                (
+                    Compare("=", Ref("hiv"), Literal("yes")),
+                    Call("selected", (Ref("symptoms"), Literal("fever"))),
+                )
+            ),
+        )
+        self.assertEqual(
+            parse_xpath("(${a} != -1.5 or . >= 2) and not(${b})"),
+            And(
+                (
+                    Or(
+                        (
+                            Compare("!=", Ref("a"), Literal("-1.5", number=True)),
+                            Compare(">=", Current(), Literal("2", number=True)),
+                        )
+                    ),
+                    Call("not", (Ref("b"),)),
+                )
+            ),
+        )
+        self.assertEqual(parse_xpath("today()"), Call("today", ()))
+        two = Literal("2", number=True)
+        self.assertEqual(
+            parse_xpath("-${a} + ${b} * 2 div -(2) mod 2 - 1"),
+            Arithmetic(
+                "-",
+                Arithmetic(
+                    "+",
+                    Negative(Ref("a")),
+                    Arithmetic(
+                        "mod",
+                        Arithmetic(
+                            "div", Arithmetic("*", Ref("b"), two), Literal("-2", True)
+                        ),
+                        two,
+                    ),
+                ),
+                Literal("1", number=True),
+            ),
+        )
+
+    def test_errors(self) -> None:
+        """Test unsupported expressions raise XPathSyntaxError."""
+        for expression in ("${a} +", "${a} = 'x' and", "(${a}", "${a} ${b}", ""):
+            with self.assertRaises(XPathSyntaxError, msg=expression):
+                parse_xpath(expression)
+
+    def test_cache(self) -> None:
+        """Test parsed expressions are memoised on their text."""
+        parse_xpath.cache_clear()
+        for _ in range(3):
+            node = parse_xpath("${cached} = 'yes'")
+        self.assertIs(parse_xpath("${cached} = 'yes'"), node)
+        info = parse_xpath.cache_info()
+        self.assertEqual((info.hits, info.misses), (3, 1))
+
+
+if __name__ == "__main__":
+    unittest.main(module="test_xpath")
@@ -4,15 +4,59 @@ xlson - converts XLSForm to form JSON.
 """
 __version__ = "0.0.1"
 
-import json
+import io
+import sys
+import threading
+from contextlib import contextmanager
 from enum import Enum
-from typing import Any, BinaryIO, Dict
-
-import click
-from pyxform.builder import create_survey_element_from_dict
-from pyxform.xls2json import parse_file_to_json
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from xlson.cache import FORM, SURVEY, Cache
+from xlson.calculations import (
+    CALCULATION_RULES,
+    DEFAULT_RULES_FILE,
+    build_rules,
+    collect_calculations,
+    current_calculations,
+)
+from xlson.profiling import (
+    BUILD_SURVEY,
+    CACHE,
+    CREATE_NATIVE_FORM,
+    PARSE,
+    RESOLVE_CONCEPTS,
+    SHARED_CHOICES,
+    current_profile,
+    iter_stage,
+    stage,
+)
+from xlson.relevance import (
+    RELEVANCE,
+    add_step,
+    build_relevance,
+    field_step,
+    field_steps,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from xlson.concepts import ConceptIndex
 
 CHILDREN = "children"
+CHOICES = "choices"
 FIELDS = "fields"
 HINT = "hint"
 INSTANCE = "instance"
@@ -25,24 +69,24 @@ TITLE = "title"
 TYPE = "type"
 CONSTRAINT = "constraint"
 REQUIRED = "required"
-SUPPORTED_QUESTIONS_TYPES = [
-    "barcode",
-    "geopoint",
-    "group",
-    "integer",
-    "photo",
-    "text",
-    "select one",
-    "select all that apply",
-]
+RELEVANT = "relevant"
+CALCULATE = "calculate"
+# XLSForm question type -> native form field builder, see register_field().
+FIELD_BUILDERS: Dict[str, Callable[..., Dict]] = {}
+SUPPORTED_QUESTIONS_TYPES = FIELD_BUILDERS.keys()
+FIELD_ENTRY_POINTS = "xlson.fields"
 
 BIND_CONVERSTION = {"yes": "true", "Yes": "true", "no": "false", "No": "false"}
+OR_OTHER = " or specify other"
+# pyxform survey constructs only expanded by building the pyxform Survey object
+SURVEY_BUILDER_TYPES = ("include", "loop")
 
 
 class QuestionTypes(Enum):
     """XLSForm question types."""
 
     BARCODE = "barcode"
+    CALCULATE = "calculate"
     GEOPOINT = "geopoint"
     GROUP = "group"
     INTEGER = "integer"
@@ -52,8 +96,96 @@ class QuestionTypes(Enum):
     TEXT = "text"
 
 
+BuilderType = TypeVar("BuilderType", bound=Callable[..., Dict])
+
+
+def register_field(question_type: str) -> Callable[[BuilderType], BuilderType]:
+    """Registers the decorated native form field builder for an XLSForm
+    question type, replacing any builder already registered for it.
+
+    A builder is called with the question's dict as keyword arguments and
+    returns the native form field dict, e.g. a ``NativeFormField`` subclass::
+
+        @xlson.register_field("date")
+        class DatePickerField(xlson.NativeFormField):
+            field_type = "date_picker"
+
+    Builders can also be registered by installed packages with an
+    ``xlson.fields`` entry point named after the question type.
+    """
+
+    def decorator(builder: BuilderType) -> BuilderType:
+        FIELD_BUILDERS[question_type] = builder
+        return builder
+
+    return decorator
+
+
+def _iter_entry_points() -> Iterable[Any]:
+    found: Iterable[Any]
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+
+        found = pkg_resources.iter_entry_points(FIELD_ENTRY_POINTS)
+        return found
+
+    all_entry_points: Any = entry_points()
+    if hasattr(all_entry_points, "select"):  # Python >= 3.10
+        found = all_entry_points.select(group=FIELD_ENTRY_POINTS)
+    else:
+        found = all_entry_points.get(FIELD_ENTRY_POINTS, [])
+
+    return found
+
+
+_ENTRY_POINTS_LOADED = False
+_ENTRY_POINTS_LOCK = threading.Lock()
+
+
+def load_field_entry_points() -> None:
+    """Registers the field builders of ``xlson.fields`` entry points, this is
+    done on the first call to ``get_field_builder()``. The entry points are
+    only loaded once, builders registered afterwards are kept."""
+    global _ENTRY_POINTS_LOADED  # pylint: disable=global-statement
+    if _ENTRY_POINTS_LOADED:
+        return
+    # Other threads wait for the builders to be registered before using them,
+    # the first one to get the lock loads them.
+    with _ENTRY_POINTS_LOCK:
+        if _ENTRY_POINTS_LOADED:
+            return
+        for entry_point in _iter_entry_points():
+            register_field(entry_point.name)(entry_point.load())
+        _ENTRY_POINTS_LOADED = True
+
+
+def get_field_builder(question_type: Optional[str]) -> Optional[Callable[..., Dict]]:
+    """Returns the field builder registered for an XLSForm question type."""
+    if not _ENTRY_POINTS_LOADED:
+        load_field_entry_points()
+
+    return FIELD_BUILDERS.get(question_type)  # type: ignore
+
+
+def build_defaults(
+    fields: Mapping[str, Callable[[], Any]],
+) -> Tuple[Tuple[str, Any], ...]:
+    """Returns the (key, default value) pairs of a ``FIELDS`` mapping."""
+    return tuple((key, default()) for key, default in fields.items())
+
+
 class NativeFormField(dict):
-    """Base class for a native form field."""
+    """Base class for a native form field.
+
+    ``FIELDS`` maps the field's keys to their default value constructor, the
+    default values are created once per class in ``DEFAULTS``. Subclasses list
+    the question keys they need in ``REQUIRED`` and return the values that are
+    not copied from the question from ``field_values()``.
+    """
+
+    __slots__ = ()
 
     field_type: str = ""
 
@@ -64,26 +196,37 @@ class NativeFormField(dict):
         OPENMRS_ENTITY_ID: str,
         "openmrs_entity_parent": str,
     }
+    DEFAULTS = build_defaults(FIELDS)
+    REQUIRED: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.DEFAULTS = build_defaults(cls.FIELDS)
 
     def __init__(self, **kwargs: Dict) -> None:
         assert NAME in kwargs, "'%s' is a required field." % KEY
-        elements: Dict[str, Any] = {}
-        for key, default in self.FIELDS.items():
-            elements[key] = kwargs.get(key, default())
+        for key in self.REQUIRED:
+            assert key in kwargs, "'%s' is a required field." % key
+        super(NativeFormField, self).__init__()
 
-        elements[KEY] = kwargs[NAME]
-        elements[TYPE] = self.field_type
+        values = self.field_values(kwargs)
+        for key, default in self.field_defaults(kwargs):
+            self[key] = values[key] if key in values else kwargs.get(key, default)
 
         if "bind" in kwargs:
             bind_dict: Dict[str, Any] = kwargs.get("bind", {})
 
             for key, value in bind_dict.items():
-                # Handle bind::constraint field
-                if key == CONSTRAINT:
-                    if value.startswith("regex"):
-                        val = value.split("'")
-                        regex_val = val[1]
-                        elements["v_regex"] = {
+                # Handle bind::constraint regex, see xlson.constraints
+                if key == CONSTRAINT and value:
+                    from xlson.constraints import constraint_regex
+
+                    try:
+                        regex_val = constraint_regex(value)
+                    except ValueError:
+                        regex_val = None
+                    if regex_val is not None:
+                        self["v_regex"] = {
                             "value": regex_val,
                             "err": bind_dict.get("jr:constraintMsg"),
                         }
@@ -91,201 +234,385 @@ class NativeFormField(dict):
                 # Handle bind::required value conversion
                 if key == REQUIRED and value in BIND_CONVERSTION:
                     val = BIND_CONVERSTION[value]
-                    elements["v_required"] = {
+                    self["v_required"] = {
                         "value": val,
                         "err": bind_dict.get("jr:requiredMsg"),
                     }
 
-        super(NativeFormField, self).__init__(**elements)
+                # Handle bind::relevant skip logic, see xlson.relevance
+                if key == RELEVANT and value:
+                    relevance = build_relevance(value, self[KEY])
+                    if relevance:
+                        self[RELEVANCE] = relevance
 
+    def field_defaults(self, kwargs: Dict) -> Tuple[Tuple[str, Any], ...]:
+        """Returns the (key, default value) pairs of the field's keys."""
+        return self.DEFAULTS
 
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        """Returns the field values that are not copied from the question."""
+        return {KEY: kwargs[NAME], TYPE: self.field_type}
+
+
+@register_field(QuestionTypes.TEXT.value)
 class EditTextField(NativeFormField):
     """Native form edit text field."""
 
+    __slots__ = ()
+
     field_type: str = "edit_text"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"edit_type": str, "hint": str})
+    REQUIRED = (LABEL,)
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        params: Dict[str, Any] = kwargs.copy()
-        params[HINT] = params.pop(LABEL)
-        params["edit_type"] = "name"
-        super(EditTextField, self).__init__(**params)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            HINT: kwargs[LABEL],
+            "edit_type": "name",
+        }
 
 
+@register_field(QuestionTypes.PHOTO.value)
 class ChooseImageField(NativeFormField):
     """Native form choose_image field."""
 
+    __slots__ = ()
+
     field_type: str = "choose_image"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"uploadButtonText": str})
+    REQUIRED = (LABEL,)
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        params = kwargs.copy()
-        params["uploadButtonText"] = params.pop(LABEL)
-
-        super(ChooseImageField, self).__init__(**params)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            "uploadButtonText": kwargs[LABEL],
+        }
 
 
+@register_field(QuestionTypes.INTEGER.value)
 class IntegerField(NativeFormField):
     """Native form integer field."""
 
+    __slots__ = ()
+
     field_type: str = "edit_text"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"edit_type": str, "hint": str})
+    REQUIRED = (LABEL,)
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        params: Dict[str, Any] = kwargs.copy()
-        params[HINT] = params.pop(LABEL)
-        params["edit_type"] = "number"
-
-        super(IntegerField, self).__init__(**params)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            HINT: kwargs[LABEL],
+            "edit_type": "number",
+        }
 
 
+@register_field(QuestionTypes.GEOPOINT.value)
 class GpsField(NativeFormField):
     """Native form gps field."""
 
+    __slots__ = ()
+
     field_type: str = "gps"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"openmrs_data_type": str})
+    REQUIRED = (LABEL,)
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        params: Dict[str, Any] = kwargs.copy()
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
         # Include the openmrs_data_type field
-        params["openmrs_data_type"] = "text"
-
-        super(GpsField, self).__init__(**params)
+        return {KEY: kwargs[NAME], TYPE: self.field_type, "openmrs_data_type": "text"}
 
 
+@register_field(QuestionTypes.BARCODE.value)
 class BarcodeField(NativeFormField):
     """Native form barcode field."""
 
+    __slots__ = ()
+
     field_type: str = "barcode"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"scanButtonText": str, "barcode_type": str, "hint": str})
+    REQUIRED = (LABEL,)
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        params: Dict[str, Any] = kwargs.copy()
-        params["scanButtonText"] = params.get(HINT)
-        params["barcode_type"] = "qrcode"
-        params[HINT] = params.pop(LABEL)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            "scanButtonText": kwargs.get(HINT),
+            "barcode_type": "qrcode",
+            HINT: kwargs[LABEL],
+        }
+
+
+@register_field(QuestionTypes.CALCULATE.value)
+class CalculateField(NativeFormField):
+    """Native form hidden field set by a calculation rule, see
+    ``xlson.calculations``."""
+
+    __slots__ = ()
+
+    field_type: str = "hidden"
+
+    FIELDS = NativeFormField.FIELDS.copy()
+    FIELDS.update({"calculation": str})
+
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        # The rule is built with the other rules of the form.
+        calculations = current_calculations()
+        rules_file = DEFAULT_RULES_FILE
+        if calculations is not None:
+            rules_file = calculations.rules_file
+            bind: Dict[str, Any] = kwargs.get("bind") or {}
+            if bind.get(CALCULATE):
+                calculations.add(kwargs[NAME], bind[CALCULATE])
+
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            "calculation": {"rules-engine": {"ex-rules": {"rules-file": rules_file}}},
+        }
+
+
+def freeze(value: Any) -> Hashable:
+    """Returns a hashable equivalent of a JSON value, used to compare choice
+    lists."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    frozen: Hashable = value
+
+    return frozen
+
+
+class ChoiceLists:
+    """Interns the options built from choice lists so that select fields using
+    the same choices share a single options list.
+
+    pyxform and ``xlson.reader`` give every question using a list the same
+    choices list object which is looked up first, other lists are compared on
+    their content.
+    """
+
+    def __init__(self) -> None:
+        self._by_id: Dict[Tuple[type, int], Tuple[List[Dict], List[Dict]]] = {}
+        self._by_content: Dict[Tuple[type, Hashable], List[Dict]] = {}
 
-        super(BarcodeField, self).__init__(**params)
+    def options(self, field_class: Any, children: List[Dict]) -> List[Dict]:
+        """Returns the options ``field_class.build_options()`` builds from
+        ``children``, building them on the first call only."""
+        found = self._by_id.get((field_class, id(children)))
+        if found is not None and found[0] is children:
+            return found[1]
 
+        content_key = (field_class, freeze(children))
+        options = self._by_content.get(content_key)
+        if options is None:
+            options = field_class.build_options(children)
+            self._by_content[content_key] = options
+        # Holding on to children keeps its id from being reused.
+        self._by_id[(field_class, id(children))] = (children, options)
 
+        return options
+
+
+_LOCAL = threading.local()
+
+
+@contextmanager
+def intern_choice_lists() -> Iterator[ChoiceLists]:
+    """Interns the options of the select fields built in this thread until the
+    context exits, nested contexts share the outer context's lists.
+
+    Fields built in the context may share their options list, copy it before
+    changing the options of a single field.
+    """
+    previous = getattr(_LOCAL, "choice_lists", None)
+    choice_lists = previous or ChoiceLists()
+    _LOCAL.choice_lists = choice_lists
+    try:
+        yield choice_lists
+    finally:
+        _LOCAL.choice_lists = previous
+
+
+@contextmanager
+def lazy_fields(enabled: bool = True) -> Iterator[None]:
+    """Builds the fields of the steps built in this thread until the context
+    exits as they are iterated, when ``enabled``.
+
+    The ``fields`` of such a step are an iterator that can only be consumed
+    once, e.g. by ``xlson.writer`` which writes each field as it is built. Only
+    use it when the writer is the sole consumer of the form.
+    """
+    previous = getattr(_LOCAL, "lazy_fields", False)
+    _LOCAL.lazy_fields = enabled
+    try:
+        yield
+    finally:
+        _LOCAL.lazy_fields = previous
+
+
+def intern_options(field_class: Any, children: List[Dict]) -> List[Dict]:
+    """Returns the options of a select field, shared with the other fields
+    using the same choices inside ``intern_choice_lists()``."""
+    choice_lists: Optional[ChoiceLists] = getattr(_LOCAL, "choice_lists", None)
+    if choice_lists is None:
+        options: List[Dict] = field_class.build_options(children)
+        return options
+
+    return choice_lists.options(field_class, children)
+
+
+@register_field(QuestionTypes.SELECT_ONE.value)
 class SelectOneField(NativeFormField):
     """
     Native form native radio field
     Spinner native radio field
     """
 
-    def __init__(self, **kwargs: Dict) -> None:
-        self.FIELDS = NativeFormField.FIELDS.copy()  # pylint: disable=C0103
-        self.FIELDS.update({"label": str, "options": str, "hint": str})
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        assert CHILDREN in kwargs, "'%s' is a required field." % CHILDREN
-        params: Dict[str, Any] = kwargs.copy()
+    __slots__ = ()
 
-        if HINT in params.keys():
-            self.field_type: str = "spinner"
-            self.FIELDS.pop(LABEL)
-        else:
-            self.field_type: str = "native_radio"
-            self.FIELDS.pop(HINT)
-
-        if CHILDREN in params:
-            params["options"] = []
-            for child in params[CHILDREN]:
-                options_data = {
-                    "key": child["name"],
-                    "openmrs_entity": "",
-                    OPENMRS_ENTITY_ID: child[INSTANCE][OPENMRS_ENTITY_ID],
-                    "openmrs_entity_parent": "",
-                    "text": child["label"],
-                }
-                params["options"].append(options_data)
-            params.pop("children")
+    field_type: str = "native_radio"
+    spinner_field_type: str = "spinner"
+
+    FIELDS = NativeFormField.FIELDS.copy()
+    FIELDS.update({"label": str, "options": str, "hint": str})
+    REQUIRED = (LABEL, CHILDREN)
+    # A spinner has a hint and no label, a native radio a label and no hint.
+    SPINNER_DEFAULTS = tuple(
+        item for item in build_defaults(FIELDS) if item[0] != LABEL
+    )
+    RADIO_DEFAULTS = tuple(item for item in build_defaults(FIELDS) if item[0] != HINT)
+
+    def field_defaults(self, kwargs: Dict) -> Tuple[Tuple[str, Any], ...]:
+        return self.SPINNER_DEFAULTS if HINT in kwargs else self.RADIO_DEFAULTS
+
+    @classmethod
+    def build_options(cls, children: List[Dict]) -> List[Dict]:
+        """Returns the native radio options of a choice list."""
+        return [
+            {
+                "key": child["name"],
+                "openmrs_entity": "",
+                OPENMRS_ENTITY_ID: child.get(INSTANCE, {}).get(OPENMRS_ENTITY_ID, ""),
+                "openmrs_entity_parent": "",
+                "text": child["label"],
+            }
+            for child in children
+        ]
 
-        super(SelectOneField, self).__init__(**params)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.spinner_field_type if HINT in kwargs else self.field_type,
+            "options": intern_options(type(self), kwargs[CHILDREN]),
+        }
 
 
+@register_field(QuestionTypes.SELECT_MULTIPLE.value)
 class CheckboxField(NativeFormField):
     """Native form Checkbox Field (Multi-select field)."""
 
+    __slots__ = ()
+
     field_type: str = "check_box"
 
     FIELDS = NativeFormField.FIELDS.copy()
     FIELDS.update({"label": str, "options": str})
+    REQUIRED = (LABEL, CHILDREN)
+
+    @classmethod
+    def build_options(cls, children: List[Dict]) -> List[Dict]:
+        """Returns the unselected checkbox options of a choice list."""
+        selected = False
+        return [
+            {
+                "key": child["name"],
+                OPENMRS_CHOICE_ID: child.get(INSTANCE, {}).get(OPENMRS_ENTITY_ID, ""),
+                "text": child["label"],
+                "value": selected,
+            }
+            for child in children
+        ]
 
-    def __init__(self, **kwargs: Dict) -> None:
-        assert LABEL in kwargs, "'%s' is a required field." % LABEL
-        assert CHILDREN in kwargs, "'%s' is a required field." % CHILDREN
-        params: Dict[str, Any] = kwargs.copy()
-
-        if CHILDREN in params:
-            selected = False
-            params["options"] = []
-            for child in params[CHILDREN]:
-                options_data = {
-                    "key": child["name"],
-                    OPENMRS_CHOICE_ID: child[INSTANCE][OPENMRS_ENTITY_ID],
-                    "text": child["label"],
-                    "value": selected,
-                }
-                params["options"].append(options_data)
-            params.pop("children")
-
-        super(CheckboxField, self).__init__(**params)
+    def field_values(self, kwargs: Dict) -> Dict[str, Any]:
+        return {
+            KEY: kwargs[NAME],
+            TYPE: self.field_type,
+            "options": intern_options(type(self), kwargs[CHILDREN]),
+        }
 
 
 class Step(dict):
     """Native form step section."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs: Dict) -> None:
         assert LABEL in kwargs, "'%s' is a required field." % LABEL
         assert CHILDREN in kwargs, "'%s' is a required field." % CHILDREN
 
-        elements: Dict[str, Any] = {"title": kwargs[LABEL]}
-        elements[FIELDS] = [
-            build_field(child)
-            for child in kwargs[CHILDREN]
-            if child.get(TYPE) in SUPPORTED_QUESTIONS_TYPES
-        ]
+        if isinstance(kwargs.get(NAME), str):
+            add_step(kwargs[NAME], kwargs[CHILDREN])  # type: ignore
+        fields: Iterable[Dict] = _iter_fields(kwargs[CHILDREN])
+        # Profiled fields are built inside the conversion's stages.
+        if not getattr(_LOCAL, "lazy_fields", False) or current_profile() is not None:
+            fields = list(fields)
+
+        super(Step, self).__init__(title=kwargs[LABEL], fields=fields)
+
+
+def _iter_fields(children: Iterable[Dict]) -> Iterator[Dict]:
+    profile = current_profile()
+    for child in children:
+        builder = get_field_builder(child.get(TYPE))
+        if builder is None:
+            continue
+        # The fields of nested groups are encoded with the field, in one go.
+        with lazy_fields(False):
+            if profile is None:
+                field = builder(**child)
+            else:
+                field = profile.build_field(child[TYPE], builder, child)
+        yield field
+
+
+@register_field(QuestionTypes.GROUP.value)
+def build_step(**kwargs: Dict) -> Dict:
+    """Build a native form step keyed on the group name."""
+    return {kwargs[NAME]: Step(**kwargs)}
 
-        super(Step, self).__init__(**elements)
+
+# xlson's own builders, native forms built by them can be cached.
+_DEFAULT_BUILDERS = dict(FIELD_BUILDERS)
+
+
+def custom_builders() -> bool:
+    """Returns True if field builders other than xlson's own are registered,
+    with ``register_field()`` or by entry points."""
+    if not _ENTRY_POINTS_LOADED:
+        load_field_entry_points()
+
+    return FIELD_BUILDERS != _DEFAULT_BUILDERS
 
 
 def build_field(options: Dict) -> Dict:
     """Build native field."""
-    field: Dict = {}
-    if options[TYPE] == QuestionTypes.TEXT.value:
-        field = EditTextField(**options)
-    elif options[TYPE] == QuestionTypes.GROUP.value:
-        field = {options[NAME]: Step(**options)}
-    elif options[TYPE] == QuestionTypes.PHOTO.value:
-        field = ChooseImageField(**options)
-    elif options[TYPE] == QuestionTypes.INTEGER.value:
-        field = IntegerField(**options)
-    elif options[TYPE] == QuestionTypes.GEOPOINT.value:
-        field = GpsField(**options)
-    elif options[TYPE] == QuestionTypes.BARCODE.value:
-        field = BarcodeField(**options)
-    elif options[TYPE] == QuestionTypes.SELECT_ONE.value:
-        field = SelectOneField(**options)
-    elif options[TYPE] == QuestionTypes.SELECT_MULTIPLE.value:
-        field = CheckboxField(**options)
-
-    return field
+    builder = get_field_builder(options[TYPE])
+
+    return {} if builder is None else builder(**options)
 
 
 def create_native_form(survey: Dict) -> Dict:
@@ -296,21 +623,317 @@ def create_native_form(survey: Dict) -> Dict:
     assert CHILDREN in survey
     assert len(survey[CHILDREN]) > 1 and survey[CHILDREN][0]
 
-    data = {"encounter_type": survey[TITLE]}
-    for child in survey[CHILDREN]:
-        is_a_group = child.get(TYPE) == QuestionTypes.GROUP.value
-        if is_a_group and child.get(NAME) != "meta":
-            data.update(build_field(child))
+    return dict(iter_native_form(survey, survey[CHILDREN]))
+
+
+def iter_native_form(
+    survey: Dict,
+    children: Iterable[Dict],
+    builder: Callable[[Dict], Dict] = build_field,
+) -> Iterator[Tuple[str, Any]]:
+    """Yields the items of a native form dict, the encounter type followed by a
+    step per top-level group in ``children`` and the ``calculation_rules`` of
+    its ``calculate`` fields.
 
-    return data
+    ``children`` may be a generator, each step is built when it is reached by
+    ``builder``. Relevance rules can then only refer to the fields of the
+    steps built so far, or of the steps recorded with ``add_step()`` inside
+    an enclosing ``field_steps()``.
+    """
+    with intern_choice_lists(), field_steps(), collect_calculations(
+        survey.get(NAME)
+    ) as calculations:
+        if isinstance(children, list):
+            for child in children:
+                if child.get(TYPE) == QuestionTypes.GROUP.value:
+                    add_step(child[NAME], child.get(CHILDREN, []))
+        yield "encounter_type", survey[TITLE]
+        for child in children:
+            is_a_group = child.get(TYPE) == QuestionTypes.GROUP.value
+            if is_a_group and child.get(NAME) != "meta":
+                with stage(CREATE_NATIVE_FORM):
+                    step = builder(child)
+                yield from step.items()
+        if calculations.items:
+            with stage(CREATE_NATIVE_FORM):
+                rules = build_rules(calculations.items, field_step)
+            yield CALCULATION_RULES, rules
+
+
+def iter_shared_choices(items: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """Yields the items of a native form with the options of its fields moved
+    to a top-level ``choices`` table written after the steps.
+
+    Each distinct options list is written once keyed on the first field using
+    it, fields reference it by setting ``options`` to that key.
+    """
+    table: Dict[str, List[Dict]] = {}
+    keys_by_id: Dict[int, str] = {}
+    keys_by_content: Dict[Hashable, str] = {}
+    for name, value in items:
+        if not isinstance(value, dict) or not isinstance(value.get(FIELDS), list):
+            yield name, value
+            continue
+
+        fields = []
+        for field in value[FIELDS]:
+            options = field.get("options")
+            if isinstance(options, list):
+                list_key = keys_by_id.get(id(options))
+                if list_key is None:
+                    content = freeze(options)
+                    list_key = keys_by_content.get(content)
+                    if list_key is None:
+                        list_key = field[KEY]
+                        while list_key in table:
+                            list_key += "_"
+                        keys_by_content[content] = list_key
+                        table[list_key] = options
+                    keys_by_id[id(options)] = list_key
+                field = dict(field, options=list_key)
+            fields.append(field)
+        step = dict(value)
+        step[FIELDS] = fields
+        yield name, step
+
+    if table:
+        yield CHOICES, table
+
+
+def parse_file_to_json(path: str, file_object: Optional[BinaryIO] = None) -> Dict:
+    """Parses an XLSForm with pyxform's ``parse_file_to_json()``, pyxform is
+    only imported when an XLSForm is parsed."""
+    with stage(PARSE):
+        from pyxform.xls2json import parse_file_to_json as parse
+
+        survey_dict: Dict = parse(path, file_object=file_object)
+    return survey_dict
+
+
+def build_survey(survey_dict: Dict, survey_builder: bool = False) -> Dict:
+    """Returns the survey dict ``create_native_form()`` expects from a parsed
+    XLSForm, see ``normalize_survey()``. The pyxform Survey object is built
+    when ``survey_builder`` is set or the XLSForm needs it."""
+    survey = None if survey_builder else normalize_survey(survey_dict)
+    if survey is None:
+        from pyxform.builder import create_survey_element_from_dict
+
+        survey = create_survey_element_from_dict(survey_dict).to_json_dict()
+
+    return survey
+
+
+def _iter_survey_dict(
+    survey_dict: Dict, survey_builder: bool
+) -> Iterator[Tuple[str, Any]]:
+    with stage(BUILD_SURVEY):
+        survey = build_survey(survey_dict, survey_builder)
+
+    return iter_native_form(survey, survey[CHILDREN])
+
+
+def _normalize_children(children: List[Dict]) -> Optional[List[Dict]]:
+    elements: List[Dict] = []
+    for child in children:
+        element = normalize_survey(child)
+        if element is None:
+            return None
+        elements.append(element)
+
+        if child.get(TYPE, "").endswith(OR_OTHER):
+            elements.append(
+                {
+                    NAME: "%s_other" % element[NAME],
+                    LABEL: "Specify other.",
+                    TYPE: QuestionTypes.TEXT.value,
+                    "bind": {"relevant": "selected(../%s, 'other')" % element[NAME]},
+                }
+            )
+
+    return elements
 
 
-@click.command()
-@click.argument("xlsform", type=click.File(mode="rb"))
-def cli(xlsform: BinaryIO) -> None:
-    """xlson - XLSForm to native form JSON."""
-    survey = create_survey_element_from_dict(
-        parse_file_to_json(xlsform.name, file_object=xlsform)
+def normalize_survey(survey: Dict) -> Optional[Dict]:
+    """Normalises a parsed XLSForm, the output of pyxform's
+    ``parse_file_to_json()``, into the structure of ``Survey.to_json_dict()``
+    expected by ``create_native_form()``.
+
+    Returns None if the XLSForm uses constructs that need the pyxform Survey
+    object to be expanded, e.g. loops and includes.
+    """
+    if survey.get(TYPE) in SURVEY_BUILDER_TYPES or "add_none_option" in survey:
+        return None
+
+    element = survey.copy()
+    if "parameters" in element and not element["parameters"]:
+        del element["parameters"]
+    question_type = element.get(TYPE, "")
+    if question_type.endswith(OR_OTHER):
+        question_type = question_type[: -len(OR_OTHER)]
+        element[TYPE] = question_type
+        other = {NAME: "other", LABEL: "Other"}
+        choices = element.get(CHOICES, [])
+        element[CHOICES] = choices + [other] if other not in choices else choices
+
+    if question_type.startswith("select ") and CHOICES in element:
+        element[CHILDREN] = element.pop(CHOICES)
+    elif CHILDREN in element:
+        children = _normalize_children(element[CHILDREN])
+        if children is None:
+            return None
+        element[CHILDREN] = children
+
+    if question_type == "survey" and TITLE not in element:
+        element[TITLE] = element[NAME]
+
+    return element
+
+
+def _iter_xlsform(
+    path: str, file_object: Optional[BinaryIO], survey_builder: bool, streaming: bool
+) -> Iterator[Tuple[str, Any]]:
+    if not streaming:
+        survey_dict = parse_file_to_json(path, file_object=file_object)
+        yield from _iter_survey_dict(survey_dict, survey_builder)
+        return
+
+    with stage(PARSE):
+        from xlson.reader import XLSFormReader
+
+        reader = XLSFormReader(path, file_object)
+    with reader, field_steps():
+        with stage(PARSE):
+            survey = reader.survey()
+            # Relevance may refer to fields of steps that are not built yet.
+            for name, questions in reader.iter_steps():
+                add_step(name, questions)
+        children = iter_stage(PARSE, reader.iter_children())
+        yield from iter_native_form(survey, children)
+
+
+def _iter_cached_xlsform(
+    path: str,
+    file_object: Optional[BinaryIO],
+    cache: Optional[Cache],
+    survey_builder: bool,
+    streaming: bool,
+) -> Iterator[Tuple[str, Any]]:
+    if cache is None:
+        yield from _iter_xlsform(path, file_object, survey_builder, streaming)
+        return
+
+    with stage(CACHE):
+        if file_object is None:
+            with open(path, "rb") as xlsform_file:
+                data = xlsform_file.read()
+        else:
+            data = file_object.read()
+        # The native form depends on how it is built, the survey dict does not.
+        # Forms built by other builders than xlson's are not cached, the
+        # builders' code is not part of the key.
+        options = ("survey_builder=%s" % survey_builder, "streaming=%s" % streaming)
+        key = cache.key(path, data, options)
+        cache_form = not custom_builders()
+        form = cache.get(key, FORM) if cache_form else None
+    if form is not None:
+        yield from form.items()
+        return
+
+    if streaming:
+        items = _iter_xlsform(path, io.BytesIO(data), survey_builder, streaming)
+    else:
+        with stage(CACHE):
+            survey_key = cache.key(path, data)
+            survey_dict = cache.get(survey_key, SURVEY)
+        if survey_dict is None:
+            survey_dict = parse_file_to_json(path, file_object=io.BytesIO(data))
+            with stage(CACHE):
+                cache.set(survey_key, SURVEY, survey_dict)
+        items = _iter_survey_dict(survey_dict, survey_builder)
+
+    if not cache_form:
+        yield from items
+        return
+
+    form = {}
+    for name, value in items:
+        form[name] = value
+        yield name, value
+    with stage(CACHE):
+        cache.set(key, FORM, form)
+
+
+def iter_xlsform(  # pylint: disable=too-many-arguments
+    path: str,
+    file_object: Optional[BinaryIO] = None,
+    cache: Optional[Cache] = None,
+    survey_builder: bool = False,
+    streaming: bool = False,
+    shared_choices: bool = False,
+    concepts: Optional["ConceptIndex"] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Yields the items of the native form of the XLSForm at ``path`` as they
+    are built, see ``convert_xlsform()``."""
+    items = _iter_cached_xlsform(path, file_object, cache, survey_builder, streaming)
+    if concepts is not None:
+        from xlson.concepts import iter_resolved_concepts
+
+        items = iter_stage(RESOLVE_CONCEPTS, iter_resolved_concepts(items, concepts))
+    if shared_choices:
+        items = iter_stage(SHARED_CHOICES, iter_shared_choices(items))
+
+    return items
+
+
+def convert_xlsform(  # pylint: disable=too-many-arguments
+    path: str,
+    file_object: Optional[BinaryIO] = None,
+    cache: Optional[Cache] = None,
+    survey_builder: bool = False,
+    streaming: bool = False,
+    shared_choices: bool = False,
+    concepts: Optional["ConceptIndex"] = None,
+) -> Dict:
+    """Converts the XLSForm at ``path`` to a native form dict.
+
+    The parsed XLSForm is normalised and converted directly, set
+    ``survey_builder`` to build the pyxform Survey object from it first. Set
+    ``streaming`` to read xlsx XLSForms with ``xlson.reader`` instead of pyxform.
+    When a ``cache`` is given the parsed XLSForm and the native form are looked
+    up by the content of the XLSForm before parsing it. Set ``shared_choices``
+    to write each options list once in a top-level ``choices`` table, see
+    ``iter_shared_choices()``. With a ``concepts`` index the empty
+    ``openmrs_*`` values of fields and options are filled from the concept
+    dictionary, see ``xlson.concepts``.
+    """
+    return dict(
+        iter_xlsform(
+            path,
+            file_object,
+            cache,
+            survey_builder,
+            streaming,
+            shared_choices,
+            concepts,
+        )
     )
-    form = create_native_form(survey.to_json_dict())
-    click.echo(json.dumps(form, indent=4))
+
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name: str) -> Any:
+        # The command line interface imports click and the converter the
+        # XLSForm parsers, load them on first use.
+        if name == "cli":
+            from xlson import commands
+
+            return commands.cli
+        if name == "Converter":
+            from xlson import converter
+
+            return converter.Converter
+        raise AttributeError("module 'xlson' has no attribute '%s'" % name)
+
+else:  # pragma: no cover
+    from xlson.commands import cli  # noqa: F401
+    from xlson.converter import Converter  # noqa: F401
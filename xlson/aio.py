@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.aio - converts XLSForms from asyncio code without blocking the loop.
+
+Conversions run in a bounded pool of worker processes, or threads, while the
+event loop carries on::
+
+    async with AsyncConverter(jobs=4, timeout=30) as converter:
+        form = await converter.convert(upload_bytes, name="anc.xlsx")
+        async for converted in converter.convert_many(paths):
+            ...
+
+At most ``max_pending`` conversions are submitted to the pool at a time,
+further conversions wait for one to finish. A conversion that is cancelled,
+or times out, before a worker picks it up is dropped. One already running
+finishes in its worker and holds on to its slot until then, so the pool is
+never handed more work than ``max_pending``.
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from xlson.converter import Converter, Source, warm_up
+
+_WORKER_CONVERTER: Optional[Converter] = None
+
+
+def _worker_converter(options: Dict[str, Any]) -> Converter:
+    global _WORKER_CONVERTER  # pylint: disable=global-statement
+    if _WORKER_CONVERTER is None:
+        _WORKER_CONVERTER = Converter(**options)
+
+    return _WORKER_CONVERTER
+
+
+def _convert_in_worker(
+    source: Union[str, bytes],
+    name: Optional[str],
+    options: Dict[str, Any],
+    dumps: bool,
+) -> Union[Dict, str]:
+    converter = _worker_converter(options)
+
+    return converter.dumps(source, name) if dumps else converter.convert(source, name)
+
+
+class Converted(NamedTuple):
+    """The outcome of converting ``source`` with ``convert_many()``, ``form``
+    is None if the conversion failed with ``error``."""
+
+    source: Source
+    form: Optional[Dict]
+    error: Optional[BaseException]
+
+
+class AsyncConverter:
+    """Converts XLSForms in ``jobs`` worker processes, or threads when
+    ``processes`` is False, defaulting to the number of CPUs.
+
+    Conversions taking longer than ``timeout`` seconds raise
+    ``asyncio.TimeoutError``. ``options`` are passed to ``Converter``, the
+    converter used by the workers.
+
+    Converting in threads avoids starting processes and passing the XLSForms
+    and forms between them, but conversions hold the GIL most of the time and
+    slow down the event loop.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        processes: bool = True,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **options: Any,
+    ) -> None:
+        self.jobs = jobs or os.cpu_count() or 1
+        self.processes = processes
+        self.max_pending = max_pending or 2 * self.jobs
+        self.timeout = timeout
+        self.options = options
+        self.pending = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.executor: Executor
+        if processes:
+            # Forked workers inherit the parent's imports, others import them
+            # on start up.
+            warm_up()
+            kwargs: Dict[str, Any] = {}
+            if sys.version_info >= (3, 7):
+                kwargs["initializer"] = _worker_converter
+                kwargs["initargs"] = (options,)
+            self.executor = ProcessPoolExecutor(max_workers=self.jobs, **kwargs)
+        else:
+            self.converter = Converter(**options)
+            self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+
+    def __enter__(self) -> "AsyncConverter":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "AsyncConverter":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await asyncio.get_event_loop().run_in_executor(None, self.close)
+
+    def close(self) -> None:
+        """Waits for the running conversions and stops the workers."""
+        self.executor.shutdown()
+
+    async def _submit(
+        self, source: Source, name: Optional[str], dumps: bool
+    ) -> Union[Dict, str]:
+        loop = asyncio.get_event_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        slots = self._slots
+        await slots.acquire()
+
+        def release() -> None:
+            self.pending -= 1
+            slots.release()
+
+        def done(_: object) -> None:
+            # The slot is only given back once the worker is done with it.
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(release)
+
+        try:
+            if self.processes:
+                source, name = await self._picklable(source, name)
+                future = self.executor.submit(
+                    _convert_in_worker, source, name, self.options, dumps
+                )
+            else:
+                function = self.converter.dumps if dumps else self.converter.convert
+                future = self.executor.submit(function, source, name)
+        except BaseException:
+            slots.release()
+            raise
+        self.pending += 1
+        future.add_done_callback(done)
+
+        result: Union[Dict, str] = await asyncio.wait_for(
+            asyncio.wrap_future(future), self.timeout
+        )
+        return result
+
+    @staticmethod
+    async def _picklable(
+        source: Source, name: Optional[str]
+    ) -> Tuple[Union[str, bytes], Optional[str]]:
+        if isinstance(source, (str, os.PathLike)):
+            return os.fspath(source), name
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source), name
+
+        # Files can not be passed to another process, read them in a thread.
+        if name is None:
+            file_name = getattr(source, "name", None)
+            name = file_name if isinstance(file_name, str) else None
+        data = await asyncio.get_event_loop().run_in_executor(None, source.read)
+        return data, name
+
+    async def convert(self, source: Source, name: Optional[str] = None) -> Dict:
+        """Returns the native form dict of ``source``, an XLSForm path, bytes
+        or binary file object, see ``Converter.iter_items()``."""
+        form = await self._submit(source, name, dumps=False)
+        assert isinstance(form, dict)
+
+        return form
+
+    async def dumps(self, source: Source, name: Optional[str] = None) -> str:
+        """Returns the native form JSON of ``source``, see ``convert()``."""
+        text = await self._submit(source, name, dumps=True)
+        assert isinstance(text, str)
+
+        return text
+
+    async def _converted(self, source: Source) -> Converted:
+        try:
+            return Converted(source, await self.convert(source), None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            return Converted(source, None, error)
+
+    async def convert_many(self, sources: Iterable[Source]) -> AsyncIterator[Converted]:
+        """Converts ``sources`` concurrently, yielding a ``Converted`` per
+        source as each conversion completes.
+
+        Sources are only taken from ``sources`` when a slot is free so a large
+        import is never held in memory at once. The conversions still running
+        are cancelled if iterating stops early.
+        """
+        iterator = iter(sources)
+        running: Set["asyncio.Future[Converted]"] = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(running) < self.max_pending:
+                    source = next(iterator, None)
+                    if source is None:
+                        exhausted = True
+                    else:
+                        running.add(asyncio.ensure_future(self._converted(source)))
+                if not running:
+                    return
+                done, running = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.batch - converts many XLSForms in parallel using a process pool.
+"""
+
+import glob
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from xlson import iter_xlsform, lazy_fields
+from xlson.calculations import (
+    CALCULATION_RULES,
+    RULES_FILE_SUFFIX,
+    collect_rules,
+    dump_rules,
+)
+from xlson.diff import write_patch
+from xlson.encoders import write_form
+from xlson.formats import JSON, JSON_FORMATS, extension
+from xlson.manifest import FormDigest, Manifest
+from xlson.profiling import profiling
+from xlson.translations import DEFAULT_LANGUAGE, Translations, language_codes
+
+XLSFORM_EXTENSIONS = (".xls", ".xlsx")
+PROFILE_EXTENSION = ".profile.json"
+PATCH_EXTENSION = ".patch.json"
+
+
+class Source(NamedTuple):
+    """An XLSForm to convert and the output file name relative to the output
+    directory."""
+
+    path: str
+    name: str
+
+
+class Result(NamedTuple):
+    """The outcome of converting a single XLSForm, ``digest`` is the hash of
+    the native form when a manifest is kept and ``changed`` is False when
+    the output file was left as it was."""
+
+    path: str
+    output: Optional[str]
+    error: Optional[str]
+    digest: Optional[str] = None
+    changed: bool = True
+
+
+def is_xlsform(path: str) -> bool:
+    """Returns True if ``path`` looks like an XLSForm workbook."""
+    name = os.path.basename(path)
+    return name.lower().endswith(XLSFORM_EXTENSIONS) and not name.startswith("~$")
+
+
+def _output_name(relative_path: str) -> str:
+    return os.path.splitext(relative_path)[0] + ".json"
+
+
+def _walk(directory: str, recursive: bool) -> Iterator[Source]:
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if is_xlsform(path):
+                yield Source(path, _output_name(os.path.relpath(path, directory)))
+        if not recursive:
+            break
+
+
+def collect_xlsforms(paths: Iterable[str], recursive: bool = False) -> List[Source]:
+    """Expands files, directories and glob patterns into a list of XLSForms.
+
+    Files given explicitly are returned whatever their extension, directories
+    are searched for ``.xls`` and ``.xlsx`` files. Raises ``FileNotFoundError``
+    if a path does not exist and is not a glob pattern matching any file, and
+    ``ValueError`` if two XLSForms would be written to the same output file.
+    """
+    sources: List[Source] = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found: Iterable[Source] = _walk(path, recursive)
+        elif os.path.isfile(path):
+            found = [Source(path, _output_name(os.path.basename(path)))]
+        elif glob.has_magic(path):
+            found = []
+            for match in sorted(glob.glob(path, recursive=recursive)):
+                if os.path.isdir(match):
+                    found.extend(_walk(match, recursive))
+                elif is_xlsform(match):
+                    found.append(Source(match, _output_name(os.path.basename(match))))
+        else:
+            raise FileNotFoundError("Path '%s' does not exist." % path)
+
+        for source in found:
+            key = os.path.realpath(source.path)
+            if key not in seen:
+                seen.add(key)
+                sources.append(source)
+
+    outputs: Dict[str, str] = {}
+    for source in sources:
+        other = outputs.setdefault(os.path.normcase(source.name), source.path)
+        if other != source.path:
+            raise ValueError(
+                "'%s' and '%s' would both be written to '%s'."
+                % (other, source.path, source.name)
+            )
+
+    return sources
+
+
+def _temp_path(output: str) -> str:
+    """Returns a new empty temporary file next to ``output``."""
+    handle, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(output) or ".",
+        prefix=os.path.basename(output) + ".",
+        suffix=".tmp",
+    )
+    os.close(handle)
+
+    return tmp_path
+
+
+def _remove_stale(path: str) -> None:
+    # A file left by an earlier run that no longer describes the output.
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def output_path(source: Source, output_dir: str, output_format: str = JSON) -> str:
+    """Returns the path of the file ``source`` is written to in
+    ``output_dir``, with the extension of ``output_format``."""
+    stem = os.path.splitext(source.name)[0]
+    return os.path.join(output_dir, stem + extension(output_format))
+
+
+def _streams_fields(
+    options: Dict[str, Any], digest: Optional[FormDigest], output_format: str
+) -> bool:
+    # Fields are built as they are written, see xlson.lazy_fields(), unless
+    # the form is also cached, hashed or rewritten on the way.
+    return (
+        output_format in JSON_FORMATS
+        and digest is None
+        and options.get("cache") is None
+        and options.get("concepts") is None
+        and not options.get("shared_choices")
+    )
+
+
+def _write_output(  # pylint: disable=too-many-arguments
+    path: str,
+    output: str,
+    options: Dict[str, Any],
+    compact: bool,
+    digest: Optional[FormDigest],
+    output_format: str,
+) -> List[Dict[str, Any]]:
+    rules: List[Dict[str, Any]] = []
+    items = collect_rules(iter_xlsform(path, **options), rules)
+    if digest is not None:
+        items = digest.wrap(items)
+    with open(output, "wb") as output_file, lazy_fields(
+        _streams_fields(options, digest, output_format)
+    ):
+        write_form(items, output_file, output_format, compact)
+
+    return rules
+
+
+def rules_output(output: str) -> str:
+    """Returns the path of the calculation rules file of the native form
+    written to ``output``, see ``xlson.calculations``."""
+    return os.path.splitext(output)[0] + RULES_FILE_SUFFIX
+
+
+def write_rules(rules: List[Dict[str, Any]], output: str) -> None:
+    """Writes the calculation ``rules`` of the native form written to
+    ``output`` next to it."""
+    path = rules_output(output)
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as rules_file:
+            dump_rules(rules, rules_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_profile(profile: Dict[str, Any], path: str) -> None:
+    """Writes the conversion ``profile`` as JSON to ``path``."""
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as profile_file:
+            json.dump(profile, profile_file, indent=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _convert_translations(
+    source: Source,
+    output_dir: str,
+    options: Dict[str, Any],
+    compact: bool,
+    output_format: str,
+) -> Result:
+    outputs = []
+    tmp_outputs = []
+    try:
+        form = dict(iter_xlsform(source.path, **options))
+        translations = Translations(form)
+        codes = language_codes(translations.languages)
+        output = output_path(source, output_dir, output_format)
+        stem = os.path.splitext(output)[0]
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        if form.get(CALCULATION_RULES):
+            write_rules(form[CALCULATION_RULES], output)
+        if not codes:
+            outputs.append((output, translations.localize(DEFAULT_LANGUAGE)))
+        for language, code in codes.items():
+            output = "%s.%s%s" % (stem, code, extension(output_format))
+            outputs.append((output, translations.localize(language)))
+        for output, localized in outputs:
+            tmp_outputs.append(_temp_path(output))
+            with open(tmp_outputs[-1], "wb") as output_file:
+                write_form(localized, output_file, output_format, compact)
+            os.replace(tmp_outputs[-1], output)
+    except Exception as error:  # pylint: disable=broad-except
+        for tmp_output in tmp_outputs:
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+        return Result(source.path, None, "%s: %s" % (type(error).__name__, error))
+
+    return Result(source.path, ", ".join(output for output, _ in outputs), None)
+
+
+def convert_to_file(  # pylint: disable=too-many-arguments
+    source: Source,
+    output_dir: str,
+    options: Dict[str, Any],
+    compact: bool = False,
+    profile: bool = False,
+    hashed: bool = False,
+    previous_digest: Optional[str] = None,
+    patch: bool = False,
+    output_format: str = JSON,
+    translations: bool = False,
+) -> Result:
+    """Converts a single XLSForm and writes the native form in
+    ``output_format``, see ``xlson.encoders``, to ``output_dir``.
+    ``options`` are passed to ``xlson.iter_xlsform()``.
+
+    The form is written to a temporary file as it is produced and renamed once
+    complete. When ``profile`` is set the conversion is profiled and the
+    profile written next to the JSON file, see ``xlson.profiling``. When
+    ``hashed`` is set the native form is hashed, see ``xlson.manifest``, and
+    the output file is left as it was if the hash is ``previous_digest``.
+    When ``patch`` is set and the form changed, the JSON patch from the
+    previous output is written next to it, see ``xlson.diff``, this needs
+    the JSON format. The patch of an earlier run is removed when the form
+    did not change. The calculation rules of the form, if any, are
+    written next to it, see ``xlson.calculations``.
+
+    When ``translations`` is set the form is written once per language of
+    its texts, to ``<name>.<language code>.<extension>``, see
+    ``xlson.translations``. It can not be profiled, hashed or patched.
+    """
+    if translations:
+        return _convert_translations(
+            source, output_dir, options, compact, output_format
+        )
+    output = output_path(source, output_dir, output_format)
+    stem = os.path.join(output_dir, os.path.splitext(source.name)[0])
+    tmp_output = ""
+    digest = FormDigest() if hashed else None
+    hexdigest = None
+    try:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        tmp_output = _temp_path(output)
+        if profile:
+            with profiling() as conversion_profile:
+                rules = _write_output(
+                    source.path, tmp_output, options, compact, digest, output_format
+                )
+            write_profile(conversion_profile.as_dict(), stem + PROFILE_EXTENSION)
+        else:
+            rules = _write_output(
+                source.path, tmp_output, options, compact, digest, output_format
+            )
+        if digest is not None:
+            hexdigest = digest.hexdigest()
+            if hexdigest == previous_digest and os.path.exists(output):
+                os.remove(tmp_output)
+                if patch:
+                    _remove_stale(stem + PATCH_EXTENSION)
+                return Result(source.path, output, None, hexdigest, False)
+        if rules:
+            write_rules(rules, output)
+        if patch and not (
+            os.path.exists(output)
+            and write_patch(output, tmp_output, stem + PATCH_EXTENSION)
+        ):
+            _remove_stale(stem + PATCH_EXTENSION)
+        os.replace(tmp_output, output)
+    except Exception as error:  # pylint: disable=broad-except
+        if tmp_output and os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        return Result(source.path, None, "%s: %s" % (type(error).__name__, error))
+
+    return Result(source.path, output, None, hexdigest)
+
+
+def convert_many(  # pylint: disable=too-many-arguments
+    sources: List[Source],
+    output_dir: str,
+    jobs: Optional[int] = None,
+    compact: bool = False,
+    profile: bool = False,
+    manifest: Optional[Manifest] = None,
+    patch: bool = False,
+    output_format: str = JSON,
+    translations: bool = False,
+    **options: Any,
+) -> Iterator[Result]:
+    """Converts ``sources`` into ``output_dir`` using up to ``jobs`` worker
+    processes, yielding a ``Result`` per XLSForm in the order given.
+
+    ``options`` are passed to ``xlson.iter_xlsform()``, e.g. ``cache``. Set
+    ``profile`` to write a profile next to each JSON file. With a
+    ``manifest`` of ``output_dir`` only the forms that changed are written and
+    their hashes recorded in it, ``Manifest.save()`` is left to the caller.
+    Set ``patch`` to write the JSON patch of each changed form.
+    ``output_format`` is the format of the forms, see ``xlson.encoders``.
+    Set ``translations`` to write a form per language.
+    """
+    outputs = [output_path(source, output_dir, output_format) for source in sources]
+    hashed = manifest is not None
+    digests = [manifest.digest(output) if manifest else None for output in outputs]
+    jobs = min(jobs or os.cpu_count() or 1, len(sources))
+    if jobs <= 1:
+        results: Iterator[Result] = (
+            convert_to_file(
+                source,
+                output_dir,
+                options,
+                compact,
+                profile,
+                hashed,
+                digest,
+                patch,
+                output_format,
+                translations,
+            )
+            for source, digest in zip(sources, digests)
+        )
+        yield from _record(results, manifest)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            convert_to_file,
+            sources,
+            [output_dir] * len(sources),
+            [options] * len(sources),
+            [compact] * len(sources),
+            [profile] * len(sources),
+            [hashed] * len(sources),
+            digests,
+            [patch] * len(sources),
+            [output_format] * len(sources),
+            [translations] * len(sources),
+            chunksize=1,
+        )
+        yield from _record(results, manifest)
+
+
+def _record(
+    results: Iterable[Result], manifest: Optional[Manifest]
+) -> Iterator[Result]:
+    for result in results:
+        if manifest is not None and result.output and result.digest:
+            manifest.record(result.output, result.digest)
+        yield result
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.cache - content addressed on-disk cache of parsed XLSForms.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import xlson
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+SURVEY = "survey"
+FORM = "form"
+# Bumped when the native forms built from the same XLSForm change, e.g. when
+# relevant expressions started being translated, so older entries are missed.
+FORMAT_VERSION = "3"
+# Subdirectory of the cache directory for indexes, e.g. of concept
+# dictionaries, that are kept when the cache is pruned.
+INDEX_DIR = "indexes"
+
+
+_PYXFORM_VERSION: Optional[str] = None
+
+
+def pyxform_version() -> str:
+    """Returns the installed pyxform version without importing pyxform when
+    the package metadata can be read."""
+    global _PYXFORM_VERSION  # pylint: disable=global-statement
+    if _PYXFORM_VERSION is None:
+        try:
+            from importlib.metadata import version
+
+            _PYXFORM_VERSION = version("pyxform")
+        except Exception:  # pylint: disable=broad-except
+            import pyxform  # Python < 3.8 or missing metadata
+
+            _PYXFORM_VERSION = pyxform.__version__
+
+    return _PYXFORM_VERSION
+
+
+def default_cache_dir() -> str:
+    """Returns the default cache directory, ``$XDG_CACHE_HOME/xlson``."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "xlson")
+
+
+class Cache:
+    """A size bounded, least recently used cache of JSON documents keyed on the
+    content of an XLSForm.
+
+    Entries are stored as ``<directory>/<key[:2]>/<key>.<kind>.json`` files,
+    writes are atomic so the cache can be shared between processes. Reading an
+    entry updates its modification time which ``prune()`` uses to evict the
+    least recently used entries. The ``INDEX_DIR`` subdirectory is not
+    pruned.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def key(path: str, data: bytes, options: Tuple[str, ...] = ()) -> str:
+        """Returns the cache key of an XLSForm.
+
+        pyxform uses the file name as the default form name and title so it is
+        part of the key, along with the xlson, cache format and pyxform
+        versions and the ``options`` the cached document depends on.
+        """
+        digest = hashlib.sha256()
+        parts = (
+            xlson.__version__,
+            FORMAT_VERSION,
+            pyxform_version(),
+            os.path.basename(path),
+        ) + options
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(data)
+
+        return digest.hexdigest()
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, key[:2], "%s.%s.json" % (key, kind))
+
+    def get(self, key: str, kind: str) -> Optional[Dict]:
+        """Returns the cached ``kind`` document for ``key`` or None."""
+        path = self._path(key, kind)
+        try:
+            with open(path, "r", encoding="utf-8") as cache_file:
+                value: Dict = json.load(cache_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return value
+
+    def set(self, key: str, kind: str, value: Dict) -> None:
+        """Stores the ``kind`` document for ``key``, failures are ignored."""
+        path = self._path(key, kind)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(handle, "w", encoding="utf-8") as cache_file:
+                json.dump(value, cache_file, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Removes the least recently used entries until the cache is within
+        ``max_size`` bytes. Returns the number of entries removed."""
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            if root == self.directory and INDEX_DIR in dirs:
+                dirs.remove(INDEX_DIR)
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        return removed
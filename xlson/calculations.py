@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.calculations - native form calculation rules from XLSForm
+``calculate`` rows.
+
+``calculate`` rows become ``hidden`` fields whose value is set by the native
+form rules engine from ``<encounter_type>_calculation_rules.yml``. The rules
+are built once all the steps of a form are built, added to the form as its
+``calculation_rules`` item and written to the rules file by ``xlson -o``::
+
+    name: visit_bmi
+    description: bmi
+    priority: 2
+    condition: "true"
+    actions:
+      - "calculation = visit_weight / (visit_height_m * visit_height_m)"
+
+The rules are ordered on the dependency graph of the calculations, a rule's
+priority is after the rules of the calculations it uses. A calculation that
+contains the whole operation of another calculation uses that calculation's
+value instead of computing it again, fields and constants are never replaced. Cycles raise ``CalculationCycleError``,
+calculations that have no rules engine equivalent are left out with an
+``UntranslatedCalculationWarning``.
+
+Expressions are compared on interned node ids, so building the rules is
+linear in the size of the expressions and the number of references.
+"""
+
+import json
+import threading
+import warnings
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from xlson.xpath import (
+    And,
+    Arithmetic,
+    Call,
+    Compare,
+    Literal,
+    Negative,
+    Node,
+    Or,
+    Ref,
+    XPathSyntaxError,
+    parse_xpath,
+)
+
+CALCULATION_RULES = "calculation_rules"
+RULES_FILE_SUFFIX = "_calculation_rules.yml"
+DEFAULT_RULES_FILE = "calculation_rules.yml"
+
+_OPERATORS = {"div": "/", "mod": "%", "=": "==", "and": "&&", "or": "||"}
+_CONSTANTS = {"true": "true", "false": "false"}
+
+
+class CalculationCycleError(ValueError):
+    """Calculations that depend on each other."""
+
+
+class UntranslatedCalculationWarning(UserWarning):
+    """A ``calculation`` that has no rules engine equivalent."""
+
+
+class _Untranslated(Exception):
+    pass
+
+
+class Calculations:
+    """The calculations of the ``calculate`` fields of a form, in the order
+    the fields are built."""
+
+    def __init__(self, form_name: Optional[str] = None) -> None:
+        self.rules_file = (
+            DEFAULT_RULES_FILE if form_name is None else form_name + RULES_FILE_SUFFIX
+        )
+        self.items: List[Tuple[str, str]] = []
+
+    def add(self, key: str, expression: str) -> None:
+        """Records the ``calculation`` expression of the ``key`` field."""
+        self.items.append((key, expression))
+
+
+_LOCAL = threading.local()
+
+
+@contextmanager
+def collect_calculations(form_name: Optional[str] = None) -> Iterator[Calculations]:
+    """Collects the calculations of the fields built in this thread until the
+    context exits, each context collects the calculations of one form."""
+    previous = getattr(_LOCAL, "calculations", None)
+    calculations = _LOCAL.calculations = Calculations(form_name)
+    try:
+        yield calculations
+    finally:
+        _LOCAL.calculations = previous
+
+
+def current_calculations() -> Optional[Calculations]:
+    """Returns the ``Calculations`` of ``collect_calculations()`` or None."""
+    calculations: Optional[Calculations] = getattr(_LOCAL, "calculations", None)
+
+    return calculations
+
+
+class _Emitter:
+    """Translates expressions to MVEL, interning their nodes."""
+
+    def __init__(self, fact: Callable[[str], str]) -> None:
+        self.fact = fact
+        self.ids: Dict[Hashable, int] = {}
+        # The calculation whose whole expression each node id is.
+        self.owners: Dict[int, str] = {}
+
+    def intern(self, key: Hashable) -> int:
+        return self.ids.setdefault(key, len(self.ids))
+
+    def node_id(self, node: Node) -> int:
+        """Returns the id of ``node``, the same for equal expressions."""
+        return self.emit(node, None, [])[0]
+
+    def emit(
+        self, node: Node, owner: Optional[str], refs: List[str]
+    ) -> Tuple[int, str]:
+        """Returns the id and the MVEL of ``node`` in the calculation of
+        ``owner``, adding the fields used to ``refs``."""
+        mark = len(refs)
+        # Only operations are shared, fields and constants are used as is.
+        compound = True
+        if isinstance(node, Ref):
+            refs.append(node.name)
+            node_id, text = self.intern(("ref", node.name)), self.fact(node.name)
+            compound = False
+        elif isinstance(node, Literal):
+            node_id = self.intern(("literal", node.value, node.number))
+            text = node.value if node.number else _string(node.value)
+            compound = False
+        elif isinstance(node, Negative):
+            operand_id, operand = self.emit(node.operand, owner, refs)
+            node_id, text = self.intern(("-", operand_id)), "(-%s)" % operand
+            compound = not isinstance(node.operand, (Ref, Literal))
+        elif isinstance(node, (Arithmetic, Compare)):
+            left_id, left = self.emit(node.left, owner, refs)
+            right_id, right = self.emit(node.right, owner, refs)
+            node_id = self.intern((node.op, left_id, right_id))
+            text = "(%s %s %s)" % (left, _OPERATORS.get(node.op, node.op), right)
+        elif isinstance(node, (And, Or)):
+            items = [self.emit(item, owner, refs) for item in node.items]
+            name = "and" if isinstance(node, And) else "or"
+            node_id = self.intern((name, tuple(item[0] for item in items)))
+            text = "(%s)" % (" %s " % _OPERATORS[name]).join(i[1] for i in items)
+        elif isinstance(node, Call):
+            args = [self.emit(arg, owner, refs) for arg in node.args]
+            node_id = self.intern(("call", node.name, tuple(arg[0] for arg in args)))
+            text = _call(node.name, [arg[1] for arg in args])
+            compound = bool(args)
+        else:
+            raise _Untranslated("'%s' is not supported" % type(node).__name__)
+
+        shared = self.owners.get(node_id)
+        if compound and owner is not None and shared not in (None, owner):
+            # Use the value of the calculation computing this expression.
+            del refs[mark:]
+            refs.append(shared)
+            text = self.fact(shared)
+
+        return node_id, text
+
+
+def _string(value: str) -> str:
+    if "'" not in value:
+        return "'%s'" % value
+    return json.dumps(value)
+
+
+def _call(name: str, args: List[str]) -> str:
+    if name == "if" and len(args) == 3:
+        return "(%s ? %s : %s)" % tuple(args)
+    if name == "not" and len(args) == 1:
+        return "!%s" % args[0]
+    if name in _CONSTANTS and not args:
+        return _CONSTANTS[name]
+    if name == "concat" and args:
+        return "('' + %s)" % " + ".join(args)
+    if name == "round" and len(args) == 1:
+        return "Math.round(%s)" % args[0]
+    raise _Untranslated("%s() with %d arguments is not supported" % (name, len(args)))
+
+
+def _order(keys: List[str], dependencies: Dict[str, List[str]]) -> List[str]:
+    """Returns ``keys`` in topological order, raises
+    ``CalculationCycleError`` naming a cycle."""
+    order: List[str] = []
+    state: Dict[str, int] = {}  # 1 while visiting, 2 once ordered.
+    for root in keys:
+        if root in state:
+            continue
+        path = [root]
+        pending = [iter(dependencies[root])]
+        state[root] = 1
+        while pending:
+            dependency = next(pending[-1], None)
+            if dependency is None:
+                pending.pop()
+                done = path.pop()
+                state[done] = 2
+                order.append(done)
+            elif state.get(dependency) == 1:
+                cycle = path[path.index(dependency) :] + [dependency]
+                raise CalculationCycleError(
+                    "Calculations depend on each other: %s." % " -> ".join(cycle)
+                )
+            elif dependency not in state:
+                state[dependency] = 1
+                path.append(dependency)
+                pending.append(iter(dependencies[dependency]))
+
+    return order
+
+
+def build_rules(
+    calculations: List[Tuple[str, str]], field_step: Callable[[str], Optional[str]]
+) -> List[Dict[str, Any]]:
+    """Returns the rules engine rules of the ``(key, expression)``
+    calculations of a form in dependency order.
+
+    ``field_step`` returns the step of a field. Raises
+    ``CalculationCycleError`` if calculations depend on each other.
+    """
+
+    def fact(name: str) -> str:
+        step = field_step(name)
+        if step is None:
+            raise _Untranslated("${%s} is not a field of the form" % name)
+        return "%s_%s" % (step, name)
+
+    emitter = _Emitter(fact)
+    parsed: List[Tuple[str, str, Node]] = []
+    for key, expression in calculations:
+        try:
+            node = parse_xpath(expression)
+            node_id = emitter.node_id(node)
+        except (XPathSyntaxError, _Untranslated) as error:
+            _warn(key, expression, error)
+            continue
+        emitter.owners.setdefault(node_id, key)
+        parsed.append((key, expression, node))
+
+    actions: Dict[str, str] = {}
+    dependencies: Dict[str, List[str]] = {}
+    for key, expression, node in parsed:
+        if key in actions:
+            continue  # Only the first calculate row of a name is used.
+        refs: List[str] = []
+        _, text = emitter.emit(node, key, refs)
+        # Only the MVEL of a whole operation starts with a parenthesis.
+        actions[key] = text[1:-1] if text.startswith("(") else text
+        dependencies[key] = refs
+    for key, refs in dependencies.items():
+        dependencies[key] = [ref for ref in dict.fromkeys(refs) if ref in actions]
+
+    return [
+        {
+            "name": fact(key),
+            "description": key,
+            "priority": priority,
+            "condition": "true",
+            "actions": ["calculation = %s" % actions[key]],
+        }
+        for priority, key in enumerate(_order(list(actions), dependencies), 1)
+    ]
+
+
+def _warn(key: str, expression: str, error: Exception) -> None:
+    warnings.warn(
+        "Field '%s': calculation \"%s\" is not translated to a rule, %s."
+        % (key, expression, str(error).rstrip(".")),
+        UntranslatedCalculationWarning,
+    )
+
+
+def collect_rules(
+    items: Iterable[Tuple[str, Any]], rules: List[Dict[str, Any]]
+) -> Iterator[Tuple[str, Any]]:
+    """Yields the items of a native form, adding the rules of its
+    ``calculation_rules`` item to ``rules`` for writing the rules file."""
+    for name, value in items:
+        if name == CALCULATION_RULES:
+            rules.extend(value)
+        yield name, value
+
+
+def dump_rules(rules: List[Dict[str, Any]], stream: TextIO) -> None:
+    """Writes rules engine rules as YAML documents to ``stream``."""
+    for rule in rules:
+        stream.write("---\n")
+        stream.write("name: %s\n" % rule["name"])
+        stream.write("description: %s\n" % json.dumps(rule["description"]))
+        stream.write("priority: %d\n" % rule["priority"])
+        stream.write("condition: %s\n" % json.dumps(rule["condition"]))
+        stream.write("actions:\n")
+        for action in rule["actions"]:
+            stream.write("  - %s\n" % json.dumps(action, ensure_ascii=False))
@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.commands - the xlson command line interface.
+
+Kept apart from the xlson package so that importing xlson does not import
+click.
+"""
+
+import json
+import os
+import sys
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Iterable, List, Optional, TextIO, Tuple
+
+import click
+
+from xlson import convert_xlsform, iter_xlsform, lazy_fields
+from xlson.cache import INDEX_DIR, Cache, default_cache_dir
+from xlson.formats import FORMATS, JSON
+from xlson.manifest import Manifest
+from xlson.profiling import profiling
+
+if TYPE_CHECKING:  # pragma: no cover
+    from xlson.batch import Result
+
+DEFAULT_COMMAND = "convert"
+
+jobs_option = click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Number of worker processes, defaults to the number of CPUs.",
+)
+cache_dir_option = click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, writable=True),
+    envvar="XLSON_CACHE_DIR",
+    help="Cache parsed XLSForms in this directory, defaults to ~/.cache/xlson.",
+)
+no_cache_option = click.option(
+    "--no-cache", is_flag=True, help="Do not use the XLSForm cache."
+)
+
+
+class DefaultGroup(click.Group):
+    """A command group running ``DEFAULT_COMMAND`` when the first argument is
+    not a command, so ``xlson FILE`` is ``xlson convert FILE``."""
+
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        if not args or (args[0] not in self.commands and args[0] != "--help"):
+            args.insert(0, DEFAULT_COMMAND)
+        remaining: List[str] = super().parse_args(ctx, args)
+
+        return remaining
+
+
+@click.group(cls=DefaultGroup)
+def cli() -> None:
+    """xlson - XLSForm to native form JSON.
+
+    Runs the convert command unless another command is given.
+    """
+
+
+@cli.command()
+@click.argument("xlsform", nargs=-1, required=True)
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(file_okay=False, writable=True),
+    help="Write one JSON file per XLSForm to this directory.",
+)
+@click.option("-r", "--recursive", is_flag=True, help="Search directories recursively.")
+@jobs_option
+@cache_dir_option
+@no_cache_option
+@click.option(
+    "--survey-builder",
+    is_flag=True,
+    help="Build the pyxform Survey object before converting, slower.",
+)
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Stream xlsx XLSForms row by row instead of parsing them with pyxform.",
+)
+@click.option("--compact", is_flag=True, help="Write JSON without indentation.")
+@click.option(
+    "--shared-choices",
+    is_flag=True,
+    help="Write each choice list once in a top-level choices table.",
+)
+@click.option(
+    "--multi-form",
+    is_flag=True,
+    help="Convert every form sheet of xlsx workbooks, needs --output-dir.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Report the time taken by each conversion stage and question type.",
+)
+@click.option(
+    "--manifest",
+    is_flag=True,
+    help="Keep a manifest of form hashes in --output-dir, only write changed forms.",
+)
+@click.option(
+    "--changed",
+    type=click.File("w"),
+    help="Write the names of the changed forms to this file, needs --manifest.",
+)
+@click.option(
+    "--patches",
+    is_flag=True,
+    help="Write a JSON patch from the previous version of each changed form.",
+)
+@click.option(
+    "--translations",
+    is_flag=True,
+    help="Write a form per language of multi-language XLSForms, needs --output-dir.",
+)
+@click.option(
+    "--concepts",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Fill empty openmrs_* values from this concept dictionary CSV export.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(FORMATS),
+    default=JSON,
+    show_default=True,
+    help="Output format, compressed JSON or a binary encoding.",
+)
+def convert(  # pylint: disable=too-many-arguments,too-many-locals
+    xlsform: Tuple[str, ...],
+    output_dir: Optional[str],
+    recursive: bool,
+    jobs: Optional[int],
+    cache_dir: Optional[str],
+    no_cache: bool,
+    survey_builder: bool,
+    streaming: bool,
+    compact: bool,
+    shared_choices: bool,
+    multi_form: bool,
+    profile: bool,
+    manifest: bool,
+    changed: Optional[TextIO],
+    patches: bool,
+    translations: bool,
+    concepts: Optional[str],
+    output_format: str,
+) -> None:
+    """Converts XLSForms to native form JSON.
+
+    XLSFORM may be one or more files, directories or glob patterns. A single
+    XLSForm is written to stdout unless --output-dir is given.
+
+    With --multi-form each sheet of a workbook with a type column is a form
+    sharing the choices sheet, the forms are written to a directory named
+    after the workbook in --output-dir.
+
+    With --profile the timings of each stage and question type are written
+    as JSON to stderr, or next to each JSON file with --output-dir.
+
+    With --manifest the hash of each form is kept in manifest.json in
+    --output-dir and forms whose hash did not change are not written again.
+    With --patches the RFC 6902 JSON patch from the previous version of each
+    changed form is written next to it.
+
+    With --translations the forms of XLSForms with label::<language> columns
+    are written once per language, e.g. anc.en.json and anc.fr.json, from a
+    single conversion.
+
+    With --concepts fields and choices with empty openmrs_* values get the
+    values of the concept with their name in the CSV export, which is
+    indexed once into the cache directory.
+
+    With --format the forms are written as gzip or Zstandard compressed JSON
+    (json.gz, json.zst) or as MessagePack or CBOR, binary formats are not
+    written to a terminal.
+    """
+    from xlson.batch import collect_xlsforms, convert_many
+    from xlson.encoders import check_format, write_form
+    from xlson.writer import write_native_form
+
+    try:
+        sources = collect_xlsforms(xlsform, recursive=recursive)
+    except (FileNotFoundError, ValueError) as error:
+        raise click.BadParameter(str(error), param_hint='"XLSFORM"')
+    if not sources:
+        raise click.UsageError("No XLSForm files found.")
+    if (manifest or changed or patches) and (output_dir is None or multi_form):
+        raise click.UsageError(
+            "--manifest, --changed and --patches need --output-dir and no "
+            "--multi-form."
+        )
+    if changed and not manifest:
+        raise click.UsageError("--changed needs --manifest.")
+    if translations and (
+        output_dir is None or multi_form or manifest or patches or profile
+    ):
+        raise click.UsageError(
+            "--translations needs --output-dir and no --multi-form, --manifest, "
+            "--patches or --profile."
+        )
+    if output_format != JSON and (patches or multi_form):
+        raise click.UsageError("--patches and --multi-form need the json --format.")
+    try:
+        check_format(output_format)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='"--format"')
+    cache = None if no_cache else Cache(cache_dir or default_cache_dir())
+    concept_index = None
+    if concepts is not None:
+        from xlson.concepts import ConceptIndex
+
+        try:
+            concept_index = ConceptIndex.open(
+                concepts, os.path.join(cache_dir or default_cache_dir(), INDEX_DIR)
+            )
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint='"--concepts"')
+
+    if multi_form:
+        if output_dir is None:
+            raise click.UsageError("--output-dir is required with --multi-form.")
+        if streaming or profile or concepts:
+            raise click.UsageError(
+                "--streaming, --profile and --concepts can not be used with "
+                "--multi-form."
+            )
+        from xlson.multiform import convert_workbook
+
+        results: Iterable["Result"] = (
+            result
+            for source in sources
+            for result in convert_workbook(
+                source.path,
+                os.path.join(output_dir, os.path.splitext(source.name)[0]),
+                jobs=jobs,
+                survey_builder=survey_builder,
+                shared_choices=shared_choices,
+                compact=compact,
+            )
+        )
+        report_results(results)
+        return
+
+    if output_dir is None:
+        if len(sources) > 1:
+            raise click.UsageError(
+                "--output-dir is required when converting more than one XLSForm."
+            )
+        stdout = sys.stdout.buffer
+        if output_format != JSON and stdout.isatty():
+            raise click.UsageError(
+                "Not writing %s to a terminal, redirect stdout or use --output-dir."
+                % output_format
+            )
+        with ExitStack() as stack:
+            xlsform_file = stack.enter_context(open(sources[0].path, "rb"))
+            conversion_profile = stack.enter_context(profiling()) if profile else None
+            form = iter_xlsform(
+                sources[0].path,
+                file_object=xlsform_file,
+                cache=cache,
+                survey_builder=survey_builder,
+                streaming=streaming,
+                shared_choices=shared_choices,
+                concepts=concept_index,
+            )
+            if output_format == JSON:
+                stack.enter_context(
+                    lazy_fields(
+                        cache is None and concept_index is None and not shared_choices
+                    )
+                )
+                write_native_form(form, sys.stdout, compact)
+            else:
+                write_form(form, stdout, output_format, compact)
+                stdout.flush()
+        if conversion_profile is not None:
+            click.echo(json.dumps(conversion_profile.as_dict(), indent=4), err=True)
+        if cache is not None:
+            cache.prune()
+        return
+
+    form_manifest = Manifest.load(output_dir, compact) if manifest else None
+    results = convert_many(
+        sources,
+        output_dir,
+        jobs=jobs,
+        compact=compact,
+        profile=profile,
+        manifest=form_manifest,
+        patch=patches,
+        output_format=output_format,
+        translations=translations,
+        cache=cache,
+        survey_builder=survey_builder,
+        streaming=streaming,
+        shared_choices=shared_choices,
+        concepts=concept_index,
+    )
+    try:
+        report_results(results)
+    finally:
+        if form_manifest is not None:
+            form_manifest.save()
+            if changed is not None:
+                changed.writelines(name + "\n" for name in form_manifest.changed)
+        if cache is not None:
+            cache.prune()
+
+
+def report_results(results: Iterable["Result"]) -> None:
+    """Reports batch conversion results to stderr as they come and exits with
+    status 1 if any conversion failed."""
+    converted = failures = 0
+    for result in results:
+        if result.error is None:
+            converted += 1
+            status = "OK     " if result.changed else "SAME   "
+            click.echo("%s %s -> %s" % (status, result.path, result.output), err=True)
+        else:
+            failures += 1
+            click.echo("FAILED  %s: %s" % (result.path, result.error), err=True)
+
+    click.echo("%d converted, %d failed." % (converted, failures), err=True)
+    if failures:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to bind.")
+@click.option("--port", default=8750, show_default=True, help="Port to listen on.")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Listen on this Unix socket instead of --host and --port.",
+)
+@jobs_option
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=1),
+    help="Conversions in progress before answering 503, defaults to twice --jobs.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0),
+    default=60.0,
+    show_default=True,
+    help="Seconds to wait for a conversion before answering 504.",
+)
+@cache_dir_option
+@no_cache_option
+def serve(  # pylint: disable=too-many-arguments
+    host: str,
+    port: int,
+    socket_path: Optional[str],
+    jobs: Optional[int],
+    max_requests: Optional[int],
+    timeout: float,
+    cache_dir: Optional[str],
+    no_cache: bool,
+) -> None:
+    """Runs a local HTTP service converting XLSForms.
+
+    POST an XLSForm to /convert?name=<file name> to get its native form JSON,
+    add compact=1, shared_choices=1, streaming=1 or survey_builder=1 to the
+    query string to set the matching convert options.
+    """
+    from xlson.server import ConversionService, make_server
+
+    cache = None if no_cache else Cache(cache_dir or default_cache_dir())
+    with ConversionService(jobs, max_requests, cache, timeout) as service:
+        server = make_server(service, host, port, socket_path)
+        address = socket_path or "http://%s:%d" % (host, server.server_port)
+        click.echo(
+            "Serving on %s with %d workers, press Ctrl+C to stop."
+            % (address, service.jobs),
+            err=True,
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+@cli.command()
+@click.argument("xlsform", nargs=-1, required=True)
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(file_okay=False, writable=True),
+    help="Write the JSON files to this directory instead of next to the XLSForms.",
+)
+@click.option("-r", "--recursive", is_flag=True, help="Search directories recursively.")
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.05),
+    default=0.5,
+    show_default=True,
+    help="Seconds between checks for changes.",
+)
+@click.option(
+    "--debounce",
+    type=click.FloatRange(min=0),
+    default=0.3,
+    show_default=True,
+    help="Seconds an XLSForm must stay unchanged before it is converted.",
+)
+@click.option(
+    "--survey-builder",
+    is_flag=True,
+    help="Build the pyxform Survey object before converting, slower.",
+)
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Stream xlsx XLSForms row by row instead of parsing them with pyxform.",
+)
+@click.option("--compact", is_flag=True, help="Write JSON without indentation.")
+@click.option(
+    "--shared-choices",
+    is_flag=True,
+    help="Write each choice list once in a top-level choices table.",
+)
+def watch(  # pylint: disable=too-many-arguments
+    xlsform: Tuple[str, ...],
+    output_dir: Optional[str],
+    recursive: bool,
+    interval: float,
+    debounce: float,
+    survey_builder: bool,
+    streaming: bool,
+    compact: bool,
+    shared_choices: bool,
+) -> None:
+    """Converts XLSForms whenever they change.
+
+    XLSFORM may be one or more files, directories or glob patterns. Only the
+    steps of the top-level groups that changed are built again and JSON files
+    are only written when their content changes.
+    """
+    from xlson.watch import Change, Watcher
+
+    def report(change: Change) -> None:
+        if change.error is not None:
+            click.echo("FAILED  %s: %s" % (change.path, change.error), err=True)
+        elif change.written:
+            click.echo(
+                "UPDATED %s -> %s (%d of %d steps rebuilt)"
+                % (
+                    change.path,
+                    change.output,
+                    change.rebuilt,
+                    change.rebuilt + change.reused,
+                ),
+                err=True,
+            )
+        else:
+            click.echo("SAME    %s" % change.path, err=True)
+
+    watcher = Watcher(
+        xlsform,
+        output_dir=output_dir,
+        recursive=recursive,
+        debounce=debounce,
+        compact=compact,
+        survey_builder=survey_builder,
+        streaming=streaming,
+        shared_choices=shared_choices,
+    )
+    click.echo("Watching %s, press Ctrl+C to stop." % ", ".join(xlsform), err=True)
+    try:
+        watcher.run(report, interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+@click.argument("old", type=click.Path(exists=True, dir_okay=False))
+@click.argument("new", type=click.Path(exists=True, dir_okay=False))
+@click.option("--compact", is_flag=True, help="Write JSON without indentation.")
+def diff(old: str, new: str, compact: bool) -> None:
+    """Writes the RFC 6902 JSON patch from the OLD native form to the NEW one.
+
+    OLD and NEW are native form JSON files or XLSForms, which are converted
+    first. Fields are matched on their key within each step.
+    """
+    from xlson.batch import is_xlsform
+    from xlson.diff import diff_forms
+
+    forms = []
+    for path in (old, new):
+        if is_xlsform(path):
+            forms.append(convert_xlsform(path))
+            continue
+        with open(path, encoding="utf-8") as form_file:
+            try:
+                forms.append(json.load(form_file))
+            except ValueError as error:
+                raise click.BadParameter(
+                    "%s is not JSON: %s" % (path, error), param_hint="OLD/NEW"
+                )
+
+    patch = diff_forms(*forms)
+    if compact:
+        click.echo(json.dumps(patch, separators=(",", ":"), ensure_ascii=False))
+    else:
+        click.echo(json.dumps(patch, indent=4))
+
+
+@cli.command()
+@click.argument("xlsform", nargs=-1, required=True)
+@click.option("-r", "--recursive", is_flag=True, help="Search directories recursively.")
+@jobs_option
+def check(xlsform: Tuple[str, ...], recursive: bool, jobs: Optional[int]) -> None:
+    """Checks the constraints and required flags of XLSForms.
+
+    XLSFORM may be one or more files, directories or glob patterns. Reports
+    the references to unknown fields, the regex constraints that do not
+    compile and the required values other than yes and no, one per line,
+    and exits with status 1 if there are any. Constraints that could not be
+    checked are reported as warnings on stderr.
+    """
+    from xlson.batch import collect_xlsforms
+    from xlson.constraints import check_many
+
+    try:
+        sources = collect_xlsforms(xlsform, recursive=recursive)
+    except (FileNotFoundError, ValueError) as error:
+        raise click.BadParameter(str(error), param_hint='"XLSFORM"')
+    if not sources:
+        raise click.UsageError("No XLSForm files found.")
+
+    problems = skipped = 0
+    for problem in check_many([source.path for source in sources], jobs):
+        field = " %s:" % problem.field if problem.field else ""
+        line = "%s:%s %s" % (problem.path, field, problem.message)
+        if problem.warning:
+            skipped += 1
+            click.echo("warning: %s" % line, err=True)
+        else:
+            problems += 1
+            click.echo(line)
+
+    click.echo(
+        "%d XLSForms checked, %d problems, %d warnings."
+        % (len(sources), problems, skipped),
+        err=True,
+    )
+    if problems:
+        sys.exit(1)
+
+
+@cli.command(name="compile")
+@click.argument("xlsform", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    required=True,
+    help="Write the template to this file.",
+)
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Stream xlsx XLSForms row by row instead of parsing them with pyxform.",
+)
+@click.option(
+    "--shared-choices",
+    is_flag=True,
+    help="Write each choice list once in a top-level choices table.",
+)
+def compile_template(
+    xlsform: str, output: str, streaming: bool, shared_choices: bool
+) -> None:
+    """Compiles an XLSForm into a template for the render command.
+
+    The template holds the native form and the substitution points that can
+    be overridden, e.g. encounter_type or <field key>.openmrs_entity_id.
+    """
+    from xlson.template import Template
+
+    form = convert_xlsform(xlsform, streaming=streaming, shared_choices=shared_choices)
+    template = Template.from_form(form)
+    template.save(output)
+    click.echo(
+        "%s -> %s (%d substitution points)" % (xlsform, output, len(template.points)),
+        err=True,
+    )
+
+
+@cli.command()
+@click.argument("template", type=click.Path(exists=True, dir_okay=False))
+@click.argument("overrides", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-o",
+    "--output-dir",
+    type=click.Path(file_okay=False, writable=True),
+    required=True,
+    help="Write one form per variant to this directory.",
+)
+@click.option("--compact", is_flag=True, help="Write JSON without indentation.")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(FORMATS),
+    default=JSON,
+    show_default=True,
+    help="Output format, compressed JSON or a binary encoding.",
+)
+def render(
+    template: str, overrides: str, output_dir: str, compact: bool, output_format: str
+) -> None:
+    """Renders a form per row of OVERRIDES from a compiled TEMPLATE.
+
+    OVERRIDES is a CSV file with a header row or a JSON list of objects. The
+    name column names the file of each variant, the other columns set
+    substitution points, empty CSV cells keep the template's value.
+    """
+    from xlson.encoders import check_format
+    from xlson.template import Template, read_overrides, render_many
+
+    try:
+        check_format(output_format)
+        form_template = Template.load(template)
+        variants = read_overrides(overrides)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    report_results(
+        render_many(form_template, variants, output_dir, output_format, compact)
+    )
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.concepts - resolves fields and options against an OpenMRS concept
+dictionary.
+
+The concept dictionary is a CSV export with a header row naming the
+``name`` of each field or choice and its ``openmrs_entity``,
+``openmrs_entity_id`` and ``openmrs_entity_parent``::
+
+    name,openmrs_entity,openmrs_entity_id,openmrs_entity_parent
+    hiv,concept,1169AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA,
+    yes,concept,1065AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA,
+
+The export is indexed once into a SQLite database keyed on its content and
+the index is reused until the export changes::
+
+    index_dir = os.path.join(default_cache_dir(), INDEX_DIR)
+    index = ConceptIndex.open("concepts.csv", index_dir)
+    form = xlson.convert_xlsform("anc.xlsx", concepts=index)
+
+Fields and options whose ``openmrs_*`` values are empty get the values of
+the concept with their key, checkbox options their ``openmrs_choice_id``.
+An option without a parent in the dictionary gets the entity id of its
+field as parent. The concepts of each step are looked up in a single query,
+names already looked up in a form are not looked up again.
+"""
+
+import csv
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+
+ENTITY = "openmrs_entity"
+ENTITY_ID = "openmrs_entity_id"
+ENTITY_PARENT = "openmrs_entity_parent"
+# The entity id of checkbox options, which have no entity or parent.
+CHOICE_ID = "openmrs_choice_id"
+NAME_COLUMN = "name"
+# Bumped when the index schema changes so older indexes are built again.
+INDEX_VERSION = "1"
+# Names looked up per query, below SQLite's limit of 999 query parameters.
+BATCH_SIZE = 500
+
+
+class Concept(NamedTuple):
+    """The OpenMRS entity, entity id and parent of a field or choice."""
+
+    entity: str
+    entity_id: str
+    parent: str
+
+
+def _read_concepts(path: str) -> Iterator[Tuple[str, str, str, str]]:
+    with open(path, encoding="utf-8", newline="") as concepts_file:
+        reader = csv.DictReader(concepts_file)
+        missing = {NAME_COLUMN, ENTITY_ID} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(
+                "'%s' is missing the %s column(s)." % (path, ", ".join(sorted(missing)))
+            )
+        for row in reader:
+            if row[NAME_COLUMN]:
+                yield (
+                    row[NAME_COLUMN],
+                    row.get(ENTITY) or "",
+                    row[ENTITY_ID] or "",
+                    row.get(ENTITY_PARENT) or "",
+                )
+
+
+class ConceptIndex:
+    """A SQLite index of a concept dictionary export.
+
+    Each thread opens its own read-only connection when it first looks up
+    concepts, an index can be passed to worker processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": self.path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.path = state["path"]
+        self._local = threading.local()
+
+    @classmethod
+    def build(cls, csv_path: str, path: str) -> "ConceptIndex":
+        """Indexes the concept dictionary export at ``csv_path`` into
+        ``path``. Raises ``ValueError`` if the export has no ``name`` or
+        ``openmrs_entity_id`` column."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(handle)
+        try:
+            connection = sqlite3.connect(tmp_path)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE concepts (name TEXT PRIMARY KEY, entity TEXT, "
+                    "entity_id TEXT, parent TEXT) WITHOUT ROWID"
+                )
+                # The first row of a name is used, as for duplicated fields.
+                connection.executemany(
+                    "INSERT OR IGNORE INTO concepts VALUES (?, ?, ?, ?)",
+                    _read_concepts(csv_path),
+                )
+            connection.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return cls(path)
+
+    @classmethod
+    def open(cls, csv_path: str, directory: str) -> "ConceptIndex":
+        """Returns the index of the concept dictionary export at
+        ``csv_path`` in ``directory``, built if the export changed since it
+        was last indexed."""
+        digest = hashlib.sha256(INDEX_VERSION.encode("utf-8") + b"\0")
+        with open(csv_path, "rb") as concepts_file:
+            for block in iter(lambda: concepts_file.read(1 << 20), b""):
+                digest.update(block)
+        path = os.path.join(directory, "concepts-%s.sqlite" % digest.hexdigest())
+        if os.path.exists(path):
+            return cls(path)
+
+        return cls.build(csv_path, path)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            connection = sqlite3.connect("file:%s?mode=ro" % self.path, uri=True)
+            self._local.connection = connection
+
+        return connection
+
+    def lookup(self, names: Iterable[str]) -> Dict[str, Concept]:
+        """Returns the concepts of ``names`` that are in the dictionary."""
+        unique = list(dict.fromkeys(names))
+        found: Dict[str, Concept] = {}
+        connection = self._connection()
+        for start in range(0, len(unique), BATCH_SIZE):
+            batch = unique[start : start + BATCH_SIZE]
+            rows = connection.execute(
+                "SELECT name, entity, entity_id, parent FROM concepts "
+                "WHERE name IN (%s)" % ", ".join("?" * len(batch)),
+                batch,
+            )
+            for name, entity, entity_id, parent in rows:
+                found[name] = Concept(entity, entity_id, parent)
+
+        return found
+
+
+def _unresolved(item: Dict) -> bool:
+    if CHOICE_ID in item:
+        return not item[CHOICE_ID]
+    return not (item.get(ENTITY) and item.get(ENTITY_ID))
+
+
+def _resolve(item: Dict, concept: Optional[Concept], parent: str = "") -> Dict:
+    if concept is None:
+        return item
+    if CHOICE_ID in item:
+        values = {CHOICE_ID: concept.entity_id}
+    else:
+        values = {
+            ENTITY: concept.entity,
+            ENTITY_ID: concept.entity_id,
+            ENTITY_PARENT: concept.parent or parent,
+        }
+    changed = {
+        key: value for key, value in values.items() if value and not item.get(key)
+    }
+
+    return dict(item, **changed) if changed else item
+
+
+def _resolve_options(options: list, concepts: Dict[str, Concept], parent: str) -> list:
+    # The options resolved against ``concepts``, ``options`` when none change.
+    resolved = [
+        (
+            _resolve(option, concepts.get(option.get("key", "")), parent)
+            if isinstance(option, dict)
+            else option
+        )
+        for option in options
+    ]
+    if any(new is not old for new, old in zip(resolved, options)):
+        return resolved
+    return options
+
+
+def iter_resolved_concepts(
+    items: Iterable[Tuple[str, Any]], index: ConceptIndex
+) -> Iterator[Tuple[str, Any]]:
+    """Yields the items of a native form with the ``openmrs_*`` values of
+    the fields and options of its steps resolved against ``index``.
+
+    Fields and options are copied when they change, the items given are not
+    modified.
+    """
+    concepts: Dict[str, Concept] = {}
+    looked_up: Set[str] = set()
+    # Fields of a choice list share its options, each list is resolved once
+    # for each parent. The list is kept with its resolution so its id is not
+    # reused.
+    resolved_options: Dict[Tuple[int, str], Tuple[list, list]] = {}
+    for name, value in items:
+        if not isinstance(value, dict) or not isinstance(value.get("fields"), list):
+            yield name, value
+            continue
+
+        names = []
+        seen_options: Set[int] = set()
+        for field in value["fields"]:
+            if _unresolved(field):
+                names.append(field.get("key"))
+            options = field.get("options") or ()
+            if id(options) in seen_options:
+                continue
+            seen_options.add(id(options))
+            for option in options:
+                if isinstance(option, dict) and _unresolved(option):
+                    names.append(option.get("key"))
+        wanted = {key for key in names if isinstance(key, str)} - looked_up
+        if wanted:
+            concepts.update(index.lookup(wanted))
+            looked_up.update(wanted)
+            resolved_options.clear()
+
+        fields = []
+        for field in value["fields"]:
+            field = _resolve(field, concepts.get(field.get("key", "")))
+            options = field.get("options")
+            if isinstance(options, list):
+                parent = field.get(ENTITY_ID, "")
+                key = (id(options), parent)
+                cached = resolved_options.get(key)
+                if cached is None:
+                    cached = options, _resolve_options(options, concepts, parent)
+                    resolved_options[key] = cached
+                if cached[1] is not options:
+                    field = dict(field, options=cached[1])
+            fields.append(field)
+        step = dict(value)
+        step["fields"] = fields
+        yield name, step
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.constraints - parses field constraints and checks XLSForms for
+constraints and required flags that native forms can not use.
+
+A ``regex(., 'pattern')`` constraint, on its own or joined to other
+conditions with ``and``, becomes the field's ``v_regex``. Patterns are
+quoted with either quote and may contain the other one::
+
+    constraint_regex("regex(., \\"^[A-Za-z' ]+$\\") and . != 'none'")
+    # "^[A-Za-z' ]+$"
+
+``check_xlsform()`` reports the constraints and required flags that refer
+to fields not in the form, the regex patterns that do not compile and the
+``required`` values that are not ``yes`` or ``no``. Constraints using XPath
+this parser does not handle, e.g. absolute paths such as ``/data/age``, are
+valid for ODK and only reported as warnings that they were not checked.
+Workbooks are checked without building their native form, xlsx workbooks
+are streamed with ``xlson.reader``. Parsed constraints and compiled patterns
+are cached on their text, so the patterns repeated across the fields of a
+corpus are only compiled once per process.
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Set,
+)
+
+from xlson.xpath import CACHE_SIZE, And, Call, Current, Literal, parse_xpath
+
+CONSTRAINT = "constraint"
+NAME = "name"
+REQUIRED = "required"
+# The bind::required values native forms understand, see BIND_CONVERSTION.
+REQUIRED_VALUES = ("yes", "Yes", "no", "No")
+# The ${name} references pyxform replaces, whether the expression parses.
+REFERENCE = re.compile(r"\$\{\s*([^}\s]+)\s*\}")
+
+
+class Problem(NamedTuple):
+    """A problem found in the ``field`` of the XLSForm at ``path``, the
+    field is empty for problems with the workbook itself. Warnings are what
+    could not be checked rather than errors."""
+
+    path: str
+    field: str
+    message: str
+    warning: bool = False
+
+
+def _regex_pattern(node: object) -> Optional[str]:
+    if not isinstance(node, Call) or node.name != "regex" or len(node.args) != 2:
+        return None
+    field, pattern = node.args
+    if not isinstance(field, Current) or not isinstance(pattern, Literal):
+        return None
+
+    return pattern.value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def constraint_regex(constraint: str) -> Optional[str]:
+    """Returns the pattern of the ``regex(., 'pattern')`` condition of a
+    constraint, None if it has none. Raises ``XPathSyntaxError`` if the
+    constraint can not be parsed. Results are cached on ``constraint``."""
+    node = parse_xpath(constraint)
+    for item in node.items if isinstance(node, And) else (node,):
+        pattern = _regex_pattern(item)
+        if pattern is not None:
+            return pattern
+
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_pattern(pattern: str) -> Pattern[str]:
+    """Returns the compiled regex ``pattern``, raises ``re.error`` if it
+    does not compile. Results are cached on ``pattern``."""
+    return re.compile(pattern)
+
+
+def check_element(path: str, element: Dict, names: Set[str]) -> Iterator[Problem]:
+    """Yields the problems of the constraint and required flag of a survey
+    element of the XLSForm at ``path``, ``names`` are the fields of the
+    form."""
+    bind = element.get("bind")
+    if not isinstance(bind, dict):
+        return
+    field = str(element.get(NAME, ""))
+    for key in (CONSTRAINT, REQUIRED):
+        value = bind.get(key)
+        for name in REFERENCE.findall(value) if isinstance(value, str) else ():
+            if name not in names:
+                yield Problem(path, field, "%s refers to unknown ${%s}." % (key, name))
+    constraint = bind.get(CONSTRAINT)
+    if constraint:
+        try:
+            pattern = constraint_regex(constraint)
+        except ValueError as error:
+            message = "constraint not checked, %s" % error
+            yield Problem(path, field, message, warning=True)
+        else:
+            try:
+                if pattern is not None:
+                    compile_pattern(pattern)
+            except re.error as error:
+                message = "regex '%s' does not compile: %s." % (pattern, error)
+                yield Problem(path, field, message)
+    required = bind.get(REQUIRED)
+    if required and required not in REQUIRED_VALUES:
+        yield Problem(path, field, "required '%s' is not yes or no." % required)
+
+
+def _nested(element: Dict) -> List[Dict]:
+    nested = element.get("children")
+    if not isinstance(nested, list) or element.get("type", "").startswith("select"):
+        return []
+    return nested
+
+
+def iter_problems(path: str, children: Iterable[Dict]) -> Iterator[Problem]:
+    """Yields the problems of the survey elements in ``children`` and the
+    elements nested in them."""
+    elements: List[Dict] = []
+    pending = list(children)
+    pending.reverse()
+    while pending:
+        element = pending.pop()
+        elements.append(element)
+        pending.extend(reversed(_nested(element)))
+    names = {element[NAME] for element in elements if element.get(NAME)}
+    for element in elements:
+        yield from check_element(path, element, names)
+
+
+def check_xlsform(path: str) -> List[Problem]:
+    """Returns the problems of the XLSForm at ``path``, a single problem
+    if the workbook can not be read."""
+    try:
+        if path.lower().endswith(".xlsx"):
+            from xlson.reader import XLSFormReader
+
+            with XLSFormReader(path) as reader:
+                return list(iter_problems(path, reader.iter_children()))
+
+        from xlson import parse_file_to_json
+
+        survey = parse_file_to_json(path)
+        return list(iter_problems(path, survey.get("children", [])))
+    except Exception as error:  # pylint: disable=broad-except
+        return [Problem(path, "", "%s: %s" % (type(error).__name__, error))]
+
+
+def check_many(paths: List[str], jobs: Optional[int] = None) -> Iterator[Problem]:
+    """Checks the XLSForms at ``paths`` using up to ``jobs`` worker processes
+    and yields their problems in the order of ``paths``."""
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1:
+        for path in paths:
+            yield from check_xlsform(path)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        for problems in executor.map(check_xlsform, paths, chunksize=chunksize):
+            yield from problems
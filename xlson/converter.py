@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.converter - a reusable XLSForm converter for long running processes.
+
+A ``Converter`` is set up once and then converts XLSForms given as a path,
+bytes or a binary file object::
+
+    converter = xlson.Converter(cache=Cache(default_cache_dir()), compact=True)
+    form = converter.convert("sample.xlsx")
+    json_text = converter.dumps(upload_bytes, name="upload.xlsx")
+"""
+
+import io
+import os
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from xlson import iter_xlsform, load_field_entry_points
+from xlson.cache import Cache
+from xlson.writer import write_native_form
+
+if TYPE_CHECKING:  # pragma: no cover
+    from xlson.concepts import ConceptIndex
+
+DEFAULT_NAME = "form.xlsx"
+
+# An XLSForm path, its content or a binary file object open on it.
+Source = Union[str, "os.PathLike[str]", bytes, BinaryIO]
+
+
+def warm_up() -> int:
+    """Imports the modules used to convert XLSForms, returns the process id."""
+    # pylint: disable=import-outside-toplevel,unused-import
+    import pyxform.builder  # noqa: F401
+    import pyxform.xls2json  # noqa: F401
+    import xlson.reader  # noqa: F401
+
+    return os.getpid()
+
+
+class Converter:
+    """Converts XLSForms to native forms with the same options, sharing its
+    set up between conversions.
+
+    Creating a converter registers the ``xlson.fields`` entry point builders
+    and imports the XLSForm parsers so conversions only pay for converting.
+    ``cache``, ``survey_builder``, ``streaming``, ``shared_choices`` and
+    ``concepts``, see ``xlson.concepts``, are passed to
+    ``xlson.iter_xlsform()``, ``compact`` applies to the JSON
+    written by ``write()`` and ``dumps()``.
+
+    A converter can be shared between threads, the state of a conversion is
+    local to the thread running it and the cache writes entries atomically.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        survey_builder: bool = False,
+        streaming: bool = False,
+        shared_choices: bool = False,
+        compact: bool = False,
+        concepts: Optional["ConceptIndex"] = None,
+    ) -> None:
+        self.cache = cache
+        self.compact = compact
+        self.options: Dict[str, Any] = {
+            "cache": cache,
+            "survey_builder": survey_builder,
+            "streaming": streaming,
+            "shared_choices": shared_choices,
+            "concepts": concepts,
+        }
+        load_field_entry_points()
+        warm_up()
+
+    def iter_items(
+        self, source: Source, name: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Yields the items of the native form of ``source`` as they are
+        built, see ``xlson.iter_xlsform()``.
+
+        ``name`` is the XLSForm file name, it sets the encounter type and the
+        workbook format. It defaults to the path or the name of the file
+        object, and to ``form.xlsx`` for bytes.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            file_object: BinaryIO = io.BytesIO(source)
+            yield from iter_xlsform(name or DEFAULT_NAME, file_object, **self.options)
+        elif isinstance(source, (str, os.PathLike)):
+            path = os.fspath(source)
+            if name is None:
+                yield from iter_xlsform(path, **self.options)
+                return
+            with open(path, "rb") as xlsform_file:
+                yield from iter_xlsform(name, xlsform_file, **self.options)
+        else:
+            file_name = getattr(source, "name", None)
+            if not isinstance(file_name, str):
+                file_name = DEFAULT_NAME
+            yield from iter_xlsform(name or file_name, source, **self.options)
+
+    def convert(self, source: Source, name: Optional[str] = None) -> Dict:
+        """Returns the native form dict of ``source``, see ``iter_items()``."""
+        return dict(self.iter_items(source, name))
+
+    def write(self, source: Source, stream: TextIO, name: Optional[str] = None) -> None:
+        """Writes the native form JSON of ``source`` to ``stream`` as it is
+        built, see ``iter_items()``."""
+        write_native_form(self.iter_items(source, name), stream, self.compact)
+
+    def dumps(self, source: Source, name: Optional[str] = None) -> str:
+        """Returns the native form JSON of ``source``, see ``iter_items()``."""
+        output = io.StringIO()
+        self.write(source, output, name)
+
+        return output.getvalue()
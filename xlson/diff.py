@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.diff - RFC 6902 JSON patches between versions of a native form.
+
+Objects are compared key by key. Lists of objects each having a distinct
+``key`` member, the fields of a step and the options of a field, are matched
+on that key rather than on their position: fields that were added, removed
+or moved give ``add``, ``remove`` and ``move`` operations and the changes to
+a field are patched inside it. Other lists that changed are replaced.
+
+Values are compared as a whole before looking inside them, unchanged steps
+and fields only cost a comparison and encoding them, so a diff costs a few
+comparisons of the two forms plus O(n log n) in the length of a list whose
+fields moved. Values are compared as JSON, ``1`` and ``true`` or ``1`` and
+``1.0`` differ even though Python compares them equal.
+"""
+
+import copy
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+KEY = "key"
+
+Patch = List[Dict[str, Any]]
+
+
+def escape(token: str) -> str:
+    """Returns the JSON pointer reference token of an object key."""
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def unescape(token: str) -> str:
+    """Returns the object key of a JSON pointer reference token."""
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _keys(items: Sequence[Any]) -> Optional[List[str]]:
+    """Returns the ``key`` of each item if the items can be matched on it."""
+    keys = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get(KEY), str):
+            return None
+        keys.append(item[KEY])
+    if len(set(keys)) != len(keys):
+        return None
+
+    return keys
+
+
+def _increasing(positions: List[int]) -> List[int]:
+    """Returns the indexes in ``positions`` of a longest increasing
+    subsequence of it, in O(n log n)."""
+    tails: List[int] = []
+    previous = [-1] * len(positions)
+    for index, position in enumerate(positions):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if positions[tails[middle]] < position:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            previous[index] = tails[low - 1]
+        if low == len(tails):
+            tails.append(index)
+        else:
+            tails[low] = index
+
+    found = []
+    index = tails[-1] if tails else -1
+    while index != -1:
+        found.append(index)
+        index = previous[index]
+
+    return found[::-1]
+
+
+def _moves(
+    working: List[str], target: List[str], stable: Set[str]
+) -> Iterator[Tuple[int, int]]:
+    """Yields the ``(from, to)`` indexes of the moves putting the keys of
+    ``working`` in the order of ``target``, each key not in ``stable`` is
+    moved after the key preceding it in ``target``, in O(n log n).
+
+    Every place a key is at while moving is a slot in a fixed order, a
+    Fenwick tree of the occupied slots gives the index of a key from the
+    number of occupied slots before it.
+    """
+    # The slot following each slot, slot 0 is before the first key.
+    following = list(range(1, len(working) + 1)) + [-1]
+    slot_of = {key: slot for slot, key in enumerate(working, 1)}
+    moved_to: Dict[str, int] = {}
+    for index, key in enumerate(target):
+        if key not in stable:
+            after = 0
+            if index:
+                previous = target[index - 1]
+                after = moved_to.get(previous, slot_of[previous])
+            following.append(following[after])
+            following[after] = moved_to[key] = len(following) - 1
+
+    rank = [0] * len(following)
+    slot, order = following[0], 1
+    while slot != -1:
+        rank[slot], slot, order = order, following[slot], order + 1
+    tree = [0] * len(following)
+
+    def update(slot: int, delta: int) -> None:
+        position = rank[slot]
+        while position < len(tree):
+            tree[position] += delta
+            position += position & -position
+
+    def occupied(slot: int) -> int:
+        """Returns the number of occupied slots up to ``slot``."""
+        count, position = 0, rank[slot]
+        while position:
+            count += tree[position]
+            position -= position & -position
+        return count
+
+    for slot in slot_of.values():
+        update(slot, 1)
+    current = dict(slot_of)
+    for index, key in enumerate(target):
+        if key in stable:
+            continue
+        position = occupied(current[key]) - 1
+        update(current[key], -1)
+        destination = occupied(current[target[index - 1]]) if index else 0
+        current[key] = moved_to[key]
+        update(current[key], 1)
+        yield position, destination
+
+
+def _diff_keyed_list(
+    old: List[Dict],
+    new: List[Dict],
+    old_keys: List[str],
+    new_keys: List[str],
+    path: str,
+) -> Iterator[Dict[str, Any]]:
+    old_index = {key: index for index, key in enumerate(old_keys)}
+    new_index = {key: index for index, key in enumerate(new_keys)}
+
+    # Removed items, from the end so the earlier indexes stay valid.
+    for index in range(len(old_keys) - 1, -1, -1):
+        if old_keys[index] not in new_index:
+            yield {"op": "remove", "path": "%s/%d" % (path, index)}
+    working = [key for key in old_keys if key in new_index]
+
+    # Items kept in the same order stay, the others are moved after the item
+    # preceding them in the new list.
+    target = [key for key in new_keys if key in old_index]
+    stable = {
+        target[index] for index in _increasing([old_index[key] for key in target])
+    }
+    for position, destination in _moves(working, target, stable):
+        if destination != position:
+            yield {
+                "op": "move",
+                "from": "%s/%d" % (path, position),
+                "path": "%s/%d" % (path, destination),
+            }
+
+    # Added items, in order so each is inserted at its final index.
+    for index, key in enumerate(new_keys):
+        if key not in old_index:
+            yield {"op": "add", "path": "%s/%d" % (path, index), "value": new[index]}
+
+    for index, key in enumerate(new_keys):
+        old_position = old_index.get(key)
+        if old_position is not None:
+            yield from _diff(old[old_position], new[index], "%s/%d" % (path, index))
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Returns whether ``old`` and ``new`` are the same JSON value."""
+    if type(old) is not type(new) or old != new:
+        return False
+    if isinstance(old, (dict, list)):
+        # Equal containers may still hold 1 and true, compare their JSON.
+        return json.dumps(old) == json.dumps(new)
+
+    return True
+
+
+def _diff(old: Any, new: Any, path: str) -> Iterator[Dict[str, Any]]:
+    if _same(old, new):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for name in old:
+            if name not in new:
+                yield {"op": "remove", "path": "%s/%s" % (path, escape(name))}
+        for name, value in new.items():
+            member_path = "%s/%s" % (path, escape(name))
+            if name in old:
+                yield from _diff(old[name], value, member_path)
+            else:
+                yield {"op": "add", "path": member_path, "value": value}
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        old_keys = _keys(old)
+        new_keys = _keys(new) if old_keys is not None else None
+        if old_keys is not None and new_keys is not None:
+            yield from _diff_keyed_list(old, new, old_keys, new_keys, path)
+            return
+    yield {"op": "replace", "path": path, "value": new}
+
+
+def diff_forms(old: Dict, new: Dict) -> Patch:
+    """Returns the RFC 6902 JSON patch turning the native form ``old`` into
+    ``new``, an empty list if they are the same."""
+    return list(_diff(old, new, ""))
+
+
+def _parent(document: Any, path: str) -> Any:
+    tokens = [unescape(token) for token in path.split("/")[1:]]
+    parent = document
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+
+    return parent, tokens[-1]
+
+
+def apply_patch(document: Any, patch: Patch) -> Any:
+    """Returns a copy of ``document`` with the RFC 6902 ``patch`` applied.
+
+    Only the ``add``, ``remove``, ``replace`` and ``move`` operations made by
+    ``diff_forms()`` are supported. Raises ``ValueError`` for other
+    operations and ``KeyError`` or ``IndexError`` for paths that do not
+    exist.
+    """
+    document = copy.deepcopy(document)
+    for operation in patch:
+        name = operation["op"]
+        if name == "move":
+            parent, token = _parent(document, operation["from"])
+            value = parent.pop(int(token) if isinstance(parent, list) else token)
+        elif name in ("add", "replace"):
+            value = copy.deepcopy(operation["value"])
+        elif name != "remove":
+            raise ValueError("Unsupported patch operation '%s'." % name)
+
+        if operation["path"] == "":
+            document = value
+            continue
+        parent, token = _parent(document, operation["path"])
+        if not isinstance(parent, list):
+            if name == "remove":
+                del parent[token]
+            else:
+                parent[token] = value
+        elif name == "remove":
+            del parent[int(token)]
+        elif name == "replace":
+            parent[int(token)] = value
+        else:
+            parent.insert(len(parent) if token == "-" else int(token), value)
+
+    return document
+
+
+def write_patch(old_path: str, new_path: str, patch_path: str) -> Patch:
+    """Writes the JSON patch between the native form JSON files ``old_path``
+    and ``new_path`` to ``patch_path`` unless they are the same, returns the
+    patch."""
+    with open(old_path, encoding="utf-8") as old_file:
+        old = json.load(old_file)
+    with open(new_path, encoding="utf-8") as new_file:
+        new = json.load(new_file)
+
+    patch = diff_forms(old, new)
+    if patch:
+        handle, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(patch_path) or ".", suffix=".tmp"
+        )
+        try:
+            with open(handle, "w", encoding="utf-8") as patch_file:
+                json.dump(patch, patch_file, indent=4)
+                patch_file.write("\n")
+            os.replace(tmp_path, patch_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return patch
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.encoders - native form output formats for delivery to devices.
+
+Besides JSON, native forms can be written as gzip or Zstandard compressed
+JSON and in the MessagePack or CBOR binary encodings::
+
+    with open("anc.json.gz", "wb") as output_file:
+        write_form(form, output_file, JSON_GZIP)
+
+The formats are encoded from the form itself as it is produced: compressed
+JSON is written step by step through the compressor and CBOR writes the
+top-level items of an indefinite length map one at a time. MessagePack maps
+need their size up front so the top-level items are collected first, the
+steps are still encoded without going through JSON.
+
+Zstandard, MessagePack and CBOR need the ``zstandard``, ``msgpack`` and
+``cbor2`` packages. The format names are in ``xlson.formats``.
+"""
+
+import gzip
+import io
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+from xlson.formats import CBOR, FORMATS, JSON, JSON_GZIP, JSON_ZSTD, MSGPACK
+from xlson.profiling import SERIALISE, stage
+from xlson.writer import write_native_form
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    HAS_ZSTANDARD = False
+else:
+    HAS_ZSTANDARD = True
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    HAS_MSGPACK = False
+else:
+    HAS_MSGPACK = True
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    HAS_CBOR2 = False
+else:
+    HAS_CBOR2 = True
+
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 10
+
+# The package each format needs and whether it is installed, by format.
+_PACKAGES: Dict[str, Tuple[str, bool]] = {
+    JSON_ZSTD: ("zstandard", HAS_ZSTANDARD),
+    MSGPACK: ("msgpack", HAS_MSGPACK),
+    CBOR: ("cbor2", HAS_CBOR2),
+}
+
+# The CBOR start of an indefinite length map and the break ending it.
+_CBOR_MAP_START = b"\xbf"
+_CBOR_BREAK = b"\xff"
+
+
+def check_format(output_format: str) -> None:
+    """Raises ``ValueError`` if ``output_format`` is unknown or the package it
+    needs is not installed."""
+    if output_format not in FORMATS:
+        raise ValueError("Unknown output format '%s'." % output_format)
+    package, installed = _PACKAGES.get(output_format, ("", True))
+    if not installed:
+        raise ValueError(
+            "The %s output format needs the %s package." % (output_format, package)
+        )
+
+
+def available_formats() -> List[str]:
+    """Returns the output formats whose packages are installed."""
+    return [
+        output_format
+        for output_format in FORMATS
+        if _PACKAGES.get(output_format, ("", True))[1]
+    ]
+
+
+def _write_text(form: Any, stream: BinaryIO, compact: bool) -> None:
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    write_native_form(form, text, compact)
+    text.flush()
+    text.detach()
+
+
+def write_form(
+    form: Any, stream: BinaryIO, output_format: str = JSON, compact: bool = False
+) -> None:
+    """Writes a native form to the binary ``stream`` in ``output_format``.
+
+    ``form`` is a native form dict or the ``(key, value)`` pairs yielded by
+    ``xlson.iter_native_form()``. ``compact`` only applies to the JSON
+    formats. Raises ``ValueError`` if the format can not be written, see
+    ``check_format()``.
+    """
+    check_format(output_format)
+    if output_format == JSON:
+        _write_text(form, stream, compact)
+    elif output_format == JSON_GZIP:
+        # No file name or time in the header, the same form gives the same
+        # bytes.
+        with gzip.GzipFile(
+            "", "wb", compresslevel=GZIP_LEVEL, fileobj=stream, mtime=0
+        ) as compressed:
+            _write_text(form, compressed, compact)  # type: ignore
+    elif output_format == JSON_ZSTD:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        with compressor.stream_writer(stream, closefd=False) as compressed:
+            _write_text(form, compressed, compact)
+    else:
+        items = form.items() if isinstance(form, dict) else form
+        with stage(SERIALISE):
+            if output_format == MSGPACK:
+                stream.write(msgpack.packb(dict(items), use_bin_type=True))
+            else:
+                encoder = cbor2.CBOREncoder(stream)
+                stream.write(_CBOR_MAP_START)
+                for key, value in items:
+                    encoder.encode(key)
+                    encoder.encode(value)
+                stream.write(_CBOR_BREAK)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.formats - the names of the native form output formats.
+
+Kept apart from ``xlson.encoders`` so that the command line interface can
+list the formats without importing the packages that encode them.
+"""
+
+JSON = "json"
+JSON_GZIP = "json.gz"
+JSON_ZSTD = "json.zst"
+MSGPACK = "msgpack"
+CBOR = "cbor"
+FORMATS = (JSON, JSON_GZIP, JSON_ZSTD, MSGPACK, CBOR)
+# The formats written through xlson.writer, a field at a time.
+JSON_FORMATS = (JSON, JSON_GZIP, JSON_ZSTD)
+
+
+def extension(output_format: str) -> str:
+    """Returns the file extension of ``output_format``, e.g. ``.json.gz``."""
+    return "." + output_format
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.manifest - content hashes of the native forms in an output directory.
+
+The manifest, ``manifest.json`` in the output directory, maps the name of
+each JSON file to the hash of its native form. A form is hashed on its
+key-sorted compact JSON so the hash does not depend on the JSON formatting,
+each top-level item is hashed as it is written so forms can still be
+streamed. Unchanged forms are not written again, keeping their modification
+time, and the names of the forms that changed are listed for syncing.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _canonical(value: Any) -> bytes:
+    # Always the json module, orjson would give other bytes for some values.
+    return json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+class FormDigest:
+    """Hashes a native form from its ``(key, value)`` items."""
+
+    def __init__(self) -> None:
+        self.items: Dict[str, str] = {}
+
+    def update(self, key: str, value: Any) -> None:
+        """Adds a top-level item of the form."""
+        self.items[key] = hashlib.sha256(_canonical(value)).hexdigest()
+
+    def wrap(self, items: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        """Yields ``items`` adding each one to the digest."""
+        for key, value in items:
+            self.update(key, value)
+            yield key, value
+
+    def hexdigest(self) -> str:
+        """Returns the SHA-256 hex digest of the form."""
+        return hashlib.sha256(_canonical(self.items)).hexdigest()
+
+
+def form_digest(form: Dict) -> str:
+    """Returns the ``FormDigest`` hex digest of a native form dict."""
+    digest = FormDigest()
+    for key, value in form.items():
+        digest.update(key, value)
+
+    return digest.hexdigest()
+
+
+class Manifest:
+    """The manifest of the native forms in ``output_dir``.
+
+    Form names are the paths of the JSON files relative to ``output_dir``
+    using ``/`` separators. Forms written with another ``compact`` setting
+    than the manifest's are all written again.
+    """
+
+    def __init__(self, output_dir: str, compact: bool = False) -> None:
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.compact = compact
+        self.forms: Dict[str, str] = {}
+        self.changed: List[str] = []
+
+    @classmethod
+    def load(cls, output_dir: str, compact: bool = False) -> "Manifest":
+        """Returns the manifest of ``output_dir``, empty if there is none."""
+        manifest = cls(output_dir, compact)
+        try:
+            with open(manifest.path, encoding="utf-8") as manifest_file:
+                content = json.load(manifest_file)
+        except FileNotFoundError:
+            return manifest
+        if content.get("compact") == compact:
+            manifest.forms = dict(content.get("forms", {}))
+
+        return manifest
+
+    def name(self, output: str) -> str:
+        """Returns the form name of the ``output`` JSON file."""
+        return os.path.relpath(output, self.output_dir).replace(os.sep, "/")
+
+    def digest(self, output: str) -> Optional[str]:
+        """Returns the recorded digest of the ``output`` JSON file."""
+        return self.forms.get(self.name(output))
+
+    def record(self, output: str, digest: str) -> bool:
+        """Records the digest of the ``output`` JSON file, returns True and
+        lists it in ``changed`` if the form changed."""
+        name = self.name(output)
+        changed = self.forms.get(name) != digest
+        self.forms[name] = digest
+        if changed:
+            self.changed.append(name)
+
+        return changed
+
+    def save(self) -> None:
+        """Writes the manifest, dropping the forms whose JSON file is gone."""
+        forms = {
+            name: digest
+            for name, digest in self.forms.items()
+            if os.path.exists(os.path.join(self.output_dir, name))
+        }
+        os.makedirs(self.output_dir, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.output_dir)
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as manifest_file:
+                json.dump(
+                    {"compact": self.compact, "forms": forms},
+                    manifest_file,
+                    indent=4,
+                    sort_keys=True,
+                )
+                manifest_file.write("\n")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.multiform - converts data dictionaries holding a form per sheet.
+
+The workbook is read once, every sheet with a ``type`` column other than the
+choices and settings sheets is a form and all forms share the rows of the
+choices sheet. A form is named after its sheet, the ``survey`` sheet keeps
+the workbook's name and settings as in a single form XLSForm.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional
+
+from xlson import CHILDREN, build_survey, iter_native_form, iter_shared_choices
+from xlson.batch import Result, _temp_path, write_rules
+from xlson.calculations import collect_rules
+from xlson.writer import write_native_form
+from xlson.xlsx import Workbook
+
+SURVEY_SHEET = "survey"
+CHOICES_SHEET = "choices"
+SETTINGS_SHEET = "settings"
+# Sheets pyxform reads that are not forms.
+RESERVED_SHEETS = (
+    CHOICES_SHEET,
+    SETTINGS_SHEET,
+    "external_choices",
+    "cascading_choices",
+    "choices_and_columns",
+    "columns",
+    "osm",
+)
+
+Sheets = Dict[str, List[Dict[str, str]]]
+
+
+def read_sheets(path: str, file_object: Optional[BinaryIO] = None) -> Sheets:
+    """Reads the rows of every sheet of an xlsx workbook as pyxform's
+    ``xls_to_dict()`` does, the workbook is opened and decompressed once."""
+    with Workbook(path if file_object is None else file_object) as workbook:
+        return {
+            sheet: [
+                {
+                    header: value.strip().replace("\xa0", " ")
+                    for header, value in row.items()
+                }
+                for row in workbook.iter_dicts(sheet)
+            ]
+            for sheet in workbook.sheets
+        }
+
+
+def form_sheets(sheets: Sheets) -> List[str]:
+    """Returns the names of the sheets holding a form, in workbook order."""
+    return [
+        sheet
+        for sheet, rows in sheets.items()
+        if sheet.lower() not in RESERVED_SHEETS
+        and any("type" in (header.lower() for header in row) for row in rows)
+    ]
+
+
+def form_workbook(sheets: Sheets, sheet: str) -> Sheets:
+    """Returns the single form workbook dict of the form on ``sheet``."""
+    workbook = {SURVEY_SHEET: sheets[sheet]}
+    if CHOICES_SHEET in sheets:
+        workbook[CHOICES_SHEET] = sheets[CHOICES_SHEET]
+    # The settings apply to the survey sheet, they would give every form the
+    # same title otherwise.
+    if sheet == SURVEY_SHEET and SETTINGS_SHEET in sheets:
+        workbook[SETTINGS_SHEET] = sheets[SETTINGS_SHEET]
+
+    return workbook
+
+
+class Form(NamedTuple):
+    """A converted form, ``content`` is its native form JSON or None if
+    converting it failed with ``error``. ``rules`` are the calculation
+    rules of the form."""
+
+    name: str
+    content: Optional[str]
+    error: Optional[str]
+    rules: Optional[List[Dict[str, Any]]] = None
+
+
+def convert_form(
+    workbook: Sheets,
+    form_name: str,
+    survey_builder: bool = False,
+    shared_choices: bool = False,
+    compact: bool = False,
+    rules: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """Converts a single form workbook dict and returns the native form
+    JSON, the calculation rules of the form are added to ``rules`` if
+    given."""
+    from pyxform.xls2json import workbook_to_json
+
+    survey = build_survey(workbook_to_json(workbook, form_name), survey_builder)
+    items = iter_native_form(survey, survey[CHILDREN])
+    if rules is not None:
+        items = collect_rules(items, rules)
+    if shared_choices:
+        items = iter_shared_choices(items)
+    output = io.StringIO()
+    write_native_form(items, output, compact)
+
+    return output.getvalue()
+
+
+def _convert_form(workbook: Sheets, form_name: str, options: Dict[str, Any]) -> Form:
+    rules: List[Dict[str, Any]] = []
+    try:
+        content = convert_form(workbook, form_name, rules=rules, **options)
+        return Form(form_name, content, None, rules)
+    except Exception as error:  # pylint: disable=broad-except
+        return Form(form_name, None, "%s: %s" % (type(error).__name__, error))
+
+
+def iter_forms(
+    path: str,
+    file_object: Optional[BinaryIO] = None,
+    jobs: Optional[int] = None,
+    **options: Any,
+) -> Iterator[Form]:
+    """Yields a ``Form`` per form sheet of the workbook at ``path`` in
+    workbook order, converting the forms in up to ``jobs`` worker processes.
+
+    ``options`` are passed to ``convert_form()``. Raises ``ValueError`` if
+    the workbook is not an xlsx workbook or has no form sheet.
+    """
+    sheets = read_sheets(path, file_object)
+    names = form_sheets(sheets)
+    if not names:
+        raise ValueError("No form sheet found in %s." % path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    form_names = [stem if sheet == SURVEY_SHEET else sheet for sheet in names]
+    workbooks = [form_workbook(sheets, sheet) for sheet in names]
+
+    jobs = min(jobs or os.cpu_count() or 1, len(names))
+    if jobs <= 1:
+        for workbook, form_name in zip(workbooks, form_names):
+            yield _convert_form(workbook, form_name, options)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(
+            _convert_form, workbooks, form_names, [options] * len(names)
+        )
+
+
+def convert_workbook(
+    path: str, output_dir: str, jobs: Optional[int] = None, **options: Any
+) -> List[Result]:
+    """Converts the forms of the workbook at ``path`` to
+    ``<output_dir>/<form name>.json`` files.
+
+    Returns a ``Result`` per form, its path is ``<path>[<form name>]``, or a
+    single failed ``Result`` if the workbook could not be read. A form that
+    can not be written fails on its own, the other forms are still written.
+    """
+    try:
+        forms = list(iter_forms(path, jobs=jobs, **options))
+        os.makedirs(output_dir, exist_ok=True)
+    except Exception as error:  # pylint: disable=broad-except
+        return [Result(path, None, "%s: %s" % (type(error).__name__, error))]
+
+    results = []
+    for form in forms:
+        form_path = "%s[%s]" % (path, form.name)
+        if form.content is None:
+            results.append(Result(form_path, None, form.error))
+            continue
+        file_name = form.name.replace(os.sep, "_") + ".json"
+        output = os.path.join(output_dir, file_name)
+        tmp_output = ""
+        try:
+            tmp_output = _temp_path(output)
+            with open(tmp_output, "w", encoding="utf-8") as output_file:
+                output_file.write(form.content)
+            if form.rules:
+                write_rules(form.rules, output)
+            os.replace(tmp_output, output)
+        except Exception as error:  # pylint: disable=broad-except
+            if tmp_output and os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            error_message = "%s: %s" % (type(error).__name__, error)
+            results.append(Result(form_path, None, error_message))
+            continue
+        results.append(Result(form_path, output, None))
+
+    return results
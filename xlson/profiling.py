@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.profiling - opt-in timings of the conversion pipeline.
+
+Conversions run inside ``profiling()`` record the wall time and the memory
+blocks allocated by each pipeline stage and by the builder of each question
+type, and count the fields and options produced::
+
+    with profiling() as profile:
+        xlson.convert_xlsform("sample.xlsx")
+    print(json.dumps(profile.as_dict()))
+
+Stage times exclude the stages nested in them, e.g. the ``serialise`` time
+does not include building the steps being written. Question type times
+include the fields nested in them, e.g. the fields of a group. Allocations
+are the net number of memory blocks allocated as reported by
+``sys.getallocatedblocks()``, tracing every allocation with ``tracemalloc``
+would slow the conversion down several times.
+
+Outside ``profiling()`` the instrumented code only looks up the current
+profile once per step.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+CACHE = "cache"
+PARSE = "parse"
+BUILD_SURVEY = "build_survey"
+CREATE_NATIVE_FORM = "create_native_form"
+RESOLVE_CONCEPTS = "resolve_concepts"
+SHARED_CHOICES = "shared_choices"
+SERIALISE = "serialise"
+
+
+class Timing:
+    """The calls, seconds and allocated memory blocks of a stage or question
+    type."""
+
+    __slots__ = ("calls", "seconds", "blocks")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.blocks = 0
+
+    def add(self, seconds: float, blocks: int) -> None:
+        """Records a call."""
+        self.calls += 1
+        self.seconds += seconds
+        self.blocks += blocks
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the timing as a JSON serialisable dict."""
+        return {"calls": self.calls, "seconds": self.seconds, "blocks": self.blocks}
+
+
+class Profile:
+    """Timings and counts of the conversions run in a ``profiling()``
+    context."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Timing] = {}
+        self.fields: Dict[str, Timing] = {}
+        self.counts: Dict[str, int] = {"fields": 0, "options": 0}
+        self.seconds = 0.0
+        # The seconds and blocks of the stages nested in each running stage.
+        self._nested: List[List[Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Records the time and allocations of the ``name`` stage, less those
+        of the stages nested in it."""
+        nested: List[Any] = [0.0, 0]
+        self._nested.append(nested)
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            blocks = sys.getallocatedblocks() - blocks
+            self._nested.pop()
+            if self._nested:
+                self._nested[-1][0] += seconds
+                self._nested[-1][1] += blocks
+            timing = self.stages.get(name)
+            if timing is None:
+                timing = self.stages[name] = Timing()
+            timing.add(seconds - nested[0], blocks - nested[1])
+
+    def iter_stage(self, name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """Yields the items of ``iterable`` recording the time taken to
+        produce each of them as the ``name`` stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def build_field(
+        self, question_type: str, builder: Callable[..., Dict], options: Dict
+    ) -> Dict:
+        """Returns ``builder(**options)`` recording its time and allocations
+        under ``question_type``."""
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        field = builder(**options)
+        seconds = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks
+
+        timing = self.fields.get(question_type)
+        if timing is None:
+            timing = self.fields[question_type] = Timing()
+        timing.add(seconds, blocks)
+        self.counts["fields"] += 1
+        if isinstance(field.get("options"), list):
+            self.counts["options"] += len(field["options"])
+
+        return field
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the profile as a JSON serialisable dict."""
+        return {
+            "seconds": self.seconds,
+            "stages": {name: self.stages[name].as_dict() for name in self.stages},
+            "fields": {
+                name: self.fields[name].as_dict() for name in sorted(self.fields)
+            },
+            "counts": dict(self.counts),
+        }
+
+
+_LOCAL = threading.local()
+
+
+@contextmanager
+def profiling() -> Iterator[Profile]:
+    """Profiles the conversions run in this thread until the context exits,
+    nested contexts share the outer context's profile."""
+    previous = getattr(_LOCAL, "profile", None)
+    profile = previous or Profile()
+    _LOCAL.profile = profile
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        _LOCAL.profile = previous
+        if previous is None:
+            profile.seconds += time.perf_counter() - start
+
+
+def current_profile() -> Optional[Profile]:
+    """Returns the ``Profile`` of the ``profiling()`` context or None."""
+    profile: Optional[Profile] = getattr(_LOCAL, "profile", None)
+
+    return profile
+
+
+class _NoStage:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Returns ``Profile.stage(name)`` of the current profile, or a context
+    doing nothing when not profiling."""
+    profile = getattr(_LOCAL, "profile", None)
+
+    return _NO_STAGE if profile is None else profile.stage(name)
+
+
+def iter_stage(name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+    """Returns ``Profile.iter_stage(name, iterable)`` of the current profile,
+    or an iterator of ``iterable`` when not profiling."""
+    profile = getattr(_LOCAL, "profile", None)
+
+    return iter(iterable) if profile is None else profile.iter_stage(name, iterable)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.reader - streams the survey of an xlsx XLSForm without pyxform.
+
+Only the columns used by xlson are read: type, name, label, hint, bind::* and
+instance::openmrs_* in the survey sheet and list_name, name, label and
+instance::openmrs_* in the choices sheet. Rows are turned into the same
+structure ``build_field()`` receives from pyxform, one top-level group at a
+time, so memory use grows with the largest group rather than the workbook.
+"""
+
+import os
+import re
+from typing import BinaryIO, Dict, Iterator, List, Match, Optional, Tuple
+
+from xlson import (
+    CHILDREN,
+    HINT,
+    INSTANCE,
+    LABEL,
+    NAME,
+    TITLE,
+    TYPE,
+    QuestionTypes,
+)
+from xlson.xlsx import Workbook
+
+SURVEY_SHEET = "survey"
+CHOICES_SHEET = "choices"
+SETTINGS_SHEET = "settings"
+BIND = "bind"
+LIST_NAME = "list_name"
+TYPE_GROUP = QuestionTypes.GROUP.value
+DEFAULT_LANGUAGE = "default"
+TRANSLATABLE = (LABEL, HINT)
+
+# Subset of pyxform's column header aliases for the columns read here.
+HEADER_ALIASES = {
+    "Label": LABEL,
+    "caption": LABEL,
+    "Name": NAME,
+    "value": NAME,
+    "Type": TYPE,
+    "command": TYPE,
+    "List_name": LIST_NAME,
+    "relevant": "bind::relevant",
+    "relevance": "bind::relevant",
+    "required": "bind::required",
+    "required_message": "bind::jr:requiredMsg",
+    "required message": "bind::jr:requiredMsg",
+    "requiredMsg": "bind::jr:requiredMsg",
+    "constraint": "bind::constraint",
+    "constraint_message": "bind::jr:constraintMsg",
+    "constraint message": "bind::jr:constraintMsg",
+    "constraining message": "bind::jr:constraintMsg",
+    "calculation": "bind::calculate",
+    "calculate": "bind::calculate",
+    "read_only": "bind::readonly",
+    "readonly": "bind::readonly",
+}
+TYPE_ALIASES = {
+    "image": QuestionTypes.PHOTO.value,
+    "add image prompt": QuestionTypes.PHOTO.value,
+    "add photo prompt": QuestionTypes.PHOTO.value,
+}
+CONTROL_TYPES = {
+    "group": QuestionTypes.GROUP.value,
+    "lgroup": "repeat",
+    "repeat": "repeat",
+    "looped group": "repeat",
+    "loop": "loop",
+}
+SELECT_TYPES = {
+    "select_one": QuestionTypes.SELECT_ONE.value,
+    "select one": QuestionTypes.SELECT_ONE.value,
+    "select1": QuestionTypes.SELECT_ONE.value,
+    "select one from": QuestionTypes.SELECT_ONE.value,
+    "select_multiple": QuestionTypes.SELECT_MULTIPLE.value,
+    "select all that apply": QuestionTypes.SELECT_MULTIPLE.value,
+    "select all that apply from": QuestionTypes.SELECT_MULTIPLE.value,
+}
+BEGIN_CONTROL = re.compile(
+    r"^begin(\s|_)(?P<type>(%s))( (over )?(?P<list_name>\S+))?$"
+    % "|".join(CONTROL_TYPES)
+)
+END_CONTROL = re.compile(r"^end(\s|_)(?P<type>(%s))$" % "|".join(CONTROL_TYPES))
+SELECT = re.compile(
+    r"^(?P<command>(%s)) (?P<list_name>\S+)"
+    r"( (?P<or_other>(or specify other|or_other|or other)))?$" % "|".join(SELECT_TYPES)
+)
+SMART_QUOTES = {"‘": "'", "’": "'", "“": '"', "”": '"'}
+SPACES = re.compile(r"( )+")
+
+
+def clean_text(value: str) -> str:
+    """Cleans a cell value the same way pyxform does."""
+    value = value.replace("\xa0", " ")
+    for smart_quote, quote in SMART_QUOTES.items():
+        value = value.replace(smart_quote, quote)
+
+    return SPACES.sub(" ", value.strip())
+
+
+def row_to_element(row: Dict[str, str], columns: Tuple[str, ...]) -> Dict:
+    """Converts a sheet row to a survey element dict.
+
+    ``columns`` are the plain columns to keep, ``label::<language>`` and
+    ``hint::<language>`` columns become per language dicts, ``bind::*`` and
+    ``instance::openmrs_*`` columns are grouped in ``bind`` and ``instance``
+    dicts. Translated constraint and required messages are per language
+    dicts in ``bind``.
+    """
+    element: Dict = {}
+    translations: Dict[str, Dict[str, str]] = {}
+    bind_translations: Dict[str, Dict[str, str]] = {}
+    for header, value in row.items():
+        group, _, key = header.partition("::")
+        if key and HEADER_ALIASES.get(group, "").startswith(BIND + "::"):
+            # Translated messages, e.g. constraint_message::French (fr).
+            header = "%s::%s" % (HEADER_ALIASES[group], key)
+        header = HEADER_ALIASES.get(header, header)
+        value = clean_text(value)
+        group, _, key = header.partition("::")
+        if not key:
+            if header in columns:
+                element[header] = value
+        elif group in TRANSLATABLE:
+            translations.setdefault(group, {})[key] = value
+        elif group == BIND and BIND in columns:
+            key, _, language = key.partition("::")
+            if language:
+                bind_translations.setdefault(key, {})[language] = value
+            else:
+                element.setdefault(BIND, {})[key] = value
+        elif group == INSTANCE and key.startswith("openmrs_"):
+            element.setdefault(INSTANCE, {})[key] = value
+
+    for group, languages in translations.items():
+        if group in element:
+            languages[DEFAULT_LANGUAGE] = element[group]
+        element[group] = languages
+    for key, languages in bind_translations.items():
+        bind = element.setdefault(BIND, {})
+        if key in bind:
+            languages[DEFAULT_LANGUAGE] = bind[key]
+        bind[key] = languages
+
+    return element
+
+
+class XLSFormReader:
+    """Streams the survey of an xlsx XLSForm.
+
+    The settings and choices sheets are read when the reader is created, the
+    survey sheet is only read by ``iter_children()``.
+    """
+
+    def __init__(self, path: str, file_object: Optional[BinaryIO] = None) -> None:
+        self.workbook = Workbook(path if file_object is None else file_object)
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            self.settings = self._read_settings()
+            self.choices = self._read_choices()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> "XLSFormReader":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the workbook."""
+        self.workbook.close()
+
+    def _read_settings(self) -> Dict[str, str]:
+        if SETTINGS_SHEET not in self.workbook.sheets:
+            return {}
+        for row in self.workbook.iter_dicts(SETTINGS_SHEET):
+            return {key: clean_text(value) for key, value in row.items()}
+
+        return {}
+
+    def _read_choices(self) -> Dict[str, List[Dict]]:
+        choices: Dict[str, List[Dict]] = {}
+        if CHOICES_SHEET not in self.workbook.sheets:
+            return choices
+        for row in self.workbook.iter_dicts(CHOICES_SHEET):
+            choice = row_to_element(row, (LIST_NAME, NAME, LABEL))
+            list_name = choice.pop(LIST_NAME, None)
+            if list_name:
+                choices.setdefault(list_name, []).append(choice)
+
+        return choices
+
+    def survey(self) -> Dict:
+        """Returns the survey dict without its children."""
+        return {
+            TYPE: "survey",
+            NAME: self.name,
+            TITLE: self.settings.get("form_title", self.name),
+            "id_string": self.settings.get("form_id", self.name),
+        }
+
+    def _select(self, element: Dict, match: Match[str]) -> List[Dict]:
+        list_name = match.group("list_name")
+        if list_name not in self.choices:
+            raise ValueError(
+                "List name not in choices sheet: %s in %s."
+                % (list_name, element.get(NAME))
+            )
+        element[TYPE] = SELECT_TYPES[match.group("command")]
+        element[CHILDREN] = self.choices[list_name]
+        if not match.group("or_other"):
+            return [element]
+
+        # Same as pyxform's or_other handling, see xlson.normalize_survey().
+        element[CHILDREN] = element[CHILDREN] + [{NAME: "other", LABEL: "Other"}]
+        specify_other = {
+            NAME: "%s_other" % element[NAME],
+            LABEL: "Specify other.",
+            TYPE: QuestionTypes.TEXT.value,
+            BIND: {"relevant": "selected(../%s, 'other')" % element[NAME]},
+        }
+        return [element, specify_other]
+
+    def iter_steps(self) -> Iterator[Tuple[str, List[Dict]]]:
+        """Yields the name and the questions of each top-level group, the
+        questions with their name only. Used to know the step of every field
+        before the steps are built from ``iter_children()``."""
+        depth = 0
+        step: Optional[str] = None
+        questions: List[Dict] = []
+        for row in self.workbook.iter_dicts(SURVEY_SHEET):
+            element = row_to_element(row, (TYPE, NAME))
+            question_type = element.get(TYPE)
+            name = element.get(NAME)
+            if not question_type:
+                continue
+            begin = BEGIN_CONTROL.match(question_type)
+            if begin:
+                if depth == 0:
+                    is_a_group = CONTROL_TYPES[begin.group("type")] == TYPE_GROUP
+                    step = name if is_a_group else None
+                    questions = []
+                elif depth == 1 and name:
+                    questions.append({NAME: name})
+                depth += 1
+            elif END_CONTROL.match(question_type):
+                depth = max(depth - 1, 0)
+                if depth == 0 and step:
+                    yield step, questions
+                    step = None
+            elif depth == 1 and name:
+                questions.append({NAME: name})
+                select = SELECT.match(question_type)
+                if select and select.group("or_other"):
+                    questions.append({NAME: "%s_other" % name})
+
+    def iter_children(self) -> Iterator[Dict]:
+        """Yields the top-level survey elements, groups are yielded once all
+        their rows have been read."""
+        stack: List[Dict] = []
+        row_number = 1
+        for row in self.workbook.iter_dicts(SURVEY_SHEET):
+            row_number += 1
+            element = row_to_element(row, (TYPE, NAME, LABEL, HINT, BIND))
+            question_type = element.get(TYPE)
+            if not question_type:
+                if NAME in element:
+                    raise ValueError("[row : %d] Question with no type." % row_number)
+                continue
+            question_type = TYPE_ALIASES.get(question_type, question_type)
+            element[TYPE] = question_type
+
+            begin = BEGIN_CONTROL.match(question_type)
+            end = END_CONTROL.match(question_type)
+            select = SELECT.match(question_type)
+            if begin:
+                element[TYPE] = CONTROL_TYPES[begin.group("type")]
+                element[CHILDREN] = []
+                stack.append(element)
+                continue
+            if end:
+                if not stack:
+                    raise ValueError("[row : %d] Unmatched end statement." % row_number)
+                elements = [stack.pop()]
+            elif select:
+                elements = self._select(element, select)
+            else:
+                elements = [element]
+
+            if stack:
+                stack[-1][CHILDREN].extend(elements)
+            else:
+                yield from elements
+
+        if stack:
+            raise ValueError(
+                "Unmatched begin statement: %s %s."
+                % (stack[-1][TYPE], stack[-1].get(NAME))
+            )
+
+    def read(self) -> Dict:
+        """Reads the whole survey dict."""
+        survey = self.survey()
+        survey[CHILDREN] = list(self.iter_children())
+
+        return survey
+
+
+def read_xlsform(path: str, file_object: Optional[BinaryIO] = None) -> Dict:
+    """Reads the survey dict of an xlsx XLSForm without pyxform."""
+    with XLSFormReader(path, file_object) as reader:
+        return reader.read()
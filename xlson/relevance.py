@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.relevance - translates XLSForm ``relevant`` expressions to native form
+relevance rules.
+
+Conditions on other fields, joined by ``and``, are translated to a relevance
+entry per field keyed on ``<step>:<field key>``::
+
+    ${hiv} = 'yes' and ${age} >= 18
+    {"visit:hiv": {"type": "string", "ex": "equalTo(., \\"yes\\")"},
+     "visit:age": {"type": "numeric", "ex": "greaterThanEqualTo(., \\"18\\")"}}
+
+    selected(${symptoms}, 'fever') or selected(${symptoms}, 'cough')
+    {"visit:symptoms": {"ex-checkbox": [{"or": ["fever", "cough"]}]}}
+
+Other expressions, e.g. ``or`` across fields, ``not()`` or references to
+fields that are not in a step of the form, are left out with an
+``UntranslatedRelevantWarning``.
+
+Expressions are parsed and translated once per distinct text, the fields
+using an expression only look up the steps of the fields it refers to.
+"""
+
+import threading
+import warnings
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from xlson.xpath import (
+    CACHE_SIZE,
+    And,
+    Call,
+    Compare,
+    Literal,
+    Node,
+    Or,
+    Ref,
+    XPathSyntaxError,
+    parse_xpath,
+)
+
+RELEVANCE = "relevance"
+CHECKBOX = "ex-checkbox"
+
+_FUNCTIONS = {
+    "=": "equalTo",
+    "!=": "notEqualTo",
+    ">": "greaterThan",
+    ">=": "greaterThanEqualTo",
+    "<": "lessThan",
+    "<=": "lessThanEqualTo",
+}
+# The comparison with its operands swapped, ``5 < ${x}`` is ``${x} > 5``.
+_SWAPPED = {"=": "=", "!=": "!=", ">": "<", ">=": "<=", "<": ">", "<=": ">="}
+
+# A translated condition: the field referred to, "and" or "or" for checkbox
+# values or the value type, and the checkbox values or the expression.
+Condition = Tuple[str, str, Any]
+
+
+class UntranslatedRelevantWarning(UserWarning):
+    """A ``relevant`` expression that has no native form equivalent."""
+
+
+def _comparison(node: Compare) -> Optional[Condition]:
+    op, left, right = node
+    if isinstance(right, Ref) and isinstance(left, Literal):
+        op, left, right = _SWAPPED[op], right, left
+    if not isinstance(left, Ref) or not isinstance(right, Literal):
+        return None
+    if '"' in right.value:
+        return None
+
+    value_type = "numeric" if right.number and op not in ("=", "!=") else "string"
+    return (left.name, value_type, '%s(., "%s")' % (_FUNCTIONS[op], right.value))
+
+
+def _selected(node: Node) -> Optional[Tuple[str, str]]:
+    if not isinstance(node, Call) or node.name != "selected" or len(node.args) != 2:
+        return None
+    field, value = node.args
+    if not isinstance(field, Ref) or not isinstance(value, Literal):
+        return None
+
+    return field.name, value.value
+
+
+def _condition(node: Node) -> Optional[Condition]:
+    if isinstance(node, Compare):
+        return _comparison(node)
+    if isinstance(node, Or):
+        selected = [_selected(item) for item in node.items]
+        names = {item[0] for item in selected if item is not None}
+        if None in selected or len(names) != 1:
+            return None
+        return (names.pop(), "or", tuple(item[1] for item in selected if item))
+    found = _selected(node)
+
+    return None if found is None else (found[0], "or", (found[1],))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_relevant(expression: str) -> Optional[Tuple[Condition, ...]]:
+    """Returns the conditions of a ``relevant`` expression, one per field it
+    refers to, or None if it has no native form equivalent. Results are
+    cached on ``expression``."""
+    try:
+        node = parse_xpath(expression)
+    except XPathSyntaxError:
+        return None
+
+    by_field: Dict[str, List[Condition]] = {}
+    for item in node.items if isinstance(node, And) else (node,):
+        condition = _condition(item)
+        if condition is None:
+            return None
+        by_field.setdefault(condition[0], []).append(condition)
+
+    conditions = []
+    for name, found in by_field.items():
+        if len(found) == 1:
+            conditions.append(found[0])
+        elif all(kind == "or" and len(values) == 1 for _, kind, values in found):
+            # selected() of several values of the same checkbox.
+            conditions.append((name, "and", tuple(item[2][0] for item in found)))
+        else:
+            return None
+
+    return tuple(conditions)
+
+
+_LOCAL = threading.local()
+
+
+@contextmanager
+def field_steps() -> Iterator[Dict[str, str]]:
+    """Records the step of the fields of the steps built in this thread until
+    the context exits, see ``add_step()``. Nested contexts share the outer
+    context's fields."""
+    previous = getattr(_LOCAL, "steps", None)
+    steps = {} if previous is None else previous
+    _LOCAL.steps = steps
+    try:
+        yield steps
+    finally:
+        _LOCAL.steps = previous
+
+
+def add_step(name: str, children: Iterable[Dict]) -> None:
+    """Records ``name`` as the step of the ``children`` questions inside
+    ``field_steps()``."""
+    steps: Optional[Dict[str, str]] = getattr(_LOCAL, "steps", None)
+    if steps is not None:
+        for child in children:
+            if isinstance(child.get("name"), str):
+                steps.setdefault(child["name"], name)
+
+
+def field_step(name: str) -> Optional[str]:
+    """Returns the step of the ``name`` field recorded by ``add_step()``,
+    None if it is not in a step."""
+    steps: Dict[str, str] = getattr(_LOCAL, "steps", None) or {}
+
+    return steps.get(name)
+
+
+def referenced_steps(children: Iterable[Dict]) -> Tuple[Tuple[str, str], ...]:
+    """Returns the ``(field, step)`` pairs of the fields the ``relevant``
+    expressions of ``children`` refer to, what their relevance depends on
+    besides the expressions."""
+    steps: Dict[str, str] = getattr(_LOCAL, "steps", None) or {}
+    found = set()
+    for child in children:
+        bind = child.get("bind")
+        expression = bind.get("relevant") if isinstance(bind, dict) else None
+        conditions = compile_relevant(expression) if expression else None
+        for name, _, _ in conditions or ():
+            found.add((name, steps.get(name, "")))
+
+    return tuple(sorted(found))
+
+
+def build_relevance(expression: str, key: str) -> Optional[Dict[str, Dict]]:
+    """Returns the native form relevance of the ``key`` field from its
+    ``relevant`` expression, None with a warning if it can not be
+    translated. The fields referred to must be in a step recorded by
+    ``add_step()``."""
+    conditions = compile_relevant(expression)
+    steps: Dict[str, str] = getattr(_LOCAL, "steps", None) or {}
+    if conditions is None or any(name not in steps for name, _, _ in conditions):
+        warnings.warn(
+            "Field '%s': relevant \"%s\" is not translated to native form "
+            "relevance." % (key, expression),
+            UntranslatedRelevantWarning,
+        )
+        return None
+
+    relevance: Dict[str, Dict] = {}
+    for name, kind, value in conditions:
+        entry: Dict[str, Any]
+        if kind in ("or", "and"):
+            values: List[str] = list(value)
+            entry = {CHECKBOX: [{kind: values}]}
+        else:
+            entry = {"type": kind, "ex": value}
+        relevance["%s:%s" % (steps[name], name)] = entry
+
+    return relevance
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.server - a local HTTP service converting XLSForms in warm workers.
+
+``POST /convert?name=<file name>`` with the XLSForm bytes as the request body
+returns the native form JSON. The query string may also set ``compact``,
+``shared_choices``, ``streaming`` and ``survey_builder`` to ``1``.
+``GET /health`` reports the service status.
+
+XLSForms are converted in a pool of worker processes which import the
+XLSForm parsers when they start, so a request only pays for the conversion.
+Requests over the concurrency limit are answered with 503 straight away.
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from concurrent.futures import (  # pylint: disable=redefined-builtin
+    ProcessPoolExecutor,
+    TimeoutError,
+)
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+import xlson
+from xlson import iter_xlsform
+from xlson.cache import Cache
+from xlson.converter import warm_up
+from xlson.writer import write_native_form
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8750
+DEFAULT_TIMEOUT = 60.0
+MAX_CONTENT_LENGTH = 32 * 1024 * 1024
+DEFAULT_NAME = "form.xlsx"
+FLAGS = ("compact", "shared_choices", "streaming", "survey_builder")
+TRUE = ("1", "true", "yes")
+
+
+def convert_bytes(
+    name: str, data: bytes, options: Dict[str, Any], compact: bool = False
+) -> str:
+    """Converts the XLSForm ``data`` named ``name`` and returns the native form
+    JSON, ``options`` are passed to ``xlson.iter_xlsform()``."""
+    output = io.StringIO()
+    write_native_form(iter_xlsform(name, io.BytesIO(data), **options), output, compact)
+
+    return output.getvalue()
+
+
+class Busy(Exception):
+    """Raised when the service is converting as many XLSForms as allowed."""
+
+
+class ConversionService:
+    """Converts XLSForms in a pool of ``jobs`` pre-warmed worker processes.
+
+    At most ``max_requests`` conversions are running or waiting for a worker
+    at a time, defaults to twice the number of workers. Conversions taking
+    longer than ``timeout`` seconds raise ``TimeoutError``, the worker carries
+    on until it is done and the conversion counts towards ``max_requests``
+    until then.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        max_requests: Optional[int] = None,
+        cache: Optional[Cache] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_requests = max_requests or 2 * self.jobs
+        self.cache = cache
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_requests)
+
+        # Forked workers inherit the parent's imports, others import them on
+        # start up.
+        warm_up()
+        kwargs: Dict[str, Any] = {}
+        if sys.version_info >= (3, 7):
+            kwargs["initializer"] = warm_up
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs, **kwargs)
+        for future in [self.executor.submit(warm_up) for _ in range(self.jobs)]:
+            future.result()
+
+    def __enter__(self) -> "ConversionService":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the worker processes and prunes the cache."""
+        self.executor.shutdown()
+        if self.cache is not None:
+            self.cache.prune()
+
+    def convert(
+        self,
+        name: str,
+        data: bytes,
+        compact: bool = False,
+        **options: Any,
+    ) -> str:
+        """Converts the XLSForm ``data`` named ``name`` in a worker process and
+        returns the native form JSON.
+
+        Raises ``Busy`` when ``max_requests`` conversions are in progress.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise Busy("Converting %d XLSForms already." % self.max_requests)
+        try:
+            options["cache"] = self.cache
+            future = self.executor.submit(convert_bytes, name, data, options, compact)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is only given back once the worker is done with it.
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            result: str = future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+        return result
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """Handles the requests of a ``ConversionServer``."""
+
+    server: Any
+    server_version = "xlson/" + xlson.__version__
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address.
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def send_json(self, status: int, body: Union[str, Dict]) -> None:
+        """Sends a JSON response."""
+        if isinstance(body, dict):
+            body = json.dumps(body) + "\n"
+        encoded = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def send_error_json(self, status: int, message: str) -> None:
+        """Sends an ``{"error": message}`` response."""
+        self.send_json(status, {"error": message})
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Reports the service status on ``/health``."""
+        if urlsplit(self.path).path != "/health":
+            self.send_error_json(404, "Not found.")
+            return
+        service = self.server.service
+        self.send_json(
+            200,
+            {
+                "status": "ok",
+                "jobs": service.jobs,
+                "max_requests": service.max_requests,
+            },
+        )
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Converts the XLSForm posted to ``/convert``."""
+        url = urlsplit(self.path)
+        if url.path != "/convert":
+            self.send_error_json(404, "Not found.")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_error_json(411, "Content-Length is required.")
+            return
+        if length < 0:
+            self.send_error_json(400, "Content-Length must not be negative.")
+            return
+        if length > MAX_CONTENT_LENGTH:
+            self.send_error_json(
+                413, "XLSForms are limited to %d bytes." % MAX_CONTENT_LENGTH
+            )
+            return
+        data = self.rfile.read(length)
+
+        query = parse_qs(url.query)
+        name = os.path.basename(query.get("name", [DEFAULT_NAME])[0]) or DEFAULT_NAME
+        options = {flag: query.get(flag, [""])[0].lower() in TRUE for flag in FLAGS}
+        try:
+            form = self.server.service.convert(name, data, **options)
+        except Busy as error:
+            self.send_error_json(503, str(error))
+        except TimeoutError:
+            self.send_error_json(504, "Conversion timed out.")
+        except BrokenProcessPool:
+            self.send_error_json(500, "A worker process died.")
+        except Exception as error:  # pylint: disable=broad-except
+            self.send_error_json(400, "%s: %s" % (type(error).__name__, error))
+        else:
+            self.send_json(200, form)
+
+
+class ConversionServer(socketserver.ThreadingMixIn, HTTPServer):
+    """An HTTP server handling each request in a thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: ConversionService) -> None:
+        self.service = service
+        super().__init__(address, ConversionHandler)
+
+
+class UnixConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """An HTTP server listening on a Unix socket."""
+
+    daemon_threads = True
+    server_name = "localhost"
+    server_port = 0
+
+    def __init__(self, path: str, service: ConversionService) -> None:
+        self.service = service
+        self.socket_path = path
+        # Remove the socket left behind by a previous server.
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        super().__init__(path, ConversionHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def make_server(
+    service: ConversionService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+) -> Union[ConversionServer, UnixConversionServer]:
+    """Returns a server for ``service`` on ``host:port`` or on the Unix socket
+    ``socket_path``."""
+    if socket_path is not None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix sockets are not supported on this platform.")
+        return UnixConversionServer(socket_path, service)
+
+    return ConversionServer((host, port), service)
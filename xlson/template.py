@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.template - renders variants of a form from a compiled template.
+
+Forms used by several programs often only differ in their encounter type,
+OpenMRS entity ids and a few labels. A workbook is compiled once into a
+template, the native form with a name for each string value that can be
+overridden, and the variants are rendered from a table of overrides without
+parsing the workbook again::
+
+    template = Template.from_form(xlson.convert_xlsform("anc.xlsx"))
+    form = template.render({"encounter_type": "anc_hiv", "hiv.hint": "HIV?"})
+
+Substitution points are named after the top-level item for top-level values,
+e.g. ``encounter_type`` and ``step1.title``, and after the field key for the
+values of fields, e.g. ``hiv.openmrs_entity_id``, ``hiv.v_required.err`` or
+``hiv.options.yes.text`` for the ``text`` of the ``yes`` option. A name used
+by fields in several steps sets all of them.
+
+Rendering copies the dicts and lists on the way to each overridden value and
+shares everything else with the template, so writing the variants costs
+more than rendering them.
+"""
+
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from xlson.batch import Result, _temp_path
+from xlson.encoders import write_form
+from xlson.formats import JSON, extension
+
+TEMPLATE_VERSION = 1
+# The override table column naming the file each variant is written to.
+NAME_COLUMN = "name"
+
+Path = Tuple[Union[str, int], ...]
+
+
+def _item_keys(items: List[Any]) -> Optional[List[str]]:
+    if all(
+        isinstance(item, dict) and isinstance(item.get("key"), str) for item in items
+    ):
+        return [item["key"] for item in items]
+
+    return None
+
+
+def _iter_points(value: Any, name: str, path: Path) -> Iterator[Tuple[str, Path]]:
+    if isinstance(value, str):
+        yield name, path
+    elif isinstance(value, dict):
+        for key, child in value.items():
+            if key != "key":
+                yield from _iter_points(child, name + "." + key, path + (key,))
+    elif isinstance(value, list):
+        keys = _item_keys(value)
+        for index, child in enumerate(value):
+            if keys is not None:
+                yield from _iter_points(
+                    child, name + "." + keys[index], path + (index,)
+                )
+
+
+def find_points(form: Dict) -> Dict[str, List[Path]]:
+    """Returns the paths of the string values of a native form by their
+    substitution point name."""
+    points: Dict[str, List[Path]] = {}
+    for name, value in form.items():
+        if isinstance(value, dict) and isinstance(value.get("fields"), list):
+            found = [
+                point
+                for key, child in value.items()
+                if key != "fields"
+                for point in _iter_points(child, name + "." + key, (name, key))
+            ]
+            for index, field in enumerate(value["fields"]):
+                if isinstance(field, dict) and isinstance(field.get("key"), str):
+                    found.extend(
+                        _iter_points(field, field["key"], (name, "fields", index))
+                    )
+        else:
+            found = list(_iter_points(value, name, (name,)))
+        for point, path in found:
+            points.setdefault(point, []).append(path)
+
+    return points
+
+
+class Template:
+    """A native form and its substitution points, see ``find_points()``."""
+
+    def __init__(self, form: Dict, points: Dict[str, List[Path]]) -> None:
+        self.form = form
+        self.points = points
+
+    @classmethod
+    def from_form(cls, form: Dict) -> "Template":
+        """Returns the template of a native form dict."""
+        return cls(form, find_points(form))
+
+    @classmethod
+    def load(cls, path: str) -> "Template":
+        """Reads a template written by ``save()``, raises ``ValueError`` if
+        it is not a template of this version."""
+        with open(path, encoding="utf-8") as template_file:
+            content = json.load(template_file)
+        if not isinstance(content, dict) or content.get("template") != TEMPLATE_VERSION:
+            raise ValueError("'%s' is not an xlson template." % path)
+        points = {
+            name: [tuple(path) for path in paths]
+            for name, paths in content["points"].items()
+        }
+
+        return cls(content["form"], points)
+
+    def save(self, path: str) -> None:
+        """Writes the template as JSON to ``path``."""
+        tmp_path = _temp_path(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as template_file:
+                json.dump(
+                    {
+                        "template": TEMPLATE_VERSION,
+                        "points": self.points,
+                        "form": self.form,
+                    },
+                    template_file,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def render(self, overrides: Dict[str, Any]) -> Dict:
+        """Returns the native form with the substitution points in
+        ``overrides`` set, raises ``ValueError`` for unknown points.
+
+        The form shares the values that were not overridden with the
+        template, it must not be modified.
+        """
+        unknown = sorted(set(overrides) - set(self.points))
+        if unknown:
+            raise ValueError("Unknown substitution points: %s." % ", ".join(unknown))
+
+        form = dict(self.form)
+        copied = set()
+        for name, value in overrides.items():
+            for path in self.points[name]:
+                parent: Any = form
+                for depth in range(len(path) - 1):
+                    child = parent[path[depth]]
+                    if path[: depth + 1] not in copied:
+                        child = dict(child) if isinstance(child, dict) else list(child)
+                        parent[path[depth]] = child
+                        copied.add(path[: depth + 1])
+                    parent = child
+                parent[path[-1]] = value
+
+        return form
+
+
+def read_overrides(path: str) -> List[Dict[str, str]]:
+    """Reads the overrides of each variant from a CSV file with a header row
+    or a JSON list of objects. Empty CSV cells keep the template's value."""
+    with open(path, encoding="utf-8", newline="") as overrides_file:
+        if path.lower().endswith(".json"):
+            rows = json.load(overrides_file)
+            if not isinstance(rows, list) or not all(
+                isinstance(row, dict) for row in rows
+            ):
+                raise ValueError("'%s' is not a JSON list of objects." % path)
+            return rows
+
+        return [
+            {name: value for name, value in row.items() if value != ""}
+            for row in csv.DictReader(overrides_file)
+        ]
+
+
+def render_many(
+    template: Template,
+    variants: Iterable[Dict[str, Any]],
+    output_dir: str,
+    output_format: str = JSON,
+    compact: bool = False,
+) -> Iterator[Result]:
+    """Renders a variant of ``template`` per overrides in ``variants`` and
+    writes it to ``output_dir`` in ``output_format``, yielding a ``Result``
+    per variant.
+
+    Each variant is written to a file named after its ``name`` column, which
+    is not a substitution point and can not contain a directory.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for index, variant in enumerate(variants, 1):
+        overrides = dict(variant)
+        name = overrides.pop(NAME_COLUMN, None)
+        if not name or os.path.basename(str(name)) != str(name):
+            yield Result("variant %d" % index, None, "Missing or invalid name column.")
+            continue
+        output = os.path.join(output_dir, str(name) + extension(output_format))
+        tmp_output = ""
+        try:
+            form = template.render(overrides)
+            tmp_output = _temp_path(output)
+            with open(tmp_output, "wb") as output_file:
+                write_form(form, output_file, output_format, compact)
+            os.replace(tmp_output, output)
+        except Exception as error:  # pylint: disable=broad-except
+            if tmp_output and os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            yield Result(str(name), None, "%s: %s" % (type(error).__name__, error))
+            continue
+
+        yield Result(str(name), output, None)
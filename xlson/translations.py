@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.translations - native forms in each language of a multi-language
+XLSForm.
+
+Workbooks with ``label::<language>`` and ``hint::<language>`` columns give
+native forms whose texts are per language dicts, e.g.
+``{"English (en)": "Visit", "French (fr)": "Visite"}``. The form is built
+once and a native form with plain strings is rendered for each language::
+
+    translations = Translations(xlson.convert_xlsform("anc.xlsx"))
+    for language, code in language_codes(translations.languages).items():
+        form = translations.localize(language)
+
+The localized forms share every dict and list that holds no text with the
+form they are rendered from and with each other, and options lists shared
+by several fields stay shared. The texts of the columns without a language
+are the ``default`` texts, they are not a language of their own: a text
+missing in a language falls back to the ``default`` text, then to the first
+language it has.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Set
+
+DEFAULT_LANGUAGE = "default"
+# The native form keys holding texts.
+TEXT_KEYS = frozenset(
+    ("title", "label", "hint", "text", "err", "uploadButtonText", "scanButtonText")
+)
+
+_CODE = re.compile(r"\(([\w-]+)\)\s*$")
+_UNSAFE = re.compile(r"[^\w-]+")
+
+
+def language_code(language: str) -> str:
+    """Returns the code of a language for file names, the code in brackets
+    in ``French (fr)`` or the lowercased name."""
+    match = _CODE.search(language)
+    if match is not None:
+        return match.group(1)
+
+    return _UNSAFE.sub("_", language.strip().lower()).strip("_") or DEFAULT_LANGUAGE
+
+
+def language_codes(languages: Iterable[str]) -> Dict[str, str]:
+    """Returns the code of each language, raises ``ValueError`` if two
+    languages have the same code."""
+    codes: Dict[str, str] = {}
+    languages_by_code: Dict[str, str] = {}
+    for language in languages:
+        code = codes[language] = language_code(language)
+        other = languages_by_code.setdefault(code, language)
+        if other != language:
+            raise ValueError(
+                "Languages '%s' and '%s' both have the code '%s'."
+                % (other, language, code)
+            )
+
+    return codes
+
+
+def _is_text(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and bool(value)
+        and all(isinstance(text, str) for text in value.values())
+    )
+
+
+class Translations:
+    """The texts of a native form and the languages they are in, other than
+    the ``default`` texts."""
+
+    def __init__(self, form: Dict) -> None:
+        self.form = form
+        self.languages: List[str] = []
+        # Ids of the text dicts, and of the dicts and lists holding them.
+        self._texts: Set[int] = set()
+        self._translated: Dict[int, bool] = {}
+        self._find(form)
+
+    def _find(self, value: Any) -> bool:
+        found = self._translated.get(id(value))
+        if found is not None:
+            return found
+        found = False
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key in TEXT_KEYS and _is_text(child):
+                    self._texts.add(id(child))
+                    for language in child:
+                        if language not in self.languages and (
+                            language != DEFAULT_LANGUAGE
+                        ):
+                            self.languages.append(language)
+                    found = True
+                elif isinstance(child, (dict, list)):
+                    found = self._find(child) or found
+        else:
+            for child in value:
+                if isinstance(child, (dict, list)):
+                    found = self._find(child) or found
+        self._translated[id(value)] = found
+
+        return found
+
+    def localize(self, language: str) -> Dict:
+        """Returns the native form with its texts in ``language``.
+
+        The form shares the values that hold no text with the form of the
+        translations, it must not be modified.
+        """
+        localized: Dict[int, Any] = {}
+
+        def render(value: Any) -> Any:
+            if id(value) in self._texts:
+                return (
+                    value.get(language)
+                    or value.get(DEFAULT_LANGUAGE)
+                    or next(iter(value.values()))
+                )
+            if not self._translated.get(id(value)):
+                return value
+            result = localized.get(id(value))
+            if result is None:
+                if isinstance(value, dict):
+                    result = {key: render(child) for key, child in value.items()}
+                else:
+                    result = [render(child) for child in value]
+                localized[id(value)] = result
+            return result
+
+        form: Dict = render(self.form)
+
+        return form
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.watch - converts XLSForms again whenever they are saved.
+
+Workbooks are polled for changes to their modification time and size, a
+workbook is converted once it has not changed for the debounce delay. Only
+the steps of the top-level groups that changed since the last conversion are
+built again and output files are only written when their content changes.
+"""
+
+import io
+import os
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from xlson import (
+    CHILDREN,
+    NAME,
+    build_field,
+    build_survey,
+    freeze,
+    iter_native_form,
+    iter_shared_choices,
+    parse_file_to_json,
+)
+from xlson.batch import Source, _temp_path, collect_xlsforms, rules_output
+from xlson.calculations import collect_rules, current_calculations, dump_rules
+from xlson.relevance import add_step, field_steps, referenced_steps
+from xlson.writer import write_native_form
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 0.3
+
+
+class IncrementalConverter:
+    """Converts an XLSForm over and over, reusing the steps of the top-level
+    groups that did not change since the previous conversion.
+
+    ``rebuilt`` and ``reused`` count the steps built and reused by the last
+    conversion and ``rules`` are its calculation rules.
+    """
+
+    def __init__(
+        self,
+        survey_builder: bool = False,
+        streaming: bool = False,
+        shared_choices: bool = False,
+    ) -> None:
+        self.survey_builder = survey_builder
+        self.streaming = streaming
+        self.shared_choices = shared_choices
+        self.rebuilt = 0
+        self.reused = 0
+        self.rules: List[Dict[str, Any]] = []
+        # Steps and the calculations of their fields by group.
+        self._steps: Dict[Hashable, Tuple[Dict, List[Tuple[str, str]]]] = {}
+        self._next_steps: Dict[Hashable, Tuple[Dict, List[Tuple[str, str]]]] = {}
+
+    def build_step(self, group: Dict) -> Dict:
+        """Returns the step of a top-level group, built again only if the group
+        changed."""
+        # Relevance rules also depend on the steps of the fields they refer to.
+        add_step(group[NAME], group[CHILDREN])
+        calculations = current_calculations()
+        rules_file = calculations.rules_file if calculations else None
+        key = (freeze(group), referenced_steps(group[CHILDREN]), rules_file)
+        found = self._steps.get(key)
+        if found is None:
+            start = len(calculations.items) if calculations else 0
+            step = build_field(group)
+            found = (step, calculations.items[start:] if calculations else [])
+            self.rebuilt += 1
+        else:
+            step = found[0]
+            # The rules of reused steps are still built with the form's.
+            if calculations is not None:
+                calculations.items.extend(found[1])
+            self.reused += 1
+        self._next_steps[key] = found
+
+        return step
+
+    def _iter_items(self, path: str) -> Iterator[Tuple[str, Any]]:
+        if self.streaming:
+            from xlson.reader import XLSFormReader
+
+            with XLSFormReader(path) as reader, field_steps():
+                survey = reader.survey()
+                # Relevance may refer to fields of steps that are not built yet.
+                for name, questions in reader.iter_steps():
+                    add_step(name, questions)
+                yield from iter_native_form(
+                    survey, reader.iter_children(), self.build_step
+                )
+            return
+
+        survey = build_survey(parse_file_to_json(path), self.survey_builder)
+        yield from iter_native_form(survey, survey[CHILDREN], self.build_step)
+
+    def convert(self, path: str, compact: bool = False) -> str:
+        """Converts the XLSForm at ``path`` and returns the native form JSON."""
+        self.rebuilt = self.reused = 0
+        self.rules = []
+        self._next_steps = {}
+        items: Iterable[Tuple[str, Any]] = collect_rules(
+            self._iter_items(path), self.rules
+        )
+        if self.shared_choices:
+            items = iter_shared_choices(items)
+        output = io.StringIO()
+        write_native_form(items, output, compact)
+        # Only keep the steps of the latest conversion.
+        self._steps = self._next_steps
+
+        return output.getvalue()
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """Writes ``content`` to ``path`` unless the file already has it, returns
+    True if the file was written."""
+    try:
+        with open(path, "r", encoding="utf-8") as current:
+            if current.read() == content:
+                return False
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as output:
+            output.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return True
+
+
+class Change(NamedTuple):
+    """The outcome of converting a changed XLSForm, ``written`` is False when
+    the output file already had the same content."""
+
+    path: str
+    output: str
+    written: bool
+    rebuilt: int
+    reused: int
+    error: Optional[str]
+
+
+class _WatchedFile:
+    # pylint: disable=too-few-public-methods
+    def __init__(self, source: Source, converter: IncrementalConverter) -> None:
+        self.source = source
+        self.converter = converter
+        self.signature: Optional[Tuple[float, int]] = None
+        self.changed_at = 0.0
+        self.pending = False
+
+
+class Watcher:
+    """Watches files, directories and glob patterns of XLSForms and converts
+    the XLSForms when they change.
+
+    Native forms are written to ``output_dir``, or next to the XLSForm when
+    it is None. ``options`` are passed to ``IncrementalConverter``.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        paths: Iterable[str],
+        output_dir: Optional[str] = None,
+        recursive: bool = False,
+        debounce: float = DEFAULT_DEBOUNCE,
+        compact: bool = False,
+        **options: Any,
+    ) -> None:
+        self.paths = list(paths)
+        self.output_dir = output_dir
+        self.recursive = recursive
+        self.debounce = debounce
+        self.compact = compact
+        self.options = options
+        self.files: Dict[str, _WatchedFile] = {}
+        self._polled = False
+
+    def _collect(self) -> List[Source]:
+        sources = []
+        for path in self.paths:
+            try:
+                sources.extend(collect_xlsforms([path], self.recursive))
+            except FileNotFoundError:
+                continue  # Deleted or not created yet.
+
+        return sources
+
+    def _output(self, source: Source) -> str:
+        if self.output_dir is None:
+            return os.path.splitext(source.path)[0] + ".json"
+
+        return os.path.join(self.output_dir, source.name)
+
+    def convert(self, watched: _WatchedFile) -> Change:
+        """Converts a watched XLSForm and writes its output if it changed."""
+        converter = watched.converter
+        output = self._output(watched.source)
+        try:
+            content = converter.convert(watched.source.path, self.compact)
+            if converter.rules:
+                rules = io.StringIO()
+                dump_rules(converter.rules, rules)
+                write_if_changed(rules_output(output), rules.getvalue())
+            written = write_if_changed(output, content)
+        except Exception as error:  # pylint: disable=broad-except
+            message = "%s: %s" % (type(error).__name__, error)
+            return Change(watched.source.path, output, False, 0, 0, message)
+
+        return Change(
+            watched.source.path,
+            output,
+            written,
+            converter.rebuilt,
+            converter.reused,
+            None,
+        )
+
+    def poll(self, now: Optional[float] = None) -> List[Change]:
+        """Checks the watched XLSForms once and converts those that changed
+        more than ``debounce`` seconds ago. XLSForms found by the first poll
+        are converted straight away."""
+        now = time.monotonic() if now is None else now
+        first_poll = not self._polled
+        self._polled = True
+        found = {}
+        for source in self._collect():
+            try:
+                stat = os.stat(source.path)
+            except OSError:
+                continue
+            watched = self.files.get(source.path)
+            if watched is None:
+                watched = _WatchedFile(source, IncrementalConverter(**self.options))
+            signature = (stat.st_mtime, stat.st_size)
+            if signature != watched.signature:
+                watched.signature = signature
+                watched.changed_at = now - self.debounce if first_poll else now
+                watched.pending = True
+            found[source.path] = watched
+        self.files = found
+
+        changes = []
+        for watched in found.values():
+            if watched.pending and now - watched.changed_at >= self.debounce:
+                watched.pending = False
+                changes.append(self.convert(watched))
+
+        return changes
+
+    def run(
+        self,
+        callback: Callable[[Change], None],
+        interval: float = DEFAULT_INTERVAL,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        """Polls every ``interval`` seconds and calls ``callback`` with each
+        change until ``stop()`` returns True."""
+        while stop is None or not stop():
+            for change in self.poll():
+                callback(change)
+            time.sleep(interval)
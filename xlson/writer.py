@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.writer - writes native form JSON incrementally.
+
+A native form is written item by item as it is produced by
+``xlson.iter_native_form()`` and steps are written a field at a time. Inside
+``xlson.lazy_fields()`` each field is built as it is written, so only the
+current field of the whole JSON document is held in memory. Indented output
+is the same as ``json.dumps(form, indent=4)``. Compact output uses orjson
+when it is installed.
+"""
+
+import json
+from collections import abc
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO, Tuple
+
+from xlson.profiling import SERIALISE, stage
+
+INDENT = 4
+# The form, its steps and their fields lists are written an item at a time,
+# anything deeper is encoded in one go.
+STREAM_DEPTH = 3
+
+
+def _compact_dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+@lru_cache(maxsize=None)
+def load_orjson() -> Optional[ModuleType]:
+    """Returns the orjson module, None if it is not installed. orjson is only
+    imported when compact output is first written."""
+    try:
+        import orjson
+    except ImportError:  # pragma: no cover
+        return None
+
+    return orjson
+
+
+def _indent_dumps(value: Any) -> str:
+    return json.dumps(value, indent=INDENT)
+
+
+def get_dumps(compact: bool = False, backend: str = "auto") -> Callable[[Any], str]:
+    """Returns the function used to encode JSON values.
+
+    ``backend`` is one of "auto", "json" or "orjson". orjson only produces
+    compact output and is used by "auto" when it is installed.
+    """
+    if backend not in ("auto", "json", "orjson"):
+        raise ValueError("Unknown JSON backend '%s'." % backend)
+    orjson = load_orjson() if compact and backend != "json" else None
+    if backend == "orjson" and orjson is None:
+        raise ValueError("The orjson backend needs orjson and compact output.")
+    if not compact:
+        return _indent_dumps
+    if orjson is None:
+        return _compact_dumps
+    orjson_dumps: Callable[[Any], bytes] = orjson.dumps
+
+    def _orjson_dumps(value: Any) -> str:
+        return str(orjson_dumps(value), "utf-8")
+
+    return _orjson_dumps
+
+
+class JSONWriter:
+    """Writes JSON values to a text stream, streaming the top levels of nested
+    dicts, lists and iterators."""
+
+    def __init__(
+        self, stream: TextIO, compact: bool = False, backend: str = "auto"
+    ) -> None:
+        self.stream = stream
+        self.compact = compact
+        self.dumps = get_dumps(compact, backend)
+
+    def _newline(self, level: int) -> str:
+        return "" if self.compact else "\n" + " " * (INDENT * level)
+
+    def _write_container(
+        self, items: Iterator[Tuple[Any, Any]], is_object: bool, level: int
+    ) -> None:
+        write = self.stream.write
+        separator = ":" if self.compact else ": "
+        write("{" if is_object else "[")
+        empty = True
+        for key, value in items:
+            write(self._newline(level + 1) if empty else "," + self._newline(level + 1))
+            empty = False
+            if is_object:
+                write(self.dumps(key) + separator)
+            self.write(value, level + 1)
+        if not empty:
+            write(self._newline(level))
+        write("}" if is_object else "]")
+
+    def write(self, value: Any, level: int = 0) -> None:
+        """Writes ``value``, dicts and lists down to ``STREAM_DEPTH`` levels are
+        written an item at a time and iterators are consumed as lists."""
+        if level < STREAM_DEPTH and isinstance(value, dict):
+            self._write_container(iter(value.items()), True, level)
+        elif level < STREAM_DEPTH and isinstance(value, (list, tuple, abc.Iterator)):
+            self._write_container(((None, item) for item in value), False, level)
+        else:
+            encoded = self.dumps(value)
+            if level and not self.compact:
+                encoded = encoded.replace("\n", self._newline(level))
+            self.stream.write(encoded)
+
+    def write_object(self, items: Iterable[Tuple[str, Any]]) -> None:
+        """Writes a JSON object from ``(key, value)`` pairs as they are
+        produced."""
+        self._write_container(iter(items), True, 0)
+
+
+def write_native_form(
+    form: Any, stream: TextIO, compact: bool = False, backend: str = "auto"
+) -> None:
+    """Writes a native form followed by a newline to ``stream``.
+
+    ``form`` is a native form dict or the ``(key, value)`` pairs yielded by
+    ``xlson.iter_native_form()``.
+    """
+    writer = JSONWriter(stream, compact, backend)
+    with stage(SERIALISE):
+        writer.write_object(form.items() if isinstance(form, dict) else form)
+        stream.write("\n")
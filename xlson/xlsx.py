@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.xlsx - streams rows from the worksheets of an xlsx workbook.
+
+Only the standard library is used, worksheets are parsed incrementally so
+memory use does not grow with the number of rows.
+"""
+
+import posixpath
+import re
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+from xml.etree import ElementTree
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+CELL_REFERENCE = re.compile(r"^([A-Z]+)")
+
+
+def column_index(reference: str) -> int:
+    """Returns the zero based column index of a cell reference, e.g. C4 is 2."""
+    match = CELL_REFERENCE.match(reference)
+    assert match, "Invalid cell reference '%s'." % reference
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + ord(letter) - ord("A") + 1
+
+    return index - 1
+
+
+def column_name(index: int) -> str:
+    """Returns the column name of a zero based column index, e.g. 2 is C."""
+    name = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord("A") + remainder) + name
+
+    return name
+
+
+def _text(element: ElementTree.Element) -> str:
+    # Rich text is split in <r> runs, phonetic <rPh> runs are skipped.
+    parts = []
+    for child in element:
+        if child.tag == MAIN_NS + "t":
+            parts.append(child.text or "")
+        elif child.tag == MAIN_NS + "r":
+            parts.append(child.findtext(MAIN_NS + "t") or "")
+
+    return "".join(parts)
+
+
+def _number(value: str) -> str:
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+class Workbook:
+    """A read-only xlsx workbook.
+
+    Use as a context manager or call ``close()`` when done, rows are streamed
+    from the archive by ``iter_rows()``.
+    """
+
+    def __init__(self, path_or_file: Union[str, BinaryIO]) -> None:
+        try:
+            self.archive = zipfile.ZipFile(path_or_file)
+        except zipfile.BadZipFile as error:
+            raise ValueError("Not an xlsx workbook: %s" % error)
+        self.sheets = self._read_sheets()
+        self._shared_strings: Optional[List[str]] = None
+
+    def __enter__(self) -> "Workbook":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the workbook archive."""
+        self.archive.close()
+
+    def _read_sheets(self) -> Dict[str, str]:
+        relations = {}
+        with self.archive.open("xl/_rels/workbook.xml.rels") as rels_file:
+            for relation in ElementTree.parse(rels_file).getroot():
+                target = relation.get("Target", "")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join("xl", target))
+                relations[relation.get("Id")] = target
+
+        sheets = {}
+        with self.archive.open("xl/workbook.xml") as workbook_file:
+            root = ElementTree.parse(workbook_file).getroot()
+            for sheet in root.iter(MAIN_NS + "sheet"):
+                sheets[sheet.get("name", "")] = relations[sheet.get(REL_NS + "id")]
+
+        return sheets
+
+    @property
+    def shared_strings(self) -> List[str]:
+        """The shared strings table, loaded on first use."""
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if "xl/sharedStrings.xml" in self.archive.namelist():
+                with self.archive.open("xl/sharedStrings.xml") as strings_file:
+                    for _event, element in ElementTree.iterparse(strings_file):
+                        if element.tag == MAIN_NS + "si":
+                            self._shared_strings.append(_text(element))
+                            element.clear()
+
+        return self._shared_strings
+
+    def _cell_value(self, cell: ElementTree.Element) -> str:
+        cell_type = cell.get("t", "n")
+        if cell_type == "inlineStr":
+            inline = cell.find(MAIN_NS + "is")
+            return "" if inline is None else _text(inline)
+
+        value = cell.findtext(MAIN_NS + "v")
+        if value is None:
+            return ""
+        if cell_type == "s":
+            return self.shared_strings[int(value)]
+        if cell_type == "b":
+            return "TRUE" if value == "1" else "FALSE"
+        if cell_type == "n":
+            return _number(value)
+
+        return value
+
+    def iter_rows(self, sheet: str) -> Iterator[List[str]]:
+        """Yields the cell values of each row in ``sheet`` as strings, empty
+        cells are empty strings and missing rows are skipped."""
+        if sheet not in self.sheets:
+            raise KeyError("Sheet '%s' not found." % sheet)
+
+        with self.archive.open(self.sheets[sheet]) as sheet_file:
+            sheet_data = None
+            events = ElementTree.iterparse(sheet_file, events=("start", "end"))
+            for event, element in events:
+                if event == "start":
+                    if element.tag == MAIN_NS + "sheetData":
+                        sheet_data = element
+                    continue
+                if element.tag != MAIN_NS + "row":
+                    continue
+                row: List[str] = []
+                for cell in element.iter(MAIN_NS + "c"):
+                    reference = cell.get("r")
+                    index = column_index(reference) if reference else len(row)
+                    row.extend([""] * (index - len(row)))
+                    row.append(self._cell_value(cell))
+                # Drop parsed rows so memory does not grow with the sheet.
+                if sheet_data is not None:
+                    sheet_data.clear()
+                yield row
+
+    def iter_dicts(self, sheet: str) -> Iterator[Dict[str, str]]:
+        """Yields each row in ``sheet`` after the header row as a dict keyed on
+        the header, empty cells and rows are left out."""
+        rows = self.iter_rows(sheet)
+        headers = [header.strip() for header in next(rows, [])]
+        for row in rows:
+            values = {
+                header: value
+                for header, value in zip(headers, row)
+                if header and value.strip()
+            }
+            if values:
+                yield values
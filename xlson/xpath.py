@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+xlson.xpath - a parser for the XPath expressions of XLSForm columns.
+
+Parses the subset of XPath used by ``relevant``, ``calculation`` and similar
+columns: field references (``${name}``, or ``../name`` as generated for
+``or_other`` selects), the current field (``.``), string
+and number literals, arithmetic, comparisons, ``and``/``or``, parentheses and
+function calls::
+
+    parse_xpath("${hiv} = 'yes' and selected(${symptoms}, 'fever')")
+    # And((Compare("=", Ref("hiv"), Literal("yes")),
+    #      Call("selected", (Ref("symptoms"), Literal("fever")))))
+
+Paths and predicates are not supported.
+
+The same expressions repeat across the fields of a form and the forms of a
+corpus, parsed expressions are immutable and memoised on their text.
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterator, List, NamedTuple, Tuple, Union
+
+# Parsed expressions kept, most forms use far fewer distinct expressions.
+CACHE_SIZE = 4096
+
+COMPARISONS = ("=", "!=", "<=", ">=", "<", ">")
+ADDITIVE = ("+", "-")
+MULTIPLICATIVE = ("*", "div", "mod")
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<ref>\$\{\s*(?P<ref_name>[^}\s]+)\s*\})
+        |(?P<sibling>\.\./(?P<sibling_name>[A-Za-z_][\w.:-]*))
+        |(?P<string>'[^']*'|"[^"]*")
+        |(?P<number>\d+(?:\.\d*)?|\.\d+)
+        |(?P<op>!=|<=|>=|=|<|>|\(|\)|,|\+|-|\*)
+        |(?P<name>[A-Za-z_][\w.:-]*)
+        |(?P<current>\.)
+    )""",
+    re.VERBOSE,
+)
+
+
+class XPathSyntaxError(ValueError):
+    """An expression that can not be parsed."""
+
+
+class Ref(NamedTuple):
+    """A reference to the ``name`` field."""
+
+    name: str
+
+
+class Current(NamedTuple):
+    """The current field, ``.``."""
+
+
+class Literal(NamedTuple):
+    """A string or number literal, numbers keep their text."""
+
+    value: str
+    number: bool = False
+
+
+class Arithmetic(NamedTuple):
+    """An arithmetic operation, ``op`` is one of ``ADDITIVE`` or
+    ``MULTIPLICATIVE``."""
+
+    op: str
+    left: "Node"
+    right: "Node"
+
+
+class Negative(NamedTuple):
+    """A negated expression, ``-${x}``. Negative numbers are literals."""
+
+    operand: "Node"
+
+
+class Call(NamedTuple):
+    """A function call."""
+
+    name: str
+    args: Tuple["Node", ...]
+
+
+class Compare(NamedTuple):
+    """A comparison, ``op`` is one of ``COMPARISONS``."""
+
+    op: str
+    left: "Node"
+    right: "Node"
+
+
+class And(NamedTuple):
+    """Expressions joined by ``and``."""
+
+    items: Tuple["Node", ...]
+
+
+class Or(NamedTuple):
+    """Expressions joined by ``or``."""
+
+    items: Tuple["Node", ...]
+
+
+Node = Union[Ref, Current, Literal, Arithmetic, Negative, Call, Compare, And, Or]
+
+
+def _tokenize(text: str) -> Iterator[Tuple[str, str]]:
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise XPathSyntaxError(
+                "Unexpected '%s' in '%s'." % (text[position:].strip()[:10], text)
+            )
+        kind = match.lastgroup
+        assert kind is not None
+        if kind == "ref":
+            yield kind, match.group("ref_name")
+        elif kind == "sibling":
+            # A field of the same group, the only path used in XLSForms.
+            yield "ref", match.group("sibling_name")
+        else:
+            yield kind, match.group(kind)
+        position = match.end()
+
+
+class _Parser:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.tokens: List[Tuple[str, str]] = list(_tokenize(text))
+        self.position = 0
+
+    def peek(self) -> Tuple[str, str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return ("end", "")
+
+    def take(self, kind: str, value: str = "") -> str:
+        token = self.peek()
+        if token[0] != kind or (value and token[1] != value):
+            raise XPathSyntaxError(
+                "Expected %s in '%s', found %s."
+                % (value or kind, self.text, token[1] or "the end")
+            )
+        self.position += 1
+        return token[1]
+
+    def parse(self) -> Node:
+        node = self.or_expression()
+        self.take("end")
+        return node
+
+    def or_expression(self) -> Node:
+        items = [self.and_expression()]
+        while self.peek() == ("name", "or"):
+            self.position += 1
+            items.append(self.and_expression())
+        return items[0] if len(items) == 1 else Or(tuple(items))
+
+    def and_expression(self) -> Node:
+        items = [self.comparison()]
+        while self.peek() == ("name", "and"):
+            self.position += 1
+            items.append(self.comparison())
+        return items[0] if len(items) == 1 else And(tuple(items))
+
+    def comparison(self) -> Node:
+        left = self.additive()
+        kind, value = self.peek()
+        if kind == "op" and value in COMPARISONS:
+            self.position += 1
+            return Compare(value, left, self.additive())
+        return left
+
+    def additive(self) -> Node:
+        node = self.multiplicative()
+        while self.peek()[0] == "op" and self.peek()[1] in ADDITIVE:
+            op = self.tokens[self.position][1]
+            self.position += 1
+            node = Arithmetic(op, node, self.multiplicative())
+        return node
+
+    def multiplicative(self) -> Node:
+        node = self.unary()
+        while self.peek()[1] in MULTIPLICATIVE and self.peek()[0] in ("op", "name"):
+            op = self.tokens[self.position][1]
+            self.position += 1
+            node = Arithmetic(op, node, self.unary())
+        return node
+
+    def unary(self) -> Node:
+        if self.peek() != ("op", "-"):
+            return self.primary()
+        self.position += 1
+        operand = self.unary()
+        if isinstance(operand, Literal) and operand.number:
+            return Literal("-" + operand.value, number=True)
+        return Negative(operand)
+
+    def primary(self) -> Node:
+        kind, value = self.peek()
+        self.position += 1
+        if kind == "ref":
+            return Ref(value)
+        if kind == "current":
+            return Current()
+        if kind == "string":
+            return Literal(value[1:-1])
+        if kind == "number":
+            return Literal(value, number=True)
+        if kind == "op" and value == "(":
+            node = self.or_expression()
+            self.take("op", ")")
+            return node
+        if kind == "name" and self.peek() == ("op", "("):
+            self.position += 1
+            args: List[Node] = []
+            if self.peek() != ("op", ")"):
+                args.append(self.or_expression())
+                while self.peek() == ("op", ","):
+                    self.position += 1
+                    args.append(self.or_expression())
+            self.take("op", ")")
+            return Call(value, tuple(args))
+        raise XPathSyntaxError(
+            "Unexpected %s in '%s'." % (value or "end", self.text.strip())
+        )
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_xpath(text: str) -> Node:
+    """Returns the parsed expression, raises ``XPathSyntaxError`` if it can
+    not be parsed. Results are cached on ``text``."""
+    return _Parser(text).parse()